@@ -1,4 +1,13 @@
-from .client import connect, MpdCommandException
+from .client import connect, MpdCommandException, MpdConnectionError
+from .client import RECONNECT, DirectoryWalker
 from .client import PAUSE_OFF, PAUSE_ON
 from .client import CONSUME_OFF, CONSUME_ON
 from .client import RANDOM_OFF, RANDOM_ON
+from .records import Song, Directory, Playlist, Status, Stats
+from .pool import connect_pool, MpdClientPool
+from .mirror import QueueMirror
+from .library import LibraryIndex
+from .cache import ResponseCache
+from .artcache import ArtCache
+from .metrics import Instrumentation, MetricsCollector
+from .filters import Filter
@@ -0,0 +1,351 @@
+"""
+Cache for the cover art of the songs.
+"""
+import asyncio
+import collections
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+
+from .client import MpdCommandException, RECONNECT
+
+
+logger = logging.getLogger(__name__)
+
+# Marks a directory without entry in the cache
+_MISSING = object()
+
+
+class ArtCache(object):
+    """
+    Cache for the cover art returned by `albumart`.
+
+    mpd looks for the cover art of a song in its directory, so pictures are
+    cached by directory: the songs of an album share the same entry. Songs
+    without cover art are cached too.
+
+    Pictures are kept in a memory LRU, bounded both in number of entries and
+    in size, backed by an optional directory on disk, bounded in size. Files
+    found on disk are memory-mapped rather than read. Concurrent requests for
+    the same directory share a single fetch from mpd.
+
+    When mpd notifies a change of the database, or after a reconnection,
+    cover files may have been added, modified or removed: the entries stored
+    before are checked again when they are requested. An entry is kept if
+    the `Last-Modified` time of its directory, given by `lsinfo` on the
+    parent directory, is older than the entry, and fetched again otherwise.
+    Entries found on disk when the cache is created are checked the same
+    way.
+
+    Example:
+        art = ArtCache(client, '/var/cache/myapp/covers')
+        art.start()
+        picture = yield from art.get('Artist/Album/01 - Song.flac')
+    """
+
+    def __init__(self, client, directory=None, max_entries=256,
+                 max_bytes=32 * 2 ** 20, max_disk_bytes=256 * 2 ** 20,
+                 loop=None):
+        """
+        :param client: a MpdClientProtocol or a MpdClientPool.
+        :param directory: optional, directory where pictures are stored. It
+        is created if needed. Without directory, pictures are only kept in
+        memory.
+        :param max_entries: maximum number of entries in memory.
+        :param max_bytes: maximum total size of the pictures in memory.
+        :param max_disk_bytes: maximum total size of the pictures on disk.
+        """
+        self.client = client
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        if loop is None:
+            loop = getattr(client, 'loop', None) or asyncio.get_event_loop()
+        self.loop = loop
+        # directory -> (picture, time it was known to be valid), the picture
+        # is bytes, a mmap or None when there is none
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        # file name -> size of the pictures on disk, least recently used first
+        self._files = collections.OrderedDict()
+        self.disk_size = 0
+        # directory -> future of the fetch in progress
+        self._fetching = {}
+        # Incremented each time the cache is cleared, fetches started before
+        # are not stored.
+        self._generation = 0
+        # Entries stored before this time must be checked before being used
+        self._valid_since = time.time()
+        self.counters = collections.Counter()
+        self._subscription = None
+        if directory is not None:
+            self._load_directory()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(uri):
+        """
+        :param uri: uri of a song.
+        :return: the key of its cover art in the cache: its directory.
+        """
+        return uri.rpartition('/')[0]
+
+    def start(self):
+        """
+        Check the entries again each time mpd notifies a change of the
+        database, and after a reconnection.
+        """
+        self._subscription = self.client.subscribe(['database', RECONNECT],
+                                                   self._on_change)
+
+    def stop(self):
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+
+    def _on_change(self, changes):
+        self._valid_since = time.time()
+
+    @asyncio.coroutine
+    def get(self, uri):
+        """
+        Get the cover art of a song.
+
+        :param uri: uri of a song.
+        :return: the picture, as a bytes-like object which must not be
+        modified, or None if the song has no cover art.
+        """
+        key = self.key(uri)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] >= self._valid_since:
+            self.counters['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+        future = self._fetching.get(key)
+        if future is None:
+            self.counters['misses'] += 1
+            future = asyncio.async(self._fetch(key, uri), loop=self.loop)
+            self._fetching[key] = future
+            future.add_done_callback(
+                lambda f: self._fetch_done(key, f))
+        else:
+            self.counters['shared'] += 1
+        # Callers may give up without cancelling the fetch, which is shared.
+        picture = yield from asyncio.shield(future, loop=self.loop)
+        return picture
+
+    def clear(self):
+        """
+        Remove all the pictures from the cache, in memory and on disk.
+        """
+        self._generation += 1
+        self._entries.clear()
+        self.size = 0
+        for name in list(self._files):
+            self._remove_file(name)
+
+    def snapshot(self):
+        """
+        :return: a dictionary with the counters of the cache.
+        """
+        res = dict(self.counters)
+        res.update({'entries': len(self._entries), 'bytes': self.size,
+                    'files': len(self._files), 'disk_bytes': self.disk_size})
+        return res
+
+    def _fetch_done(self, key, future):
+        if self._fetching.get(key) is future:
+            del self._fetching[key]
+        if not future.cancelled():
+            # Do not log errors of fetches no caller waits for anymore
+            future.exception()
+
+    @asyncio.coroutine
+    def _fetch(self, key, uri):
+        generation = self._generation
+        started = time.time()
+        picture, stored = self._entries.get(key, (_MISSING, None))
+        on_disk = False
+        if picture is _MISSING:
+            picture, stored = self._read_file(key)
+            on_disk = picture is not _MISSING
+        if picture is not _MISSING and stored < self._valid_since:
+            unchanged = yield from self._unchanged(key, stored)
+            if unchanged:
+                self.counters['revalidations'] += 1
+                stored = started
+                self._touch_file(key)
+            else:
+                self.counters['invalidations'] += 1
+                if generation == self._generation:
+                    self._discard(key)
+                picture = _MISSING
+        elif on_disk:
+            self._touch_file(key)
+        if picture is _MISSING:
+            self.counters['fetches'] += 1
+            picture = yield from self.client.albumart(uri)
+            stored = started
+            if generation == self._generation and picture:
+                yield from self._write_file(key, picture, generation, stored)
+        elif on_disk:
+            self.counters['disk_hits'] += 1
+        if generation == self._generation:
+            self._put(key, picture, stored)
+        return picture
+
+    @asyncio.coroutine
+    def _unchanged(self, key, stored):
+        """
+        :return: True if the directory was not modified since the time an
+        entry was stored.
+        """
+        if not key:
+            # The music directory has no Last-Modified time
+            return False
+        try:
+            dirs, _, _ = yield from self.client.lsinfo(self.key(key),
+                                                       compact=True)
+        except MpdCommandException:
+            return False
+        for record in dirs:
+            if record.path == key:
+                # Last-Modified has a resolution of one second
+                return record.last_modified is not None and \
+                    record.last_modified < int(stored)
+        return False
+
+    def _put(self, key, picture, stored):
+        self._discard_entry(key)
+        size = 0 if picture is None else len(picture)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (picture, stored)
+        self.size += size
+        while len(self._entries) > self.max_entries or \
+                self.size > self.max_bytes:
+            _, (old, _) = self._entries.popitem(last=False)
+            if old is not None:
+                self.size -= len(old)
+            self.counters['evictions'] += 1
+
+    def _discard_entry(self, key):
+        old, _ = self._entries.pop(key, (None, None))
+        if old is not None:
+            self.size -= len(old)
+
+    def _discard(self, key):
+        self._discard_entry(key)
+        if self.directory is not None:
+            name = self._file_name(key)
+            if name in self._files:
+                self._remove_file(name)
+
+    # Disk storage
+
+    @staticmethod
+    def _file_name(key):
+        return hashlib.sha1(key.encode(encoding='UTF-8')).hexdigest()
+
+    def _load_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.'):
+                # Temporary file left by an interrupted write
+                os.unlink(path)
+                continue
+            st = os.stat(path)
+            files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._files[name] = size
+            self.disk_size += size
+        while self.disk_size > self.max_disk_bytes:
+            self._remove_file(next(iter(self._files)))
+
+    def _read_file(self, key):
+        """
+        :return: a tuple (picture, time the file was known to be valid), the
+        picture is _MISSING if the file is not in the cache.
+        """
+        if self.directory is None:
+            return _MISSING, None
+        name = self._file_name(key)
+        if name not in self._files:
+            return _MISSING, None
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                stored = os.fstat(f.fileno()).st_mtime
+                return mmap.mmap(f.fileno(), 0,
+                                 access=mmap.ACCESS_READ), stored
+        except (OSError, ValueError) as e:
+            logger.warning('Could not read %s: %s', path, e)
+            self._remove_file(name)
+            return _MISSING, None
+
+    def _touch_file(self, key):
+        # The modification time of a file is both the time it was known to
+        # be valid and the order of the least recently used files.
+        if self.directory is None:
+            return
+        name = self._file_name(key)
+        if name not in self._files:
+            return
+        self._files.move_to_end(name)
+        try:
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    @asyncio.coroutine
+    def _write_file(self, key, picture, generation, stored):
+        if self.directory is None or len(picture) > self.max_disk_bytes:
+            return
+        name = self._file_name(key)
+        try:
+            yield from self.loop.run_in_executor(None, self._write, name,
+                                                 picture, stored)
+        except OSError as e:
+            logger.warning('Could not store cover art of %s: %s', key, e)
+            return
+        if generation != self._generation:
+            # Cleared while the file was written
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            return
+        if name in self._files:
+            self.disk_size -= self._files.pop(name)
+        self._files[name] = len(picture)
+        self.disk_size += len(picture)
+        while self.disk_size > self.max_disk_bytes:
+            self._remove_file(next(iter(self._files)))
+
+    def _write(self, name, picture, stored):
+        # Written to a temporary file first, a file is never seen partly
+        # written.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(picture)
+            os.utime(tmp, (stored, stored))
+            os.replace(tmp, os.path.join(self.directory, name))
+        except OSError:
+            os.unlink(tmp)
+            raise
+
+    def _remove_file(self, name):
+        self.disk_size -= self._files.pop(name)
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except OSError:
+            pass
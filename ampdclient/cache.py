@@ -0,0 +1,189 @@
+"""
+Cache for the responses of read-only commands.
+"""
+import collections
+import time
+
+
+# Commands whose responses may change when mpd notifies a change of a
+# subsystem.
+SUBSYSTEM_COMMANDS = {
+    'database': frozenset(('lsinfo', 'listall', 'listallinfo', 'listfiles',
+                           'find', 'search', 'list', 'count', 'searchcount',
+                           'stats', 'readcomments')),
+    'update': frozenset(('stats',)),
+    'stored_playlist': frozenset(('listplaylists', 'listplaylist',
+                                  'listplaylistinfo', 'lsinfo')),
+    'playlist': frozenset(('playlistinfo', 'playlistid', 'playlistfind',
+                           'playlistsearch', 'plchanges', 'plchangesposid',
+                           'currentsong')),
+    'player': frozenset(('currentsong', 'stats')),
+    'output': frozenset(('outputs',)),
+    'mount': frozenset(('listmounts', 'lsinfo')),
+    'neighbor': frozenset(('listneighbors',)),
+}
+
+# Subsystems changed by commands modifying mpd's state.
+COMMAND_SUBSYSTEMS = {}
+for _subsystem, _names in (
+        ('playlist', ('add', 'addid', 'clear', 'delete', 'deleteid', 'load',
+                      'move', 'moveid', 'shuffle', 'swap', 'swapid', 'prio',
+                      'prioid', 'rangeid', 'addtagid', 'cleartagid')),
+        ('stored_playlist', ('save', 'rm', 'rename', 'playlistadd',
+                             'playlistclear', 'playlistdelete',
+                             'playlistmove')),
+        ('player', ('play', 'playid', 'pause', 'stop', 'next', 'previous',
+                    'seek', 'seekid', 'seekcur')),
+        ('mixer', ('setvol', 'volume')),
+        ('options', ('consume', 'crossfade', 'mixrampdb', 'mixrampdelay',
+                     'random', 'repeat', 'single', 'replay_gain_mode')),
+        ('output', ('enableoutput', 'disableoutput', 'toggleoutput',
+                    'outputset')),
+        ('update', ('update', 'rescan')),
+        ('mount', ('mount', 'unmount'))):
+    for _name in _names:
+        COMMAND_SUBSYSTEMS[_name] = frozenset((_subsystem,))
+
+# Default time to live, in seconds, for the responses of each command.
+DEFAULT_TTLS = {
+    'lsinfo': 600, 'listall': 600, 'listallinfo': 600, 'listfiles': 600,
+    'find': 600, 'search': 600, 'list': 600, 'count': 600,
+    'searchcount': 600, 'listplaylists': 600, 'listplaylist': 600,
+    'listplaylistinfo': 600, 'playlistinfo': 60, 'playlistid': 60,
+    'playlistfind': 60, 'playlistsearch': 60, 'currentsong': 10,
+    'stats': 10, 'outputs': 60, 'tagtypes': 3600, 'urlhandlers': 3600,
+    'decoders': 3600, 'commands': 3600, 'notcommands': 3600}
+
+
+class ResponseCache(object):
+    """
+    LRU cache for the responses of read-only commands, bounded both in number
+    of entries and in size.
+
+    Each command has its own time to live and entries are invalidated when
+    mpd notifies a change of a subsystem which may modify them (see
+    SUBSYSTEM_COMMANDS) or when a command modifying mpd's state is sent on
+    the same connection. Only commands with a time to live are cached.
+
+    Cached responses are shared by all callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 2 ** 20, ttls=None):
+        """
+        :param max_entries: maximum number of cached responses.
+        :param max_bytes: maximum total size of the cached responses, in
+        bytes (approximately).
+        :param ttls: optional, a dictionary {command name: ttl in seconds}
+        which replaces DEFAULT_TTLS.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        # command -> (lines, size, expiry, name)
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Incremented at each invalidation, see put()
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, name):
+        """
+        :param name: name of a command.
+        :return: True if the responses of this command can be cached.
+        """
+        return self.ttls.get(name) is not None
+
+    def get(self, cmd):
+        """
+        Get the cached response of a command.
+        :param cmd: the full command, as a string.
+        :return: the lines of the response, or None if it is not in the cache
+        or has expired.
+        """
+        entry = self._entries.get(cmd)
+        if entry is not None:
+            if entry[2] > time.monotonic():
+                self._entries.move_to_end(cmd)
+                self.hits += 1
+                return entry[0]
+            self._drop(cmd)
+        self.misses += 1
+        return None
+
+    def put(self, cmd, name, lines, generation=None):
+        """
+        Cache the response of a command.
+
+        :param cmd: the full command, as a string.
+        :param name: the name of the command.
+        :param lines: the lines of the response.
+        :param generation: value of `self.generation` when the command was
+        sent: if the cache was invalidated since, the response may be out of
+        date and is not cached.
+        """
+        ttl = self.ttls.get(name)
+        if ttl is None:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        size = len(cmd) + sum(len(line) for line in lines) + 8 * len(lines)
+        if size > self.max_bytes:
+            return
+        if cmd in self._entries:
+            self._drop(cmd)
+        self._entries[cmd] = (lines, size, time.monotonic() + ttl, name)
+        self.size += size
+        while len(self._entries) > self.max_entries or \
+                self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, subsystems):
+        """
+        Invalidate the responses which may be modified by changes of some
+        subsystems.
+        :param subsystems: set of the names of the changed subsystems.
+        """
+        names = set()
+        for subsystem in subsystems:
+            names |= SUBSYSTEM_COMMANDS.get(subsystem, frozenset())
+        if not names:
+            return
+        self.generation += 1
+        for cmd in [cmd for cmd, entry in self._entries.items()
+                    if entry[3] in names]:
+            self._drop(cmd)
+
+    def invalidate_command(self, name):
+        """
+        Invalidate the responses which may be modified by a command.
+        :param name: name of a command modifying mpd's state.
+        """
+        subsystems = COMMAND_SUBSYSTEMS.get(name)
+        if subsystems is None:
+            # Unknown command, it may change anything
+            self.clear()
+        else:
+            self.invalidate(subsystems)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self.size = 0
+
+    def snapshot(self):
+        """
+        :return: a dictionary with the counters of the cache.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._entries),
+                'bytes': self.size}
+
+    def _drop(self, cmd):
+        entry = self._entries.pop(cmd)
+        self.size -= entry[1]
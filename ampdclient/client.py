@@ -1,5 +1,20 @@
 import asyncio
+import collections
+import functools
+import logging
+import os
+import random
+import sys
+import time
+import weakref
 
+from .events import EventBus
+from .filters import _quote, build_filter
+from .queuesync import diff_queue
+from .records import make_record, Status, Stats
+
+
+logger = logging.getLogger(__name__)
 
 # Constants for pause / resume
 PAUSE_ON = 1
@@ -11,6 +26,50 @@ CONSUME_OFF = 0
 RANDOM_ON = 1
 RANDOM_OFF = 0
 
+# Default port of mpd
+DEFAULT_PORT = 6600
+
+# Maximum number of bytes requested from the socket at once when reading
+# responses.
+_READ_SIZE = 2 ** 18
+
+# Maximum number of batches of records buffered by a RecordIterator.
+_STREAM_BATCHES = 4
+
+# Limits of the command lists sent by the bulk methods (add_many, ...). mpd
+# rejects command lists larger than its max_command_list_size setting, 2 MB
+# by default.
+_LIST_MAX_COMMANDS = 1000
+_LIST_MAX_BYTES = 2 ** 16
+
+# Commands that do not modify the state of mpd
+READ_ONLY_COMMANDS = frozenset((
+    'status', 'stats', 'currentsong', 'ping', 'lsinfo', 'listall',
+    'listallinfo', 'listfiles', 'playlistinfo', 'playlistid', 'playlistfind',
+    'playlistsearch', 'plchanges', 'plchangesposid', 'find', 'search',
+    'list', 'count', 'searchcount', 'listplaylists', 'listplaylist',
+    'listplaylistinfo', 'outputs', 'commands', 'notcommands', 'tagtypes',
+    'urlhandlers', 'decoders', 'replay_gain_status', 'albumart',
+    'readpicture', 'readcomments', 'getfingerprint', 'listmounts',
+    'listneighbors', 'config'))
+
+# Commands whose responses hold binary data, they can not be sent with
+# command() or command_list()
+BINARY_COMMANDS = frozenset(('albumart', 'readpicture'))
+
+# Idle subsystems whose changes are reflected in the result of status
+STATUS_SUBSYSTEMS = frozenset(('player', 'mixer', 'options', 'playlist',
+                               'update'))
+
+# Pseudo subsystem published on the event bus when the connection to mpd has
+# been re-opened: changes may have been missed while it was lost.
+RECONNECT = 'reconnect'
+
+# Keys starting a new record in lsinfo and listallinfo responses
+LSINFO_KEYS = frozenset(('directory', 'file', 'playlist'))
+# Keys starting a new record in play queue responses
+PLAYLIST_KEYS = frozenset(('file',))
+
 
 def parse_lines_to_dict(lines):
     """
@@ -22,11 +81,14 @@ def parse_lines_to_dict(lines):
     :return: a dictionary with the names (as keys) and values found in the
     lines.
     """
-    res = {k: v.strip() for k, v in (m.split(':', 1) for m in lines)}
+    res = {}
+    for line in lines:
+        key, _, value = line.partition(':')
+        res[key] = value.strip()
     return res
 
 
-def parse_to_dicts(lines, containers):
+def parse_to_dicts(lines, containers, intern=False, factory=None):
     """
     Parses a list of lines into tuples places in the given containers.
 
@@ -39,41 +101,59 @@ def parse_to_dicts(lines, containers):
     key1: val21
     key2: val22
 
-
+    Lines are parsed in a single pass, without building any intermediate
+    list.
 
     :param lines:
     :param containers: a dictionary { token : array_instance}
+    :param intern: if True, the keys of the items are interned, which saves
+    a lot of memory when keeping many items, as the same tags are repeated
+    for every item.
+    :param factory: optional, a callable building the items placed in the
+    containers from the arguments `(token, tval, attrs)`, like
+    `records.make_record`. By default, items are tuples `(tval, attrs)`.
     :return:
     """
-
-    pairs = [(a, b.strip()) for a, b in (m.split(':', 1) for m in lines)]
+    keys = frozenset(containers)
     item = {}
     kind, name = None, None
-    for j in range(0, len(pairs)):
-        if pairs[j][0] in containers.keys():
-            if j != 0:
+    for line in lines:
+        key, _, value = line.partition(':')
+        if key in keys:
+            if kind is None:
+                pass
+            elif factory is None:
                 containers[kind].append((name, item))
+            else:
+                containers[kind].append(factory(kind, name, item))
             item = {}
-            kind = pairs[j][0]
-            name = pairs[j][1]
+            kind = key
+            name = value.strip()
+        elif intern:
+            item[sys.intern(key)] = value.strip()
         else:
-            item[pairs[j][0]] = pairs[j][1]
-    if kind is not None:
+            item[key] = value.strip()
+    if kind is None:
+        pass
+    elif factory is None:
         containers[kind].append((name, item))
+    else:
+        containers[kind].append(factory(kind, name, item))
 
     return containers
 
 
-def parse_playlist(lines):
+def parse_playlist(lines, intern=False, compact=False):
     files = []
     containers = {'file': files}
 
-    parse_to_dicts(lines, containers)
+    factory = make_record if compact else None
+    parse_to_dicts(lines, containers, intern, factory)
 
     return files
 
 
-def parse_lsinfo(lines):
+def parse_lsinfo(lines, intern=False, compact=False):
     dirs = []
     files = []
     playlists = []
@@ -81,11 +161,128 @@ def parse_lsinfo(lines):
                   'file': files,
                   'playlist': playlists}
 
-    parse_to_dicts(lines, containers)
+    factory = make_record if compact else None
+    parse_to_dicts(lines, containers, intern, factory)
 
     return dirs, files, playlists
 
 
+def parse_posid(lines):
+    """
+    Parse the response of plchangesposid.
+
+    :param lines: lines with the format 'cpos: 3' and 'Id: 12'.
+    :return: a list of tuples `(pos, id)`, as ints.
+    """
+    changes = []
+    pos = None
+    for line in lines:
+        key, _, value = line.partition(':')
+        if key == 'cpos':
+            pos = int(value)
+        elif key == 'Id':
+            changes.append((pos, int(value)))
+    return changes
+
+
+class _RecordParser(object):
+    """
+    Incremental version of parse_to_dicts.
+
+    Lines can be fed as they are received from mpd: a record is returned as
+    soon as the line starting the next one is seen.
+    """
+
+    def __init__(self, keys, factory):
+        """
+        :param keys: the set of the keys starting a new record.
+        :param factory: a callable building the record from the arguments
+        (kind, name, attrs).
+        """
+        self.keys = keys
+        self.factory = factory
+        self.kind = None
+        self.name = None
+        self.item = {}
+
+    def feed(self, lines):
+        """
+        Parse lines.
+        :param lines: a list of lines, in the same format as for
+        parse_to_dicts.
+        :return: the list of the records completed by these lines.
+        """
+        records = []
+        keys = self.keys
+        item = self.item
+        for line in lines:
+            key, _, value = line.partition(':')
+            if key in keys:
+                if self.kind is not None:
+                    records.append(self.factory(self.kind, self.name, item))
+                item = {}
+                self.kind = key
+                self.name = value.strip()
+            else:
+                item[key] = value.strip()
+        self.item = item
+        return records
+
+    def close(self):
+        """
+        Signal the end of the lines.
+        :return: the list of the remaining records.
+        """
+        records = []
+        if self.kind is not None:
+            records.append(self.factory(self.kind, self.name, self.item))
+        self.kind = None
+        self.item = {}
+        return records
+
+
+def parse_host(host=None, port=None):
+    """
+    Parse the address of mpd, with the conventions of the MPD_HOST and
+    MPD_PORT environment variables used by mpc.
+
+    The host is a host name or an IP address, the path of a unix socket
+    (starting with `/`) or the name of an abstract unix socket (starting with
+    `@`). It can be prefixed with a password followed by `@`, e.g.
+    `secret@/run/mpd/socket`.
+
+    :param host: optional, the host, `MPD_HOST` or 'localhost' by default.
+    :param port: optional, the port, `MPD_PORT` or 6600 by default. Ignored
+    for unix sockets.
+    :return: a tuple (host, port, password), port is None for unix sockets
+    and password is None if there is no password.
+    """
+    if host is None:
+        host = os.environ.get('MPD_HOST') or 'localhost'
+    password = None
+    if not _is_socket(host) and '@' in host:
+        password, _, host = host.partition('@')
+    if _is_socket(host):
+        return host, None, password
+    if port is None:
+        port = os.environ.get('MPD_PORT') or DEFAULT_PORT
+    return host, int(port), password
+
+
+def _is_socket(host):
+    """
+    :return: True if host is the path or the name of a unix socket.
+    """
+    return host is not None and host[:1] in ('/', '@')
+
+
+def _parse_id(resp):
+    """
+    Parse the song id of the response of addid, ['Id: 854'].
+    """
+    return int(resp[0].split(':')[1])
+
+
 def _format_range(start, end):
     """
     Build string for format specification.
@@ -101,7 +298,176 @@ def _format_range(start, end):
     return str(start)+':'+str(end)
 
 
+def _format_pos(pos):
+    """
+    :param pos: a position, or a tuple `(start, end)` for a range, `end`
+    being None for the end of the play queue.
+    :return: the string to be used for the position in the command.
+    """
+    if isinstance(pos, tuple):
+        return _format_range(*pos)
+    return str(pos)
+
+
+def _chunk_end(cmds, start, max_commands=_LIST_MAX_COMMANDS,
+               max_bytes=_LIST_MAX_BYTES):
+    """
+    Find the end of the next chunk of commands small enough to be sent as a
+    single command list.
+
+    :param cmds: a list of commands, as strings without final `\n`.
+    :param start: index of the first command of the chunk.
+    :return: the index following the last command of the chunk. A command
+    larger than max_bytes is sent alone.
+    """
+    end = start
+    size = 0
+    while end < len(cmds) and end - start < max_commands:
+        size += len(cmds[end].encode(encoding='UTF-8')) + 1
+        if size > max_bytes and end > start:
+            break
+        end += 1
+    return end
+
+
+def _find_response_end(buf, start=0):
+    """
+    Look for the line terminating the response at the beginning of buf.
+
+    A response is terminated by a line starting with `OK` or `ACK`. The
+    search is done on bytes, without splitting or decoding lines.
+
+    :param buf: a bytes-like object, starting with the response.
+    :param start: offset from which to search, data before it is known not
+    to contain a complete terminating line.
+    :return: None if buf does not contain a complete response, otherwise a
+    tuple (data_end, line_end) where data_end is the offset of the
+    terminating line and line_end the offset of its final `\n`.
+    """
+    if buf[:2] == b'OK' or buf[:3] == b'ACK':
+        data_end = 0
+    else:
+        i_ok = buf.find(b'\nOK', start)
+        i_ack = buf.find(b'\nACK', start)
+        if i_ok == -1 and i_ack == -1:
+            return None
+        if i_ok == -1 or (i_ack != -1 and i_ack < i_ok):
+            data_end = i_ack + 1
+        else:
+            data_end = i_ok + 1
+    line_end = buf.find(b'\n', data_end)
+    if line_end == -1:
+        return None
+    return data_end, line_end
+
+
+def _request_name(cmd):
+    """
+    :param cmd: a command, as bytes.
+    :return: the name of the command, 'command_list' for command lists.
+    """
+    name = cmd.split(None, 1)[0].decode(encoding='UTF-8')
+    if name.startswith('command_list'):
+        return 'command_list'
+    return name
+
+
+def _command_name(cmd):
+    """
+    :param cmd: a command, as a string.
+    :return: the name of the command.
+    """
+    return cmd.lstrip().partition(' ')[0].rstrip('\n')
+
+
+def _check_text_command(name):
+    """
+    Raise a ValueError if the response of a command is not text.
+    """
+    if name in BINARY_COMMANDS:
+        raise ValueError('The response of {0} is binary, use the {0}() '
+                         'method'.format(name))
+
+
+def _parse_idle(lines):
+    """
+    Parse the response of the idle command.
+    :param lines: lines like 'changed: player'
+    :return: the set of the names of the subsystems that changed.
+    """
+    return {line.partition(':')[2].strip() for line in lines
+            if line.startswith('changed:')}
+
+
+def _decode_lines(buf, end):
+    """
+    Decode the lines at the beginning of buf.
+
+    :param buf: a bytearray.
+    :param end: offset of the end of the lines to decode, the data before
+    must be complete lines ending with `\n`.
+    :return: the list of the decoded lines, without the final `\n`.
+    """
+    if end == 0:
+        return []
+    with memoryview(buf) as view:
+        lines = str(view[:end - 1], encoding='UTF-8').split('\n')
+    return lines
+
+
+def _parse_ack(line):
+    """
+    Build an exception from an mpd error line.
+
+    The error line has the following format:
+    `ACK [error@command_listNum] {current_command} message_text`
+
+    :param line: the error line, as sent by mpd (without the final newline)
+    :return: a MpdCommandException instance
+    """
+    i = line.index('@')
+    error = line[5:i]
+    l = int(line[i+1:line.index(']')])
+    command = line[line.index('{')+1:line.index('}')]
+    msg = line[line.index('}')+1:].strip()
+    return MpdCommandException(line, error, l, command, msg)
+
+
+def _split_command_list(lines):
+    """
+    Split the response of a command list into the responses of each command.
+
+    With `command_list_ok_begin`, mpd sends a `list_OK` line after the
+    response of each command of the list. If a command fails, the following
+    commands are not executed and the response ends with an `ACK` line.
+
+    :param lines: the lines of the response of the whole command list.
+    :return: a tuple (results, ack) where results is a list with the lines
+    of the response of each successful command and ack is the error line, or
+    None if all commands succeeded.
+    """
+    results = []
+    current = []
+    for line in lines:
+        if line == 'list_OK':
+            results.append(current)
+            current = []
+        elif line.startswith('ACK'):
+            return results, line
+        else:
+            current.append(line)
+    return results, None
+
+
 class MpdCommandException(Exception):
+    """
+    Raised when mpd returns an error for a command.
+
+    `error` (the error code) and `command` (the name of the failing command)
+    are strings, as sent by mpd. `line`, the index of the failing command in
+    a command list, is an int: it was a string in versions without
+    command_list(), `int(e.line)` works with both.
+    """
 
     def __init__(self, message, error, line, command, msg):
 
@@ -114,35 +480,476 @@ class MpdCommandException(Exception):
         self.command = command
         # Error message.
         self.msg = msg
+        # For command lists, responses of the commands that succeeded before
+        # the failing one.
+        self.results = []
+
+
+class MpdConnectionError(ConnectionError):
+    """
+    Raised when the connection to mpd is lost, or can not be used anymore.
+    """
+
+
+class _Request(object):
+    """
+    A command waiting to be sent to mpd, with the future that will receive
+    its response.
+
+    `reader` is the coroutine function used to read the response, when it
+    needs a special treatment, the default is to read all the lines of the
+    response.
+
+    `idempotent` requests can be sent again if the connection is lost before
+    their response is received.
+    """
+
+    __slots__ = ('cmd', 'future', 'reader', 'deadline', 'stream',
+                 'idempotent', 'queued')
+
+    def __init__(self, cmd, loop=None, reader=None, deadline=None,
+                 stream=None, idempotent=False):
+        self.cmd = cmd
+        self.future = asyncio.Future(loop=loop)
+        self.reader = reader
+        # Loop time after which the command is not worth sending anymore
+        self.deadline = deadline
+        # _RecordStream receiving the response, for iter_command()
+        self.stream = stream
+        self.idempotent = idempotent
+        # Loop time at which the request was queued
+        self.queued = None
+
+    def fail(self, exc):
+        """
+        Fail the request with an exception.
+        """
+        if self.stream is not None:
+            self.stream.fail(exc)
+        if not self.future.done():
+            self.future.set_exception(exc)
+            # Callers may have given up already, do not log the exception
+            self.future.exception()
+
+
+# End of stream marker for _RecordStream
+_END = object()
+
+
+class _RecordStream(object):
+    """
+    Worker side of a RecordIterator: the bounded queue of batches of records
+    filled by the worker while reading the response.
+    """
+
+    def __init__(self, keys, factory, loop=None):
+        self.parser = _RecordParser(keys, factory)
+        self.queue = asyncio.Queue(maxsize=_STREAM_BATCHES, loop=loop)
+        self.f_closed = asyncio.Future(loop=loop)
+        self.loop = loop
+        # Exception waiting for some space in the queue, see fail()
+        self.error = None
+
+    @asyncio.coroutine
+    def put(self, batch):
+        """
+        Put a batch of records (or _END or an exception) in the queue,
+        waiting for some space if it is full. Batches are dropped once the
+        iterator has been closed.
+        """
+        if self.f_closed.done():
+            return
+        if not self.queue.full():
+            self.queue.put_nowait(batch)
+            return
+        f_put = asyncio.async(self.queue.put(batch), loop=self.loop)
+        yield from asyncio.wait([f_put, self.f_closed], loop=self.loop,
+                                return_when=asyncio.FIRST_COMPLETED)
+        if not f_put.done():
+            f_put.cancel()
+
+    def fail(self, exc):
+        """
+        Hand an exception over to the iterator without waiting: if the queue
+        is full, the exception is raised once it has been consumed.
+        """
+        if self.queue.full():
+            self.error = exc
+        else:
+            self.queue.put_nowait(exc)
+
+    def close(self):
+        if not self.f_closed.done():
+            self.f_closed.set_result(True)
+
+
+class RecordIterator(object):
+    """
+    Asynchronous iterator over the records of a response, as returned by
+    the `iter_*` methods of MpdClientProtocol.
+
+    Records are parsed as the response is received and only a few batches
+    of records are buffered: when the buffer is full, reading the response
+    is paused until records are consumed. The connection can not be used for
+    other commands meanwhile, so the iterator must be either consumed or
+    closed.
+
+    With python >= 3.5:
+
+        async for uri, attrs in client.iter_playlistinfo():
+            ...
+
+    With python 3.4:
+
+        it = client.iter_playlistinfo()
+        while True:
+            record = yield from it.next()
+            if record is None:
+                break
+    """
+
+    def __init__(self, stream, request):
+        self._stream = stream
+        self._request = request
+        self._batch = collections.deque()
+        self._done = False
+        # Stop filling the queue if the iterator is dropped before the end
+        weakref.finalize(self, stream.close)
+
+    @asyncio.coroutine
+    def next(self):
+        """
+        Get the next record.
+        :return: the record, or None at the end of the response.
+        """
+        while not self._batch:
+            if self._done:
+                return None
+            stream = self._stream
+            if stream.error is not None and stream.queue.empty():
+                self._done = True
+                raise stream.error
+            batch = yield from stream.queue.get()
+            if batch is _END:
+                self._done = True
+            elif isinstance(batch, Exception):
+                self._done = True
+                raise batch
+            else:
+                self._batch.extend(batch)
+        return self._batch.popleft()
+
+    def close(self):
+        """
+        Stop iterating: the rest of the response is read and dropped.
+        """
+        self._done = True
+        self._batch.clear()
+        self._request.future.cancel()
+        self._stream.close()
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        record = yield from self.next()
+        if record is None:
+            raise StopAsyncIteration
+        return record
+
+
+class DirectoryWalker(object):
+    """
+    Asynchronous iterator over a directory tree of the music database, like
+    os.walk, as returned by `MpdClientProtocol.walk`.
+
+    Directories are listed with lsinfo, up to `concurrency` of them ahead of
+    the consumer: on a single connection their commands are pipelined, on a
+    MpdClientPool they are spread over its connections. Only the listings
+    of these directories are kept in memory.
+
+    Directories are returned in breadth-first order, as tuples
+    `(path, dirs, files, playlists)` where dirs, files and playlists are as
+    returned by lsinfo. As with os.walk, directories removed from dirs
+    before getting the next directory are not visited.
+
+    With python >= 3.5:
+
+        async for path, dirs, files, playlists in client.walk('Rock'):
+            ...
+
+    With python 3.4:
+
+        walker = client.walk('Rock')
+        while True:
+            res = yield from walker.next()
+            if res is None:
+                break
+    """
+
+    def __init__(self, client, path='', concurrency=8, compact=False,
+                 onerror=None, loop=None):
+        """
+        :param client: a MpdClientProtocol or a MpdClientPool.
+        :param path: path of the directory to walk through, the whole
+        database by default.
+        :param concurrency: maximum number of directories being listed at
+        the same time.
+        :param compact: if True, items are Directory, Song and Playlist
+        instances, see lsinfo.
+        :param onerror: optional, a function called with the path and the
+        MpdCommandException when a directory can not be listed, for instance
+        because it was removed. The directory is then skipped. By default,
+        the exception is raised.
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.compact = compact
+        self.onerror = onerror
+        self.loop = loop or asyncio.get_event_loop()
+        # Directories to list
+        self._paths = collections.deque([path])
+        # Tuples (path, future of lsinfo) of the directories being listed
+        self._listing = collections.deque()
+        # Sub-directories of the last directory returned, they are only
+        # listed once the consumer had a chance to prune them.
+        self._dirs = None
+
+    @asyncio.coroutine
+    def next(self):
+        """
+        Get the next directory.
+        :return: a tuple `(path, dirs, files, playlists)`, or None when all
+        directories have been walked through.
+        """
+        if self._dirs is not None:
+            self._paths.extend(d.path if self.compact else d[0]
+                               for d in self._dirs)
+            self._dirs = None
+        while True:
+            self._prefetch()
+            if not self._listing:
+                return None
+            path, future = self._listing.popleft()
+            try:
+                dirs, files, playlists = yield from future
+            except MpdCommandException as e:
+                if self.onerror is None:
+                    self.close()
+                    raise
+                self.onerror(path, e)
+                continue
+            except (Exception, asyncio.CancelledError):
+                self.close()
+                raise
+            self._prefetch()
+            self._dirs = dirs
+            return path, dirs, files, playlists
+
+    def close(self):
+        """
+        Stop walking: pending listings are cancelled.
+        """
+        self._paths.clear()
+        self._dirs = None
+        for _, future in self._listing:
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                future.exception()
+        self._listing.clear()
+
+    def _prefetch(self):
+        while self._paths and len(self._listing) < self.concurrency:
+            path = self._paths.popleft()
+            future = asyncio.async(self.client.lsinfo(path, self.compact),
+                                   loop=self.loop)
+            self._listing.append((path, future))
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        res = yield from self.next()
+        if res is None:
+            raise StopAsyncIteration
+        return res
+
+
+def _make_triple(kind, name, attrs):
+    return kind, name, attrs
+
+
+def _make_pair(kind, name, attrs):
+    return name, attrs
+
+
+def _make_value(kind, name, attrs):
+    return name
+
+
+class _TagNames(frozenset):
+    """
+    Set of tag names, compared case-insensitively: mpd's responses use its
+    own case for tag names.
+    """
+
+    def __contains__(self, name):
+        return frozenset.__contains__(self, name.lower())
+
+
+def _search_args(expression, tags, sort=None, window=None, group=None):
+    """
+    Build the arguments of find, search, list and count.
+
+    :return: the arguments as a string, starting with a space, empty if
+    there are none.
+    """
+    args = ''
+    expression = build_filter(expression, tags)
+    if expression is not None:
+        args += ' ' + _quote(expression)
+    if sort is not None:
+        args += ' sort ' + sort
+    if window is not None:
+        args += ' window ' + _format_range(*window)
+    if group is not None:
+        args += ' group ' + group
+    return args
 
 
 class MpdClientProtocol(asyncio.StreamReaderProtocol):
 
-    def __init__(self, host=None, port=None, timeout=10, loop=None):
+    def __init__(self, host=None, port=None, timeout=10, loop=None,
+                 cache=None, reconnect=True, reconnect_delay=0.5,
+                 reconnect_max_delay=30, password=None,
+                 instrumentation=None, idle=True, keepalive=30):
 
         self.host = host
         self.port = port
+        # Password sent after connecting, None for no password
+        self.password = password
+        # True when connected through a unix socket
+        self.local = _is_socket(host)
+        # Default timeout for commands, in seconds, None for no timeout
         self.timeout = timeout
+        # Optional ResponseCache for read-only commands
+        self.cache = cache
+        # Re-open the connection when it is lost, waiting reconnect_delay
+        # seconds after the first failed attempt, doubled after each failed
+        # attempt up to reconnect_max_delay.
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        # Go idle between commands to receive the changes. Without idle, the
+        # changes are not received: they must be passed to notify(). A ping
+        # is then sent after keepalive seconds without commands, as mpd
+        # closes connections inactive for `connection_timeout` seconds (60
+        # by default).
+        self.idle = idle
+        self.keepalive = keepalive
 
         self._protocol_version = None
+        # Called synchronously by the worker with the raw response of idle,
+        # prefer subscribe() which does not block the worker.
         self.cb_onchange = None
 
+        # Last known status, None when it must be fetched from mpd.
+        self._status = None
+        # Incremented each time the status is invalidated.
+        self._status_gen = 0
+
+        if loop is None:
+            loop = asyncio.get_event_loop()
         self.loop = loop
+        # Number of commands that timed out ('timeouts'), were dropped
+        # because their deadline passed before they were sent ('expired') or
+        # whose response was discarded because their caller gave up
+        # ('discarded'), and number of reconnections ('reconnects').
+        self.counters = collections.Counter()
+        # Optional metrics.Instrumentation, whose hooks are called by the
+        # worker.
+        self.instrumentation = instrumentation
+        # Totals of the bytes received, of the lines of responses decoded and
+        # parsed by the worker and of the time spent doing so, in seconds.
+        self.bytes_received = 0
+        self.lines_parsed = 0
+        self.parse_time = 0.0
+        self.events = EventBus(loop)
         stream_reader = asyncio.StreamReader(loop=loop)
         super().__init__(stream_reader, self.client_connected, loop)
 
-        self._responses = asyncio.Queue(loop=loop)
         self._cmds = asyncio.Queue(loop=loop)
-
+        # Requests to send before the ones in _cmds, kept from a lost
+        # connection.
+        self._retry = []
+        # Requests sent and waiting for their response
+        self._sent = collections.deque()
+        # Number of commands queued or waiting for their response
+        self._pending = 0
+        # Read-only commands queued or waiting for their response, by command
+        self._in_flight = {}
+
+        # Data received from mpd and not consumed yet.
+        self._buffer = bytearray()
+
+        # Set when the current connection is closed.
         self.f_closed = asyncio.Future(loop=loop)
+        # Set when the client is stopped: closed, or the connection was lost
+        # and is not re-opened.
         self.f_stopped = asyncio.Future(loop=loop)
+        # Number of times the connection has been opened
+        self.connections = 0
+        self._closing = False
+        self._reconnect_task = None
+        self._delay = reconnect_delay
+        # True once the current connection got past the welcome message and
+        # the password.
+        self._established = False
 
     @property
     def protocol_version(self):
         return self._protocol_version
 
+    @property
+    def address(self):
+        """
+        Address of mpd, for messages.
+        """
+        if self.local:
+            return self.host
+        return '{}:{}'.format(self.host, self.port)
+
+    @property
+    def pending(self):
+        """
+        Number of commands queued or waiting for their response.
+        """
+        return self._pending
+
+    def subscribe(self, subsystems=None, callback=None):
+        """
+        Subscribe to the changes notified by mpd.
+
+        Example:
+            def on_change(changes):
+                print(changes)
+            client.subscribe(['player', 'mixer'], on_change)
+
+        :param subsystems: iterable of the names of the subsystems to
+        subscribe to ('player', 'playlist', 'database', 'mixer', 'options',
+        ...), None for all subsystems.
+        :param callback: optional, a function or coroutine called, in its own
+        task, with the set of the changed subsystems. Without callback,
+        changes are received with `yield from subscription.get()`.
+        :return: a Subscription, call its `close()` method to unsubscribe.
+        """
+        return self.events.subscribe(subsystems, callback)
+
     @asyncio.coroutine
-    def command(self, cmd):
+    def command(self, cmd, timeout=None):
         """
         Send an arbitrary command to mpd.
         This method raises a MpdCommandException if mpd returned a error.
@@ -151,28 +958,138 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
 
         :param cmd:The command must be a string. If it does not end with
         `\n`, one will be added.
-        :return:
+        :param timeout: optional, maximum time to wait for the response, in
+        seconds, `self.timeout` by default. If it expires, an
+        asyncio.TimeoutError is raised.
+        :return: the lines of the response. When the same read-only command
+        is already waiting for its response, no new command is sent and the
+        same response is returned to all callers: it must not be modified.
+
+        If the connection is lost before the response is received, read-only
+        commands are sent again once it is re-opened, other commands fail
+        with a MpdConnectionError as mpd may or may not have executed them.
         """
-        cmd = cmd.encode(encoding='UTF-8')
-        if cmd[-1] != b'\n':
+        if not cmd.endswith('\n'):
             # make sure the command ends with \n, otherwise the client will
             # block
-            cmd += b'\n'
-        yield from self._cmds.put(cmd)
-        resp = yield from self._get_response()
+            cmd += '\n'
+        name = _command_name(cmd)
+        _check_text_command(name)
+        self._before_command(name)
+        cache = self.cache
+        if cache is not None and cache.cacheable(name):
+            resp = cache.get(cmd)
+            if resp is not None:
+                return resp
+            generation = cache.generation
+        read_only = name in READ_ONLY_COMMANDS
+        resp = yield from self._execute(cmd.encode(encoding='UTF-8'), timeout,
+                                        read_only, read_only)
+        if resp and resp[-1].startswith('ACK'):
+            raise _parse_ack(resp[-1])
+        if cache is not None and cache.cacheable(name):
+            cache.put(cmd, name, resp, generation)
         return resp
 
     @asyncio.coroutine
-    def status(self):
+    def command_list(self, cmds, timeout=None):
+        """
+        Send several commands to mpd in a single command list.
+
+        All commands are written at once, between `command_list_ok_begin` and
+        `command_list_end`, and their responses are read in a single round
+        trip, which is much faster than sending them one by one.
+
+        If a command fails, mpd does not execute the following ones and a
+        MpdCommandException is raised. Its `line` attribute is the index of
+        the failing command in `cmds` and its `results` attribute holds the
+        responses of the commands that succeeded before it.
+
+        Example: `client.command_list(['addid "a.mp3"', 'addid "b.mp3"'])`
+
+        :param cmds: an iterable of commands, as strings.
+        :param timeout: optional, maximum time to wait for the response, in
+        seconds, `self.timeout` by default.
+        :return: a list with the response (a list of lines) of each command,
+        in the same order as `cmds`.
+        """
+        cmds = [c.rstrip('\n') for c in cmds]
+        if not cmds:
+            return []
+        names = [_command_name(c) for c in cmds]
+        for name in names:
+            _check_text_command(name)
+        for name in names:
+            self._before_command(name)
+        cmd = 'command_list_ok_begin\n' + '\n'.join(cmds) + \
+              '\ncommand_list_end\n'
+        idempotent = all(name in READ_ONLY_COMMANDS for name in names)
+        resp = yield from self._execute(cmd.encode(encoding='UTF-8'), timeout,
+                                        idempotent=idempotent)
+        results, ack = _split_command_list(resp)
+        if ack is not None:
+            e = _parse_ack(ack)
+            e.results = results
+            raise e
+        return results
+
+    def iter_command(self, cmd, keys, factory=_make_triple):
+        """
+        Send a command to mpd and iterate over the records of its response,
+        as they are received.
+
+        :param cmd: the command, as a string.
+        :param keys: the set of the keys starting a new record in the
+        response, like the keys of the `containers` of parse_to_dicts.
+        :param factory: optional, a callable building each record from the
+        arguments `(kind, name, attrs)`. By default, records are returned as
+        such tuples.
+        :return: a RecordIterator. If mpd returns an error, a
+        MpdCommandException is raised by the iterator.
+        """
+        cmd = cmd.encode(encoding='UTF-8')
+        if not cmd.endswith(b'\n'):
+            cmd += b'\n'
+        stream = _RecordStream(keys, factory, self.loop)
+        request = _Request(cmd, self.loop,
+                           functools.partial(self._read_stream, stream),
+                           stream=stream)
+        self._queue(request)
+        return RecordIterator(stream, request)
+
+    @asyncio.coroutine
+    def status(self, refresh=False):
+        """
+        Get the status of mpd.
+
+        The last status is kept and returned without querying mpd until a
+        change is notified by mpd on one of the subsystems in
+        STATUS_SUBSYSTEMS or a command modifying mpd's state is sent. Use
+        `Status.elapsed_now()` to get the current elapsed time of a kept
+        status.
+
+        :param refresh: if True, always query mpd.
+        :return: a Status instance.
+        """
+        if self._status is not None and not refresh:
+            return self._status
+        gen = self._status_gen
         lines = yield from self.command('status')
-        # TODO: used named tuple for status info
-        return parse_lines_to_dict(lines)
+        status = Status(parse_lines_to_dict(lines))
+        if gen == self._status_gen:
+            # Only keep the status if nothing changed in the meantime
+            self._status = status
+        return status
 
     @asyncio.coroutine
     def stats(self):
+        """
+        Get statistics about mpd and its database.
+
+        :return: a Stats instance.
+        """
         lines = yield from self.command('stats')
-        # TODO: used named tuple for stats info
-        return parse_lines_to_dict(lines)
+        return Stats(parse_lines_to_dict(lines))
 
     @asyncio.coroutine
     def clearerror(self):
@@ -186,11 +1103,13 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         return True
 
     @asyncio.coroutine
-    def lsinfo(self, path):
+    def lsinfo(self, path, compact=False):
         """
         list information.
 
         :param path:
+        :param compact: if True, items are returned as compact records
+        (Directory, Song and Playlist instances) instead of tuples.
         :return: a tuple (dirs, files, playlists) corresponding to the
         content of the path.
         dirs, files, playlists are arrays of tuples (path, info) where path
@@ -198,26 +1117,271 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         a dictionnary of meta-data for this item.
 
         """
-        resp = yield from self.command('lsinfo "' + path + '"')
-        # TODO: improve return format, array of tuples of dict...
-        return parse_lsinfo(resp)
+        resp = yield from self.command('lsinfo ' + _quote(path))
+        return parse_lsinfo(resp, compact=compact)
+
+    def iter_lsinfo(self, path, compact=False):
+        """
+        Streaming version of lsinfo.
+
+        :param path:
+        :param compact: if True, records are Directory, Song and Playlist
+        instances.
+        :return: a RecordIterator over tuples (kind, path, info) where kind
+        is 'directory', 'file' or 'playlist'.
+        """
+        factory = make_record if compact else _make_triple
+        return self.iter_command('lsinfo ' + _quote(path), LSINFO_KEYS,
+                                 factory)
+
+    @asyncio.coroutine
+    def lsinfo_many(self, paths, compact=False, timeout=None):
+        """
+        lsinfo on several paths, sent as chunked command lists like
+        `add_many`. lsinfo on the uri of a song returns this song.
+
+        :param paths: an iterable of paths of directories or songs.
+        :param compact: if True, items are returned as compact records.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each path, a tuple (dirs, files,
+        playlists) as returned by lsinfo, or a MpdCommandException.
+        """
+        cmds = ['lsinfo ' + _quote(path) for path in paths]
+        res = yield from self._command_many(
+            cmds, functools.partial(parse_lsinfo, compact=compact), timeout)
+        return res
+
+    def iter_listallinfo(self, path='', compact=False):
+        """
+        List recursively all the content of a directory, with meta-data.
+
+        :param path: optional, path of the directory, the whole database is
+        listed by default.
+        :param compact: if True, records are Directory, Song and Playlist
+        instances.
+        :return: a RecordIterator over tuples (kind, path, info) where kind
+        is 'directory', 'file' or 'playlist'.
+        """
+        factory = make_record if compact else _make_triple
+        return self.iter_command('listallinfo ' + _quote(path), LSINFO_KEYS,
+                                 factory)
+
+    def walk(self, path='', concurrency=8, compact=False, onerror=None):
+        """
+        Walk through a directory tree of the music database, like os.walk,
+        listing several directories ahead.
+
+        Example: `async for path, dirs, files, playlists in client.walk():`
+
+        :param path: path of the directory to walk through, the whole
+        database by default.
+        :param concurrency: maximum number of lsinfo commands in flight.
+        :param compact: if True, items are compact records, see lsinfo.
+        :param onerror: optional, a function called with the path and the
+        exception when a directory can not be listed, which is then skipped.
+        :return: a DirectoryWalker.
+        """
+        return DirectoryWalker(self, path, concurrency, compact, onerror,
+                               self.loop)
+
+    # Searching the database
+    #
+    # Conditions are given as a filter expression (see filters.Filter, mpd
+    # 0.21 or later is required), as tag values in keyword arguments, or
+    # both, in which case songs must match all of them.
+
+    @asyncio.coroutine
+    def find(self, expression=None, sort=None, window=None, compact=False,
+             **tags):
+        """
+        Search the database for songs matching a filter, case-sensitively.
+
+        Example: `songs = yield from client.find(artist='Nirvana')`
+
+        :param expression: optional, a Filter or a filter expression as a
+        string.
+        :param sort: optional, the tag to sort the results by, prefixed with
+        '-' for a descending order.
+        :param window: optional, a tuple `(start, end)`: only the results
+        between start and end (not included) are returned, end can be None.
+        :param compact: if True, songs are returned as Song instances.
+        :param tags: tag values, like `album='Nevermind'`.
+        :return: a list of tuples `(uri, attrs)`, like playlistinfo.
+        """
+        args = _search_args(expression, tags, sort, window)
+        lines = yield from self.command('find' + args)
+        return parse_playlist(lines, compact=compact)
+
+    @asyncio.coroutine
+    def search(self, expression=None, sort=None, window=None, compact=False,
+               **tags):
+        """
+        Search the database for songs matching a filter, ignoring case.
+
+        See `find` for the parameters.
+        """
+        args = _search_args(expression, tags, sort, window)
+        lines = yield from self.command('search' + args)
+        return parse_playlist(lines, compact=compact)
+
+    def iter_find(self, expression=None, sort=None, window=None,
+                  compact=False, **tags):
+        """
+        Streaming version of find: songs can be used as soon as they are
+        received, before mpd has sent the whole result.
+
+        :return: a RecordIterator over tuples `(uri, attrs)`, or Song
+        instances when compact is True.
+        """
+        factory = make_record if compact else _make_pair
+        args = _search_args(expression, tags, sort, window)
+        return self.iter_command('find' + args, PLAYLIST_KEYS, factory)
+
+    def iter_search(self, expression=None, sort=None, window=None,
+                    compact=False, **tags):
+        """
+        Streaming version of search, see iter_find.
+        """
+        factory = make_record if compact else _make_pair
+        args = _search_args(expression, tags, sort, window)
+        return self.iter_command('search' + args, PLAYLIST_KEYS, factory)
+
+    @asyncio.coroutine
+    def list(self, tag, expression=None, group=None, **tags):
+        """
+        List the distinct values of a tag.
+
+        Example: `albums = yield from client.list('album', artist='Nirvana')`
+
+        :param tag: name of the tag, like 'artist' or 'album'.
+        :param expression: optional, a Filter or a filter expression as a
+        string: only songs matching it are considered.
+        :param group: optional, name of a tag to group the values by.
+        :param tags: tag values, like `genre='Rock'`.
+        :return: the list of the values, or of tuples `(group_value, value)`
+        when group is given.
+        """
+        args = _search_args(expression, tags, group=group)
+        lines = yield from self.command('list ' + tag + args)
+        if group is None:
+            return [line.partition(':')[2].strip() for line in lines]
+        values = []
+        group_value = None
+        group = group.lower()
+        for line in lines:
+            key, _, value = line.partition(':')
+            if key.lower() == group:
+                group_value = value.strip()
+            else:
+                values.append((group_value, value.strip()))
+        return values
+
+    def iter_list(self, tag, expression=None, **tags):
+        """
+        Streaming version of list, without group.
+
+        :return: a RecordIterator over the values.
+        """
+        args = _search_args(expression, tags)
+        return self.iter_command('list ' + tag + args,
+                                 _TagNames((tag.lower(),)), _make_value)
+
+    @asyncio.coroutine
+    def count(self, expression=None, group=None, **tags):
+        """
+        Count the songs matching a filter and their total duration.
+
+        Example: `yield from client.count(group='album', artist='Nirvana')`
+
+        :param expression: optional, a Filter or a filter expression as a
+        string.
+        :param group: optional, name of a tag to group the counts by.
+        :param tags: tag values, like `artist='Nirvana'`.
+        :return: a tuple `(songs, playtime)`, playtime being in seconds, or
+        a list of tuples `(group_value, songs, playtime)` when group is
+        given.
+        """
+        args = _search_args(expression, tags, group=group)
+        lines = yield from self.command('count' + args)
+        counts = []
+        group_value = None
+        songs = 0
+        for line in lines:
+            key, _, value = line.partition(':')
+            if key == 'songs':
+                songs = int(value)
+            elif key == 'playtime':
+                counts.append((group_value, songs, int(float(value))))
+            else:
+                group_value = value.strip()
+        if group is None:
+            return counts[0][1:] if counts else (0, 0)
+        return counts
+
+    @asyncio.coroutine
+    def albumart(self, uri, sink=None):
+        """
+        Get the cover art of a song, i.e. the `cover.png`, `cover.jpg`...
+        file in the directory of the song.
+
+        mpd sends pictures in chunks (8 KiB by default, see mpd's
+        `binarylimit` command), which are fetched one after the other. With
+        a sink, each chunk is handed over to the sink as soon as it is
+        received and only one chunk is kept in memory at a time.
+
+        Example: `size = yield from client.albumart(uri, f.write)`
+
+        :param uri: uri of a song.
+        :param sink: optional, a function or coroutine called with each chunk
+        of the picture, as a bytes-like object which is only valid during the
+        call.
+        :return: the size of the picture with a sink, the picture as a
+        bytearray otherwise. None if there is no cover art.
+        """
+        attrs, picture = yield from self._fetch_binary('albumart', uri, sink)
+        return picture
+
+    @asyncio.coroutine
+    def readpicture(self, uri, sink=None):
+        """
+        Get the picture embedded in a song file, see albumart().
+
+        :param uri: uri of a song.
+        :param sink: optional, a function or coroutine called with each chunk
+        of the picture.
+        :return: a tuple (type, picture) where type is the MIME type of the
+        picture, if known, and picture is as returned by albumart(). None if
+        there is no picture.
+        """
+        attrs, picture = yield from self._fetch_binary('readpicture', uri,
+                                                       sink)
+        if picture is None:
+            return None
+        return attrs.get('type'), picture
 
     @asyncio.coroutine
     def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            # Not connected
+            self._reconnect_task.cancel()
+            self._stop()
         try:
             yield from self.command('close')
-        except MpdCommandException:
+        except (MpdCommandException, MpdConnectionError):
             pass
         yield from self.f_stopped
 
     # Playlist
 
-    def playlistid(self, track_id=None):
+    def playlistid(self, track_id=None, compact=False):
         """
         Get information about track(s) in the play queue.
 
         :param track_id: optional, specifies a single track to display info for.
         If `pos` id not given or `None`, the info for all tracks is returned.
+        :param compact: if True, tracks are returned as Song instances.
 
         :return: an array of tuples `(uri, attrs)` where `uri` is the uri of
         the track and `attrs` is a dictionary with all attributes for the track.
@@ -225,37 +1389,80 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         """
         track_id = '' if track_id is None else track_id
         lines = yield from self.command('playlistid {}'.format(track_id))
-        return parse_playlist(lines)
+        return parse_playlist(lines, compact=compact)
 
-    def playlistinfo(self, pos=None):
+    def playlistinfo(self, pos=None, compact=False):
         """
         Get information about track(s) in the play queue.
 
         :param pos: optional, specifies the position of a single track to get
         info for. If `pos` id not given or `None`, the info for all tracks is
         returned.
+        :param compact: if True, tracks are returned as Song instances.
         :return: an array of tuples `(uri, attrs)` where `uri` is the uri of
         the track and `attrs` is a dictionary with all attributes for the track.
         The only attributes guaranteed to be in `attrs` are `Id` and `Pos`.
         """
         pos = '' if pos is None else pos
         lines = yield from self.command('playlistinfo {}'.format(pos))
-        return parse_playlist(lines)
+        return parse_playlist(lines, compact=compact)
+
+    def iter_playlistinfo(self, compact=False):
+        """
+        Streaming version of playlistinfo, for the whole play queue.
 
-    def playlistinfo_range(self, start, end=None):
+        :param compact: if True, tracks are returned as Song instances.
+        :return: a RecordIterator over tuples `(uri, attrs)`, as returned by
+        playlistinfo.
+        """
+        factory = make_record if compact else _make_pair
+        return self.iter_command('playlistinfo', PLAYLIST_KEYS, factory)
+
+    def playlistinfo_range(self, start, end=None, compact=False):
         """
         Get information about track(s) in the play queue.
 
         :param start: start of the range of the tracks.
         :param end: optional, end of the range. If end is not given, info for
         all tracks from start to the end of the play queue will be returned.
+        :param compact: if True, tracks are returned as Song instances.
         :return: an array of tuples `(uri, attrs)` where `uri` is the uri of
         the track and `attrs` is a dictionary with all attributes for the track.
         The only attributes guaranteed to be in `attrs` are `Id` and `Pos`.
         """
         track_range = _format_range(start, end)
         lines = yield from self.command('playlistinfo {}'.format(track_range))
-        return parse_playlist(lines)
+        return parse_playlist(lines, compact=compact)
+
+    @asyncio.coroutine
+    def plchanges(self, version, compact=False):
+        """
+        Get the tracks of the play queue that changed since a version.
+
+        :param version: a version of the play queue, as given by the
+        `playlist` field of the status.
+        :param compact: if True, tracks are returned as Song instances.
+        :return: the changed tracks, in the same format as playlistinfo. The
+        tracks removed at the end of the play queue are not reported, use
+        the `playlistlength` field of the status.
+        """
+        lines = yield from self.command('plchanges {}'.format(version))
+        return parse_playlist(lines, compact=compact)
+
+    @asyncio.coroutine
+    def plchangesposid(self, version):
+        """
+        Get the positions and ids of the tracks of the play queue that
+        changed since a version.
+
+        This is cheaper than plchanges when the tracks are already known.
+
+        :param version: a version of the play queue, as given by the
+        `playlist` field of the status.
+        :return: a list of tuples `(pos, id)`.
+        """
+        lines = yield from self.command('plchangesposid {}'.format(version))
+        return parse_posid(lines)
 
     def load(self, playlist, start=None, end=None):
         """
@@ -276,7 +1483,8 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         :return:
         """
         track_range = _format_range(start, end)
-        yield from self.command('load "{}" {}'.format(playlist, track_range))
+        yield from self.command('load {} {}'.format(_quote(playlist),
+                                                   track_range))
         return True
 
     # Play queue control
@@ -291,12 +1499,14 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         If uri is a directory, all tracks are added recursively. Uri to
         directories must NOT end with '/'.
         When connecting locally (with the socket interface), a 'file://' uri
-        can be used to add local files outside the music directory.
+        can be used to add local files outside the music directory, an
+        absolute path is also accepted in this case.
 
         :return: True is the add succeeded, raises an MpdCommandException
         otherwise.
         """
-        yield from self.command('add "{}"'.format(uri))
+        uri = self._local_uri(uri)
+        yield from self.command('add ' + _quote(uri))
         return True
 
     def addid(self, uri):
@@ -307,15 +1517,16 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         `trackid = client.addid( "foo.mp3")`
 
         :param uri: an uri to a single file or an URL to a network stream.
+        When connecting locally, also a 'file://' uri or an absolute path.
 
-
-        :return: the song id in the play queue if the operation succeeded,
-        raises an MpdCommandException otherwise.
+        :return: the song id in the play queue, as an int like the ids of
+        `Status`, `sync_queue` and `QueueMirror`, if the operation
+        succeeded, raises an MpdCommandException otherwise.
         """
-        resp = yield from self.command('addid "{}"'.format(uri))
+        uri = self._local_uri(uri)
+        resp = yield from self.command('addid ' + _quote(uri))
         # format : ['Id: 854']
-        track_id = resp[0].split(':')[1].strip()
-        return track_id
+        return _parse_id(resp)
 
     @asyncio.coroutine
     def clear(self):
@@ -366,6 +1577,180 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         yield from self.command('deleteid {}'.format(track_id))
         return True
 
+    @asyncio.coroutine
+    def move(self, pos, to):
+        """
+        Moves track(s) in the play queue.
+
+        :param pos: position of the track to move, or a tuple `(start, end)`
+        to move all the tracks between start and end (not included), end
+        being None for the end of the play queue.
+        :param to: the new position of the track(s) in the play queue.
+        :return: True
+        """
+        yield from self.command('move {} {}'.format(_format_pos(pos), to))
+        return True
+
+    @asyncio.coroutine
+    def moveid(self, track_id, to):
+        """
+        Moves the song `track_id` in the play queue.
+
+        :param track_id: the id of a song in the play queue
+        :param to: the new position of the song in the play queue.
+        :return: True
+        """
+        yield from self.command('moveid {} {}'.format(track_id, to))
+        return True
+
+    # Bulk play queue control
+    #
+    # These methods send their commands in command lists, bounded in size, a
+    # few round trips are enough for thousands of commands. They return a
+    # list with a result for each item, in the same order: if a command
+    # fails, its result is the MpdCommandException and the following items
+    # are still processed.
+    # Other errors (timeout, lost connection) are raised, the commands sent
+    # before have been executed.
+
+    @asyncio.coroutine
+    def add_many(self, uris, timeout=None):
+        """
+        Adds several tracks or directories to the play queue, see `add`.
+
+        :param uris: an iterable of uris.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each uri, True or a MpdCommandException.
+        """
+        cmds = ['add ' + _quote(self._local_uri(uri)) for uri in uris]
+        res = yield from self._command_many(cmds, lambda resp: True, timeout)
+        return res
+
+    @asyncio.coroutine
+    def addid_many(self, uris, timeout=None):
+        """
+        Adds several tracks to the play queue, see `addid`.
+
+        Example:
+            ids = yield from client.addid_many(uris)
+            failed = [uri for uri, res in zip(uris, ids)
+                      if isinstance(res, MpdCommandException)]
+
+        :param uris: an iterable of uris.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each uri, the id of the song in the play
+        queue (an int) or a MpdCommandException.
+        """
+        cmds = ['addid ' + _quote(self._local_uri(uri)) for uri in uris]
+        res = yield from self._command_many(cmds, _parse_id, timeout)
+        return res
+
+    @asyncio.coroutine
+    def deleteid_many(self, track_ids, timeout=None):
+        """
+        Deletes several songs from the play queue, see `deleteid`.
+
+        :param track_ids: an iterable of ids of songs in the play queue.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each id, True or a MpdCommandException.
+        """
+        cmds = ['deleteid {}'.format(track_id) for track_id in track_ids]
+        res = yield from self._command_many(cmds, lambda resp: True, timeout)
+        return res
+
+    @asyncio.coroutine
+    def delete_range_many(self, ranges, timeout=None):
+        """
+        Removes several ranges of tracks from the play queue, see
+        `delete_range`.
+
+        Ranges are removed in the given order, the positions of each range
+        are those of the play queue after the removal of the previous ones:
+        give them from the end of the play queue to the beginning to remove
+        ranges of the current play queue.
+
+        :param ranges: an iterable of tuples `(start, end)`, end can be None
+        for the end of the play queue. A single position can also be given.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each range, True or a MpdCommandException.
+        """
+        cmds = ['delete ' + _format_pos(pos) for pos in ranges]
+        res = yield from self._command_many(cmds, lambda resp: True, timeout)
+        return res
+
+    @asyncio.coroutine
+    def move_many(self, moves, timeout=None):
+        """
+        Moves several tracks in the play queue, see `move`.
+
+        Moves are done in the given order, each one on the play queue
+        resulting from the previous ones.
+
+        :param moves: an iterable of tuples `(pos, to)`, as the arguments of
+        `move`.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: a list with, for each move, True or a MpdCommandException.
+        """
+        cmds = ['move {} {}'.format(_format_pos(pos), to)
+                for pos, to in moves]
+        res = yield from self._command_many(cmds, lambda resp: True, timeout)
+        return res
+
+    @asyncio.coroutine
+    def sync_queue(self, uris, timeout=None):
+        """
+        Make the play queue hold the given songs, in the given order, with as
+        few commands as possible.
+
+        The play queue is compared with the target list (see
+        `queuesync.diff_queue`): the songs it already holds keep their id and
+        are only moved if needed, the others are deleted and the missing
+        songs are added. Commands are sent in command lists, like add_many.
+
+        Playback is not interrupted: the current song is moved rather than
+        deleted, and if it is not in `uris` it is kept before them.
+
+        If a command fails, a MpdCommandException is raised and the
+        following commands are not sent: the play queue is only partly
+        synchronized. Changes made by other clients during the
+        synchronization may also leave it out of sync.
+
+        :param uris: an iterable of uris, as for `addid`.
+        :param timeout: optional, maximum time to wait for the response of
+        each command list, in seconds.
+        :return: the list of the ids of the songs of `uris` in the play
+        queue.
+        """
+        uris = [self._local_uri(uri) for uri in uris]
+        # A single command list reads the current song and the play queue at
+        # the same version.
+        status, queue = yield from self.command_list(
+            ['status', 'playlistinfo'], timeout)
+        status = Status(parse_lines_to_dict(status))
+        current = [(int(attrs['Id']), uri)
+                   for uri, attrs in parse_playlist(queue)]
+        current_id = status.songid if status.state in ('play', 'pause') \
+            else None
+        edits, ids = diff_queue(current, uris, current_id)
+        cmds = []
+        for edit in edits:
+            if edit[0] == 'addid':
+                cmds.append('addid {} {}'.format(_quote(edit[1]), edit[2]))
+            else:
+                cmds.append(' '.join(str(arg) for arg in edit))
+        res = yield from self._command_many(
+            cmds, lambda resp: _parse_id(resp) if resp else None,
+            timeout, stop_on_error=True)
+        new_ids = iter(track_id for cmd, track_id in zip(cmds, res)
+                       if cmd.startswith('addid'))
+        return [next(new_ids) if track_id is None else track_id
+                for track_id in ids]
+
     # Controlling playback : pause, next, previous, stop,
 
     @asyncio.coroutine
@@ -459,103 +1844,720 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
 
     @asyncio.coroutine
     def _run(self):
+        try:
+            # first, wait for welcome message
+            yield from self._welcome_msg()
+            if self.password is not None:
+                try:
+                    yield from self._send_password()
+                except MpdCommandException as e:
+                    # Sending it again would not help, the client stops
+                    logger.error('Password refused by mpd %s: %s',
+                                 self.address, e)
+                    self._disconnected(e)
+                    return
+            self._delay = self.reconnect_delay
+            self._established = True
+            if self.connections > 1:
+                self._on_reconnect()
+
+            while not self.f_closed.done():
+
+                # Requests kept from a lost connection, or queued while it
+                # was re-opened, are sent before going idle.
+                requests = self._retry + self._pending_cmds()
+                self._retry = []
+                if requests:
+                    yield from self._process(requests)
+                    continue
+
+                if not self.idle:
+                    yield from self._wait_command()
+                    continue
+
+                yield from self._send_cmd(b'idle\n')
+
+                f_resp = asyncio.async(self._read_response())
+                f_cmd = asyncio.async(self._cmds.get())
+
+                done, pending = yield from \
+                    asyncio.wait([f_resp, f_cmd, self.f_closed],
+                                 return_when=asyncio.FIRST_COMPLETED)
+
+                if f_cmd in done:
+                    # Sent with the pending commands at the next iteration
+                    self._retry.append(f_cmd.result())
+                else:
+                    f_cmd.cancel()
+
+                if self.f_closed in done:
+                    # The socked has be been closed, cancel pending tasks
+                    f_resp.cancel()
+                    if f_resp.done() and not f_resp.cancelled():
+                        f_resp.exception()
+                    break
 
-        # first, wait for welcome message
-        yield from self._welcome_msg()
+                if f_resp in done:
+                    # got a notification from our idle wait
+                    self._on_idle(f_resp.result())
+
+                if f_cmd in done:
+                    t_noidle = self.loop.time()
+                    yield from self._send_cmd(b'noidle\n')
+                    msg = yield from f_resp
+                    if self.instrumentation is not None:
+                        self.instrumentation.noidle(
+                            self.loop.time() - t_noidle)
+                    if msg and f_resp not in done:
+                        # Changes notified just before noidle was received
+                        self._on_idle(msg)
+        except OSError as e:
+            logger.debug('Connection error: %r', e)
+        except Exception as e:
+            # The connection is out of sync with mpd, e.g. a response could
+            # not be decoded: it is closed. The request whose response was
+            # being read fails with the error instead of being sent again.
+            logger.error('Error on the connection to %s, closing it',
+                         self.address, exc_info=True)
+            if self._sent:
+                self._sent.popleft().fail(e)
+        self._disconnected()
 
-        while not self.f_closed.done():
+    @asyncio.coroutine
+    def _process(self, requests):
+        """
+        Send a list of requests and read their responses.
 
-            yield from self._send_cmd(b'idle\n')
+        All the commands already waiting in the queue are sent back to back
+        and we only go back to idle once the queue is empty: mpd handles
+        pipelined commands in order, which saves an idle / noidle cycle for
+        each command.
+        """
+        while requests:
+            if self.f_closed.done():
+                # Not sent, keep them for the next connection
+                self._retry.extend(requests)
+                return
+            # Requests cancelled by their caller, or whose deadline has
+            # passed, before being sent are simply dropped.
+            now = self.loop.time()
+            requests = [r for r in requests if self._ready(r, now)]
+            self._sent.extend(requests)
+            instrumentation = self.instrumentation
+            if requests:
+                yield from self._send_cmd(b''.join(r.cmd for r in requests))
+                if instrumentation is not None:
+                    for request in requests:
+                        instrumentation.request_sent(
+                            _request_name(request.cmd), now - request.queued)
+            for request in requests:
+                if instrumentation is not None:
+                    received = self.bytes_received - len(self._buffer)
+                    lines = self.lines_parsed
+                    parse_time = self.parse_time
+                # The response must be read even if the request was
+                # cancelled in the meantime, to stay in sync with mpd.
+                reader = request.reader or self._read_response
+                response = yield from reader()
+                self._sent.popleft()
+                if instrumentation is not None:
+                    instrumentation.response_read(
+                        _request_name(request.cmd), self.loop.time() - now,
+                        self.bytes_received - len(self._buffer) - received,
+                        self.lines_parsed - lines,
+                        self.parse_time - parse_time)
+                if not request.future.done():
+                    request.future.set_result(response)
+                else:
+                    self._count('discarded')
+            requests = self._pending_cmds()
 
-            f_resp = asyncio.async(self._read_response())
-            f_cmd = asyncio.async(self._cmds.get())
+    @asyncio.coroutine
+    def _wait_command(self):
+        """
+        Wait for a command without going idle, sending a ping if none comes
+        within keepalive seconds.
+        """
+        f_cmd = asyncio.async(self._cmds.get(), loop=self.loop)
+        done, pending = yield from asyncio.wait(
+            [f_cmd, self.f_closed], timeout=self.keepalive, loop=self.loop,
+            return_when=asyncio.FIRST_COMPLETED)
+        if f_cmd.done():
+            # Sent with the pending commands at the next iteration
+            self._retry.append(f_cmd.result())
+            return
+        f_cmd.cancel()
+        if not done:
+            yield from self._send_cmd(b'ping\n')
+            yield from self._read_response()
+
+    def _disconnected(self, error=None):
+        """
+        Handle the end of a connection.
 
-            done, pending = yield from \
-                asyncio.wait([f_resp, f_cmd, self.f_closed],
-                             return_when=asyncio.FIRST_COMPLETED)
+        Idempotent requests sent on the lost connection are kept, with the
+        requests not sent yet, to be sent on the next connection. Other
+        requests sent on the lost connection fail with a MpdConnectionError.
 
-            if self.f_closed in done:
-                # The socked has be been closed, cancel pending tasks
-                f_cmd.cancel()
-                f_resp.cancel()
-                break
+        :param error: optional, an error preventing the use of any
+        connection, like a refused password: the connection is not re-opened
+        and all the requests fail with this error.
+        """
+        if not self.f_closed.done():
+            self.f_closed.set_result(True)
+        if self.writer is not None:
+            self.writer.close()
+        reconnect = self.reconnect and not self._closing and error is None
+        exc = error or MpdConnectionError('Connection to mpd lost')
+        retry = []
+        for request in self._sent:
+            if request.future.done():
+                continue
+            if reconnect and request.idempotent:
+                retry.append(request)
+            else:
+                request.fail(exc)
+        self._sent.clear()
+        self._retry = retry + self._retry
+        if reconnect:
+            logger.warning('Lost connection to mpd %s, reconnecting',
+                           self.address)
+            self._reconnect_task = asyncio.async(self._reconnect(),
+                                                 loop=self.loop)
+        else:
+            self._stop(error)
+
+    def _stop(self, error=None):
+        """
+        Fail all the remaining requests and mark the client as stopped.
+        :param error: optional, the exception of the requests,
+        MpdConnectionError by default.
+        """
+        exc = error or MpdConnectionError('Not connected to mpd')
+        for request in self._retry + self._pending_cmds():
+            request.fail(exc)
+        self._retry = []
+        if not self.f_stopped.done():
+            self.f_stopped.set_result(True)
+
+    @asyncio.coroutine
+    def _reconnect(self):
+        """
+        Re-open the connection, with an exponential backoff between failed
+        attempts. A random jitter is added to the delays so that clients do
+        not all try to reconnect at the same time when mpd restarts.
+
+        An attempt fails when the connection can not be opened, and also when
+        it is closed before the welcome message, as mpd does when it has too
+        many clients: only the first attempt after a working connection is
+        immediate.
+        """
+        wait = not self._established
+        while not self._closing:
+            if wait:
+                delay = self._delay
+                self._delay = min(delay * 2, self.reconnect_max_delay)
+                yield from asyncio.sleep(random.uniform(delay / 2, delay),
+                                         loop=self.loop)
+                if self._closing:
+                    break
+            wait = True
+            try:
+                yield from self._open_connection()
+            except OSError as e:
+                logger.warning('Could not reconnect to mpd %s: %s',
+                               self.address, e)
+            else:
+                self._reconnect_task = None
+                return
+
+    @asyncio.coroutine
+    def _open_connection(self):
+        """
+        Open a new connection to mpd, this protocol instance is re-used for
+        each connection.
+        """
+        super().__init__(asyncio.StreamReader(loop=self.loop),
+                         self.client_connected, self.loop)
+        self.writer = None
+        self._established = False
+        del self._buffer[:]
+        if self.f_closed.done():
+            self.f_closed = asyncio.Future(loop=self.loop)
+        if self.local:
+            path = self.host
+            if path.startswith('@'):
+                # Abstract socket
+                path = '\0' + path[1:]
+            yield from self.loop.create_unix_connection(lambda: self, path)
+        else:
+            yield from self.loop.create_connection(lambda: self, self.host,
+                                                   self.port)
 
-            if f_resp in done:
-                # got a notification from our idle wait
-                if self.cb_onchange is not None:
-                    msg = f_resp.result()
-                    self.cb_onchange(msg)
+    def _on_reconnect(self):
+        """
+        Called once the connection has been re-opened: changes may have been
+        missed, and mpd may have been restarted.
+        """
+        self._count('reconnects')
+        self.notify({RECONNECT})
 
-            if f_cmd in done:
+    def notify(self, subsystems):
+        """
+        Handle changes of mpd's subsystems: the data kept by the client which
+        may have changed is invalidated and the changes are published to the
+        subscribers.
 
-                yield from self._send_cmd(b'noidle\n')
-                yield from f_resp
+        This is called with the changes received by idle. A client created
+        with `idle=False` does not receive them, they must be passed to this
+        method, as a pool does.
 
-                cmd = f_cmd.result()
-                yield from self._send_cmd(cmd)
-                response = yield from self._read_response()
-                yield from self._responses.put(response)
+        :param subsystems: set of the names of the changed subsystems, which
+        may include RECONNECT when changes may have been missed.
+        """
+        if RECONNECT in subsystems:
+            self._invalidate_status()
+            if self.cache is not None:
+                self.cache.clear()
+        elif subsystems & STATUS_SUBSYSTEMS:
+            self._invalidate_status()
+        if self.cache is not None:
+            self.cache.invalidate(subsystems)
+        if subsystems:
+            self.events.publish(subsystems)
+
+    @asyncio.coroutine
+    def _command_many(self, cmds, parse, timeout=None, stop_on_error=False):
+        """
+        Send commands in chunked command lists, see add_many.
+
+        :param cmds: a list of commands, as strings without final `\n`.
+        :param parse: a callable returning the result of a command from the
+        lines of its response.
+        :param stop_on_error: if True, the first MpdCommandException is
+        raised and the following commands are not sent.
+        :return: a list with the result of each command, or the
+        MpdCommandException it raised.
+        """
+        results = []
+        start = 0
+        while start < len(cmds):
+            if start:
+                # Let other tasks run between chunks
+                yield from asyncio.sleep(0, loop=self.loop)
+            end = _chunk_end(cmds, start)
+            try:
+                resps = yield from self.command_list(cmds[start:end], timeout)
+            except MpdCommandException as e:
+                if stop_on_error:
+                    raise
+                # The commands after the failing one were not executed, they
+                # are sent again in the next chunk.
+                resps = e.results
+                end = start + len(resps) + 1
+                results.extend(parse(resp) for resp in resps)
+                results.append(e)
             else:
-                f_cmd.cancel()
-        self.f_stopped.set_result(True)
+                results.extend(parse(resp) for resp in resps)
+            start = end
+        return results
+
+    def _local_uri(self, uri):
+        """
+        Convert an absolute path to a 'file://' uri, when connected through a
+        unix socket.
+        """
+        if self.local and uri.startswith('/'):
+            return 'file://' + uri
+        return uri
+
+    def _on_idle(self, msg):
+        """
+        Handle the changes notified by mpd in response to idle.
+        :param msg: the lines of the response.
+        """
+        self.notify(_parse_idle(msg))
+        if self.cb_onchange is not None:
+            self.cb_onchange(msg)
+
+    def _before_command(self, name):
+        """
+        Invalidate the data kept by the client which may be modified by a
+        command.
+        :param name: the name of the command.
+        """
+        if name in READ_ONLY_COMMANDS:
+            return
+        # Read-only commands sent after this one must not share the response
+        # of commands sent before.
+        self._in_flight.clear()
+        self._invalidate_status()
+        if self.cache is not None:
+            self.cache.invalidate_command(name)
+
+    def _count(self, kind):
+        self.counters[kind] += 1
+        if self.instrumentation is not None:
+            self.instrumentation.event(kind)
+
+    def _invalidate_status(self):
+        self._status = None
+        self._status_gen += 1
+
+    def _ready(self, request, now):
+        """
+        Check if a request must be sent.
+        :param request: a request taken from the queue.
+        :param now: current loop time.
+        :return: False if the request was cancelled or if its deadline has
+        passed.
+        """
+        if request.future.done():
+            return False
+        if request.deadline is not None and request.deadline <= now:
+            self._count('expired')
+            request.future.set_exception(asyncio.TimeoutError())
+            # Callers may have given up already, do not log the exception
+            request.future.exception()
+            return False
+        return True
+
+    def _pending_cmds(self):
+        """
+        Get all the requests currently waiting in the command queue, without
+        blocking.
+        :return: a (possibly empty) list of requests.
+        """
+        cmds = []
+        while not self._cmds.empty():
+            cmds.append(self._cmds.get_nowait())
+        return cmds
 
     @asyncio.coroutine
     def _welcome_msg(self):
         while True:
-            line = yield from self.reader.readline()
-            print(line)
-            if line.startswith(b'OK MPD'):
-                self._protocol_version = line[7:-1]
+            lines, last = yield from self._read_block()
+            logger.debug('Connected to %s: %s', self.address, last)
+            if last.startswith('OK MPD'):
+                self._protocol_version = last[7:]
                 break
 
+    @asyncio.coroutine
+    def _send_password(self):
+        cmd = 'password {}\n'.format(_quote(self.password))
+        yield from self._send_cmd(cmd.encode(encoding='UTF-8'))
+        lines = yield from self._read_response()
+        if lines and lines[-1].startswith('ACK'):
+            raise _parse_ack(lines[-1])
+
     @asyncio.coroutine
     def _send_cmd(self, cmd):
         self.writer.write(cmd)
         yield from self.writer.drain()
 
+    @asyncio.coroutine
+    def _read_block(self):
+        """
+        Read a full response from mpd.
+
+        Data is read from the socket by large chunks and accumulated in
+        self._buffer until the terminating `OK` or `ACK` line is found, by
+        scanning the bytes. The whole response is then decoded at once.
+
+        :return: a tuple (lines, last) where lines is the list of the lines
+        of the response, without the terminating line, and last is the
+        terminating line. If the connection is closed before the end of the
+        response, a MpdConnectionError is raised.
+        """
+        buf = self._buffer
+        start = 0
+        end = _find_response_end(buf)
+        while end is None:
+            # The terminating line may have been only partly received: the
+            # search resumes at the `\n` preceding the last incomplete line.
+            start = max(0, buf.rfind(b'\n'))
+            data = yield from self._read_data()
+            buf.extend(data)
+            end = _find_response_end(buf, start)
+
+        data_end, line_end = end
+        t_start = time.perf_counter()
+        lines = _decode_lines(buf, data_end)
+        self._parsed(len(lines), t_start)
+        last = buf[data_end:line_end].decode(encoding='UTF-8')
+        del buf[:line_end+1]
+        return lines, last
+
+    @asyncio.coroutine
+    def _read_data(self, size=_READ_SIZE):
+        """
+        Read data from the socket.
+        :param size: maximum number of bytes to read.
+        :return: the data, raises a MpdConnectionError if the connection was
+        closed.
+        """
+        data = yield from self.reader.read(size)
+        if not data:
+            raise MpdConnectionError('Connection closed by mpd')
+        self.bytes_received += len(data)
+        return data
+
+    def _parsed(self, nlines, t_start):
+        """
+        Account for lines decoded and parsed since t_start.
+        """
+        self.lines_parsed += nlines
+        self.parse_time += time.perf_counter() - t_start
+
     @asyncio.coroutine
     def _read_response(self):
 
-        message = []
-        while not self.f_closed.done():
-            line = yield from self.reader.readline()
-            if line == b'':
-                if self.reader.at_eof():
-                    # When at eof, readline returns empty lines indefinitely.
-                    break
-            elif line.startswith(b'OK'):
-                break
-            elif line.startswith(b'ACK'):
-                message.append(line[:-1].decode(encoding='UTF-8'))
+        lines, last = yield from self._read_block()
+        if last.startswith('ACK'):
+            lines.append(last)
+        return lines
+
+    @asyncio.coroutine
+    def _fetch_binary(self, name, uri, sink):
+        """
+        Fetch all the chunks of a binary response.
+        :return: a tuple (attrs, picture), where attrs are the attributes of
+        the last response.
+        """
+        offset = 0
+        size = None
+        picture = None
+        while size is None or offset < size:
+            # Without sink, chunks are read directly in the picture
+            into = None if picture is None else memoryview(picture)[offset:]
+            cmd = '{} {} {}\n'.format(name, _quote(uri), offset)
+            lines, data = yield from self._execute(
+                cmd.encode(encoding='UTF-8'),
+                reader=functools.partial(self._read_binary, into),
+                idempotent=True)
+            if into is not None:
+                # A bytearray can not be resized while views on it exist
+                into.release()
+            if lines and lines[-1].startswith('ACK'):
+                e = _parse_ack(lines[-1])
+                if e.error == '50':
+                    # No such file
+                    return {}, None
+                raise e
+            attrs = parse_lines_to_dict(lines)
+            if data is None:
+                return attrs, None
+            if size is None:
+                size = int(attrs['size'])
+                if sink is None:
+                    picture = bytearray(size)
+            length = len(data)
+            if sink is not None:
+                if length:
+                    res = sink(data)
+                    if asyncio.iscoroutine(res):
+                        yield from res
+            else:
+                if data.obj is not picture:
+                    # Grows the picture if the file grew in the meantime
+                    picture[offset:offset + length] = data
+                data.release()
+            if not length:
                 break
+            offset += length
+        if sink is not None:
+            return attrs, offset
+        if offset < size:
+            # The file was truncated in the meantime
+            del picture[offset:]
+        return attrs, picture
+
+    @asyncio.coroutine
+    def _read_binary(self, into=None):
+        """
+        Read a response with a binary payload.
+
+        The attribute lines are read up to the `binary: N` line, then the N
+        bytes of the payload are copied, without decoding them, into a
+        buffer allocated at once, and the rest of the response is read.
+
+        :param into: optional, a writable memoryview receiving the payload,
+        if it is large enough.
+        :return: a tuple (lines, data) where lines are the attribute lines of
+        the response, followed by the error line if mpd returned an error,
+        and data is a memoryview on the payload, or None if there is none.
+        """
+        buf = self._buffer
+        lines = []
+        size = None
+        pos = 0
+        while size is None:
+            nl = buf.find(b'\n', pos)
+            if nl == -1:
+                data = yield from self._read_data()
+                buf.extend(data)
+                continue
+            line = buf[pos:nl].decode(encoding='UTF-8')
+            pos = nl + 1
+            if line.startswith('binary: '):
+                size = int(line[8:])
+            elif line.startswith('OK') or line.startswith('ACK'):
+                # No payload
+                del buf[:pos]
+                if line.startswith('ACK'):
+                    lines.append(line)
+                return lines, None
             else:
-                message.append(line[:-1].decode(encoding='UTF-8'))
+                lines.append(line)
+        self.lines_parsed += len(lines)
 
-        return message
+        if into is not None and len(into) >= size:
+            data = into[:size]
+        else:
+            data = memoryview(bytearray(size))
+        got = min(size, len(buf) - pos)
+        with memoryview(buf) as view:
+            data[:got] = view[pos:pos + got]
+        del buf[:pos + got]
+        while got < size:
+            chunk = yield from self._read_data(max(size - got, _READ_SIZE))
+            n = min(len(chunk), size - got)
+            data[got:got + n] = chunk[:n]
+            got += n
+            if n < len(chunk):
+                buf.extend(chunk[n:])
+        # The payload is followed by a newline and the final OK
+        yield from self._read_block()
+        return lines, data
 
     @asyncio.coroutine
-    def _get_response(self):
+    def _read_stream(self, stream):
         """
-        Get the response from the response queue and raise an Exception if
-        mpd returned an error or failure.
-        :return:
+        Read a response, handing its records over to a RecordIterator as the
+        data is received.
+
+        :param stream: the _RecordStream of the iterator.
+        """
+        buf = self._buffer
+        parser = stream.parser
+        start = 0
+        end = _find_response_end(buf)
+        while end is None:
+            # Parse the complete lines already received, they can not
+            # contain the end of the response.
+            data_end = buf.rfind(b'\n') + 1
+            if data_end:
+                t_start = time.perf_counter()
+                lines = _decode_lines(buf, data_end)
+                records = parser.feed(lines)
+                self._parsed(len(lines), t_start)
+                del buf[:data_end]
+                if records:
+                    yield from stream.put(records)
+            # Only an incomplete line is left, see _read_block
+            start = max(0, buf.rfind(b'\n'))
+            data = yield from self._read_data()
+            buf.extend(data)
+            end = _find_response_end(buf, start)
+
+        data_end, line_end = end
+        t_start = time.perf_counter()
+        lines = _decode_lines(buf, data_end)
+        records = parser.feed(lines)
+        records.extend(parser.close())
+        self._parsed(len(lines), t_start)
+        last = buf[data_end:line_end].decode(encoding='UTF-8')
+        del buf[:line_end+1]
+        if records:
+            yield from stream.put(records)
+        if last.startswith('ACK'):
+            yield from stream.put(_parse_ack(last))
+        yield from stream.put(_END)
+
+    def _queue(self, request):
         """
-        resp = yield from self._responses.get()
-        if len(resp) == 1:
-            line = resp[0]
-            if line.startswith('ACK'):
-                i = line.index('@')
-                error = line[5:i]
-                l = line[i+1:line.index(']')]
-                command = line[line.index('{')+1:line.index('}')]
-                msg = line[line.index('}')+1:]
-                raise MpdCommandException(line, error, l, command, msg)
+        Queue a request for the worker.
+        """
+        if self.f_stopped.done():
+            raise MpdConnectionError('Not connected to mpd')
+        self._pending += 1
+        request.queued = self.loop.time()
+        request.future.add_done_callback(self._request_done)
+        self._cmds.put_nowait(request)
+
+    def _request_done(self, future):
+        self._pending -= 1
+
+    @asyncio.coroutine
+    def _execute(self, cmd, timeout=None, shared=False, idempotent=False,
+                 reader=None):
+        """
+        Queue a command for the worker and wait for its response.
+
+        Each command has its own future, which is resolved by the worker when
+        the response is read. If the caller is cancelled, or if the timeout
+        expires, the future is cancelled: the worker then drops the command if
+        it has not been sent yet, or reads and discards its response
+        otherwise, so that the following commands get the right response.
+
+        :param cmd: the command, as bytes ending with `\n`.
+        :param timeout: optional, maximum time to wait for the response, in
+        seconds, `self.timeout` by default. The command is not sent if it is
+        still in the queue after this time.
+        :param shared: if True and the same command is already waiting for
+        its response, wait for this response instead of sending the command
+        again. The shared future is protected from the cancellation of any
+        of its callers.
+        :param idempotent: if True, the command is sent again if the
+        connection is lost before its response is received.
+        :param reader: optional, the coroutine function reading the response,
+        see _Request.
+        :return: the lines of the response, as sent by mpd, or the value
+        returned by reader.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else self.loop.time() + timeout
+        if shared:
+            request = self._in_flight.get(cmd)
+            if request is None:
+                request = _Request(cmd, self.loop, reader, deadline,
+                                   idempotent=idempotent)
+                self._queue(request)
+                self._in_flight[cmd] = request
+                request.future.add_done_callback(
+                    functools.partial(self._in_flight_done, request))
+            elif request.deadline is not None:
+                # The command must be sent as long as one of its callers
+                # waits for it.
+                request.deadline = None if deadline is None \
+                    else max(deadline, request.deadline)
+            waiter = asyncio.shield(request.future, loop=self.loop)
+        else:
+            request = _Request(cmd, self.loop, reader, deadline,
+                               idempotent=idempotent)
+            self._queue(request)
+            waiter = request.future
+        if timeout is None:
+            resp = yield from waiter
+            return resp
+        try:
+            resp = yield from asyncio.wait_for(waiter, timeout,
+                                               loop=self.loop)
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            raise
         return resp
 
+    def _in_flight_done(self, request, future):
+        if self._in_flight.get(request.cmd) is request:
+            del self._in_flight[request.cmd]
+
     def client_connected(self, reader, writer):
         # Callback from StreamReaderProtocol
         self.reader = reader
         self.writer = writer
+        self.connections += 1
         # Start the task that handles incoming messages.
         self.worker = asyncio.async(self._run(), loop=self.loop)
 
@@ -564,21 +2566,56 @@ class MpdClientProtocol(asyncio.StreamReaderProtocol):
         self.worker.add_done_callback(self.on_worker)
 
     def on_worker(self, future):
-        print('on worker {}'.format(future))
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is not None:
+            logger.error('Worker of the connection to %s failed',
+                         self.address, exc_info=(type(e), e, e.__traceback__))
 
     def connection_lost(self, exc):
-        # When the connection is closed, signal closing,will still need to
-        # cancel the prnding task in _run for a clean stop.
-        self.f_closed.set_result(True)
-        pass
+        # Wakes up the worker if it is reading a response.
+        super().connection_lost(exc)
+        # Signal closing if the worker is waiting in idle.
+        if not self.f_closed.done():
+            self.f_closed.set_result(True)
 
 
 @asyncio.coroutine
-def connect(host, port, loop=None):
+def connect(host=None, port=None, loop=None, cache=None, timeout=10,
+            reconnect=True, instrumentation=None, idle=True):
+    """
+    Connect to mpd, with TCP or through a unix socket.
+
+    Example: `client = yield from connect('/run/mpd/socket')`
+
+    :param host: optional, mpd host, see parse_host() for the accepted
+    formats. By default, the `MPD_HOST` environment variable or 'localhost'.
+    A password given in the host is sent to mpd after connecting: if mpd
+    refuses it, a MpdCommandException is raised, and if it refuses it when
+    the connection is re-opened later, the client stops.
+    :param port: optional, mpd port, `MPD_PORT` or 6600 by default.
+    :param timeout: default timeout for commands, in seconds, None for no
+    timeout.
+    :param cache: optional, a ResponseCache used to cache the responses of
+    read-only commands.
+    :param reconnect: if True, the connection is re-opened when it is lost
+    and a RECONNECT change is published to subscribers once it is back.
+    :param instrumentation: optional, a metrics.Instrumentation, e.g. a
+    MetricsCollector.
+    :param idle: if False, the connection does not go idle between commands
+    and does not receive the changes, see MpdClientProtocol.notify().
+    :return: a MpdClientProtocol
+    """
     if loop is None:
         loop = asyncio.get_event_loop()
 
-    transport, protocol = yield from loop.create_connection(
-        lambda: MpdClientProtocol(), host, port)
-
+    host, port, password = parse_host(host, port)
+    protocol = MpdClientProtocol(host, port, timeout, loop, cache, reconnect,
+                                 password=password,
+                                 instrumentation=instrumentation, idle=idle)
+    yield from protocol._open_connection()
+    if password is not None:
+        # Sent after the password, fails with its error if it is refused
+        yield from protocol.command('ping')
     return protocol
@@ -0,0 +1,144 @@
+"""
+Subscriptions to the changes notified by mpd through the idle command.
+"""
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(object):
+    """
+    Subscription to the changes of some of mpd's subsystems.
+
+    Changes are accumulated in a set until they are consumed, so the number of
+    pending changes is bounded and a change notified several times before
+    being consumed is only delivered once. Notifying a subscription never
+    blocks: a slow subscriber can not delay the commands sent to mpd.
+
+    Changes can be consumed either with `get()`, by iterating over the
+    subscription (with `async for`), or by a callback given when subscribing,
+    which is then called in its own task.
+    """
+
+    def __init__(self, bus, subsystems=None, callback=None, loop=None):
+        """
+        :param bus: the EventBus this subscription belongs to.
+        :param subsystems: iterable of the names of the subsystems to
+        subscribe to (e.g. 'player', 'playlist', 'database', 'mixer'...),
+        None for all subsystems.
+        :param callback: optional, a function or coroutine called with the set
+        of the changed subsystems.
+        """
+        self._bus = bus
+        self.subsystems = None if subsystems is None \
+            else frozenset(subsystems)
+        self.loop = loop
+        self._pending = set()
+        self._event = asyncio.Event(loop=loop)
+        self._closed = False
+        self._task = None
+        if callback is not None:
+            self._task = asyncio.async(self._dispatch(callback), loop=loop)
+
+    def notify(self, subsystems):
+        """
+        Notify changes, called by the bus.
+        :param subsystems: set of the names of the changed subsystems.
+        """
+        if self.subsystems is not None:
+            subsystems = subsystems & self.subsystems
+        if subsystems and not self._closed:
+            self._pending |= subsystems
+            self._event.set()
+
+    @asyncio.coroutine
+    def get(self):
+        """
+        Wait for changes.
+        :return: the set of the subsystems that changed since the last call,
+        or None if the subscription has been closed.
+        """
+        while not self._pending:
+            if self._closed:
+                return None
+            self._event.clear()
+            yield from self._event.wait()
+        changes = self._pending
+        self._pending = set()
+        return changes
+
+    def close(self):
+        """
+        Stop receiving changes.
+        """
+        self._closed = True
+        self._event.set()
+        self._bus.unsubscribe(self)
+        if self._task is not None:
+            self._task.cancel()
+
+    @asyncio.coroutine
+    def _dispatch(self, callback):
+        while True:
+            changes = yield from self.get()
+            if changes is None:
+                break
+            try:
+                res = callback(changes)
+                if asyncio.iscoroutine(res):
+                    yield from res
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Error in subscriber callback %r',
+                                 callback)
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        changes = yield from self.get()
+        if changes is None:
+            raise StopAsyncIteration
+        return changes
+
+
+class EventBus(object):
+    """
+    Dispatches the changes notified by mpd to subscriptions.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self._subscriptions = []
+
+    def subscribe(self, subsystems=None, callback=None):
+        """
+        Subscribe to changes.
+
+        :param subsystems: iterable of the names of the subsystems to
+        subscribe to, None for all subsystems.
+        :param callback: optional, a function or coroutine called, in its own
+        task, with the set of the changed subsystems.
+        :return: a Subscription.
+        """
+        subscription = Subscription(self, subsystems, callback, self.loop)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        try:
+            self._subscriptions.remove(subscription)
+        except ValueError:
+            pass
+
+    def publish(self, subsystems):
+        """
+        Notify all subscriptions of changes.
+        :param subsystems: set of the names of the changed subsystems.
+        """
+        for subscription in list(self._subscriptions):
+            subscription.notify(subsystems)
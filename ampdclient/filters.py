@@ -0,0 +1,124 @@
+"""
+Filter expressions for the find, search, list and count commands.
+"""
+
+# Comparison operators of filter expressions
+OPERATORS = frozenset(('==', '!=', 'contains', '!contains', 'starts_with',
+                       '=~', '!~'))
+
+
+def _quote(arg):
+    """
+    Quote an argument of a command or a value in a filter expression,
+    escaping double quotes and backslashes.
+    """
+    return '"' + str(arg).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class Filter(object):
+    """
+    A filter expression, with the syntax of mpd 0.21 and later.
+
+    Filters are built with the class methods and combined with `&` (mpd has
+    no `OR`) and `~` (negation). `str(f)` is the expression, values are
+    escaped.
+
+    Example:
+        f = Filter.tag('artist', 'Nirvana') & ~Filter.tag('album', 'Bleach')
+        songs = yield from client.find(f)
+    """
+
+    __slots__ = ('expression',)
+
+    def __init__(self, expression):
+        """
+        :param expression: the expression, as a string, e.g.
+        `(artist == "Nirvana")`.
+        """
+        self.expression = expression
+
+    def __str__(self):
+        return self.expression
+
+    def __repr__(self):
+        return 'Filter({!r})'.format(self.expression)
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and \
+            self.expression == other.expression
+
+    def __hash__(self):
+        return hash(self.expression)
+
+    def __and__(self, other):
+        return Filter('({} AND {})'.format(self, other))
+
+    def __invert__(self):
+        return Filter('(!{})'.format(self))
+
+    @classmethod
+    def tag(cls, name, value, op='=='):
+        """
+        Compare the value of a tag.
+
+        :param name: name of the tag, like 'artist' or 'album', `any` for
+        any tag, `file` for the uri of the song.
+        :param value: the value to compare with.
+        :param op: the operator, one of OPERATORS. `=~` and `!~` compare with
+        a regular expression.
+        """
+        if op not in OPERATORS:
+            raise ValueError('Invalid operator: {}'.format(op))
+        return cls('({} {} {})'.format(name, op, _quote(value)))
+
+    @classmethod
+    def tags(cls, **tags):
+        """
+        Match songs having all the given tag values.
+
+        Example: `Filter.tags(artist='Nirvana', album='Nevermind')`
+        """
+        if not tags:
+            raise ValueError('No tag given')
+        filters = [cls.tag(name, value)
+                   for name, value in sorted(tags.items())]
+        if len(filters) == 1:
+            return filters[0]
+        return cls('(' + ' AND '.join(str(f) for f in filters) + ')')
+
+    @classmethod
+    def base(cls, path):
+        """
+        Match songs in a directory, recursively.
+
+        :param path: path of the directory, relative to the music directory.
+        """
+        return cls('(base {})'.format(_quote(path)))
+
+    @classmethod
+    def modified_since(cls, since):
+        """
+        Match songs modified since a date.
+
+        :param since: a UNIX timestamp or an ISO 8601 date.
+        """
+        return cls('(modified-since {})'.format(_quote(since)))
+
+
+def build_filter(expression=None, tags=None):
+    """
+    Combine a filter and tag values into a single filter.
+
+    :param expression: optional, a Filter or a filter expression as a
+    string.
+    :param tags: optional, a dictionary of tag values, see Filter.tags.
+    :return: a Filter, None if there is no condition.
+    """
+    if isinstance(expression, str):
+        expression = Filter(expression)
+    if tags:
+        tag_filter = Filter.tags(**tags)
+        if expression is None:
+            return tag_filter
+        return expression & tag_filter
+    return expression
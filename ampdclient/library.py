@@ -0,0 +1,254 @@
+"""
+In-process index of mpd's music database.
+"""
+import asyncio
+import logging
+import time
+
+from .client import MpdCommandException, MpdConnectionError, RECONNECT
+from .filters import Filter, _quote
+from .records import make_record, Song, Directory
+
+
+logger = logging.getLogger(__name__)
+
+
+def _dirname(uri):
+    return uri.rpartition('/')[0]
+
+
+class LibraryIndex(object):
+    """
+    A local index of the songs in mpd's database, with indexes on some tags,
+    which can be queried without any round trip to mpd.
+
+    The index is populated with a single streamed `listallinfo`, songs are
+    kept as compact Song records. When mpd notifies a change of the database,
+    only the songs modified since the last known modification are fetched
+    (with a `modified-since` filter), and the list of the uris in the
+    database (`listall`, without tags) is used to find removed songs. Songs
+    of this list missing from the index, like songs moved without being
+    modified, are fetched with `lsinfo`.
+
+    Example:
+        library = LibraryIndex(client)
+        yield from library.start()
+        songs = library.find('artist', 'Arcade Fire')
+    """
+
+    # Song fields with an index
+    INDEXED = ('artist', 'albumartist', 'album', 'genre')
+
+    def __init__(self, client):
+        """
+        :param client: a MpdClientProtocol or a MpdClientPool.
+        """
+        self.client = client
+        self.songs = {}
+        self.directories = {}
+        # field -> value -> set of uris
+        self._indexes = {field: {} for field in self.INDEXED}
+        # directory -> set of uris of the songs in this directory
+        self._dir_index = {}
+        # Most recent modification time of the songs in the index
+        self.last_modified = 0
+        self._lock = asyncio.Lock(loop=getattr(client, 'loop', None))
+        self._subscription = None
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, uri):
+        return uri in self.songs
+
+    def get(self, uri):
+        """
+        :param uri: uri of a song.
+        :return: the Song, None if it is not in the database.
+        """
+        return self.songs.get(uri)
+
+    def values(self, field):
+        """
+        :param field: an indexed field: 'artist', 'albumartist', 'album' or
+        'genre'.
+        :return: the sorted list of the values of this field.
+        """
+        return sorted(self._indexes[field])
+
+    def find(self, field, value):
+        """
+        Find songs by exact value of an indexed field.
+
+        :param field: 'artist', 'albumartist', 'album' or 'genre'.
+        :param value: the value of the field.
+        :return: the list of the matching Songs, sorted by uri.
+        """
+        uris = self._indexes[field].get(value, ())
+        return [self.songs[uri] for uri in sorted(uris)]
+
+    def directory(self, path):
+        """
+        :param path: path of a directory, relative to the music directory.
+        :return: the list of the Songs directly in this directory, sorted by
+        uri.
+        """
+        uris = self._dir_index.get(path, ())
+        return [self.songs[uri] for uri in sorted(uris)]
+
+    def search(self, text, fields=('artist', 'album', 'title')):
+        """
+        Find songs containing a text in some fields, ignoring case.
+
+        This scans all the songs of the index.
+
+        :param text: the text to look for.
+        :param fields: the Song fields in which to look for the text.
+        :return: the list of the matching Songs.
+        """
+        text = text.lower()
+        return [song for song in self.songs.values()
+                if any(text in (getattr(song, f) or '').lower()
+                       for f in fields)]
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Load the index and refresh it each time mpd notifies a change of the
+        database, or after a reconnection.
+        """
+        yield from self.load()
+        self._subscription = self.client.subscribe(['database', RECONNECT],
+                                                   self._on_change)
+
+    def stop(self):
+        """
+        Stop following the changes of the database.
+        """
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+
+    @asyncio.coroutine
+    def _on_change(self, changes):
+        try:
+            yield from self.refresh()
+        except (MpdCommandException, MpdConnectionError) as e:
+            logger.warning('Could not refresh library index: %s', e)
+
+    @asyncio.coroutine
+    def load(self):
+        """
+        Load the whole database in the index.
+        """
+        yield from self._lock.acquire()
+        try:
+            self.songs = {}
+            self.directories = {}
+            self._indexes = {field: {} for field in self.INDEXED}
+            self._dir_index = {}
+            self.last_modified = 0
+            it = self.client.iter_listallinfo(compact=True)
+            while True:
+                record = yield from it.next()
+                if record is None:
+                    break
+                self._add(record)
+        finally:
+            self._lock.release()
+
+    @asyncio.coroutine
+    def refresh(self):
+        """
+        Update the index with the changes of the database.
+        :return: a tuple (updated, removed) with the number of songs added or
+        modified and the number of songs removed.
+        """
+        yield from self._lock.acquire()
+        try:
+            since = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                  time.gmtime(self.last_modified))
+            updated = 0
+            it = self.client.iter_command(
+                'find ' + _quote(Filter.modified_since(since)),
+                frozenset(('file',)), make_record)
+            while True:
+                song = yield from it.next()
+                if song is None:
+                    break
+                self._add(song)
+                updated += 1
+
+            # Find removed songs and directories
+            uris = set()
+            dirs = set()
+            it = self.client.iter_command('listall',
+                                          frozenset(('file', 'directory')))
+            while True:
+                record = yield from it.next()
+                if record is None:
+                    break
+                kind, name, _ = record
+                if kind == 'file':
+                    uris.add(name)
+                else:
+                    dirs.add(name)
+            # Songs missing from the index although they were not modified,
+            # like songs moved with their modification time
+            missing = [uri for uri in uris if uri not in self.songs]
+            if missing:
+                results = yield from self.client.lsinfo_many(missing,
+                                                             compact=True)
+                for result in results:
+                    if isinstance(result, MpdCommandException):
+                        # Removed since listall
+                        continue
+                    for song in result[1]:
+                        self._add(song)
+                        updated += 1
+            removed = [uri for uri in self.songs if uri not in uris]
+            for uri in removed:
+                self._remove(uri)
+            for path in [p for p in self.directories if p not in dirs]:
+                del self.directories[path]
+            for path in dirs:
+                if path not in self.directories:
+                    self.directories[path] = Directory(path)
+            return updated, len(removed)
+        finally:
+            self._lock.release()
+
+    def _add(self, record):
+        if isinstance(record, Directory):
+            self.directories[record.path] = record
+            return
+        if not isinstance(record, Song):
+            return
+        if record.uri in self.songs:
+            self._remove(record.uri)
+        uri = record.uri
+        self.songs[uri] = record
+        for field, index in self._indexes.items():
+            value = getattr(record, field)
+            if value is not None:
+                index.setdefault(value, set()).add(uri)
+        self._dir_index.setdefault(_dirname(uri), set()).add(uri)
+        if record.last_modified is not None and \
+                record.last_modified > self.last_modified:
+            self.last_modified = record.last_modified
+
+    def _remove(self, uri):
+        song = self.songs.pop(uri)
+        for field, index in self._indexes.items():
+            value = getattr(song, field)
+            if value is not None:
+                _discard(index, value, uri)
+        _discard(self._dir_index, _dirname(uri), uri)
+
+
+def _discard(index, key, uri):
+    uris = index.get(key)
+    if uris is not None:
+        uris.discard(uri)
+        if not uris:
+            del index[key]
@@ -0,0 +1,162 @@
+"""
+Instrumentation of the client: hooks and an in-memory metrics collector.
+"""
+import collections
+import math
+
+
+class Instrumentation(object):
+    """
+    Hooks called by MpdClientProtocol, see its `instrumentation` attribute.
+
+    This class does nothing, subclasses override the hooks they need. Hooks
+    are called synchronously by the worker of the client, they must be fast
+    and must not raise.
+    """
+
+    def request_sent(self, name, queue_wait):
+        """
+        A command has been sent to mpd.
+        :param name: name of the command, 'command_list' for command lists.
+        :param queue_wait: time spent in the queue, in seconds.
+        """
+
+    def response_read(self, name, round_trip, nbytes, nlines, parse_time):
+        """
+        The response of a command has been read.
+        :param name: name of the command.
+        :param round_trip: time between sending the command and reading the
+        end of its response, in seconds.
+        :param nbytes: size of the response, in bytes.
+        :param nlines: number of lines of the response.
+        :param parse_time: time spent decoding and parsing the response, in
+        seconds.
+        """
+
+    def noidle(self, duration):
+        """
+        The client left idle mode to send commands.
+        :param duration: time between sending noidle and reading the
+        response of idle, in seconds.
+        """
+
+    def event(self, kind):
+        """
+        Something noteworthy happened: a command timed out ('timeouts'),
+        expired before being sent ('expired'), its response was discarded
+        ('discarded'), or the connection was re-opened ('reconnects').
+        """
+
+
+class Histogram(object):
+    """
+    Histogram of positive values, with logarithmic buckets: 8 buckets per
+    power of 2, so percentiles are known within 12.5%.
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self.buckets[None] += 1
+        else:
+            mantissa, exponent = math.frexp(value)
+            self.buckets[exponent * 8 + int((mantissa - 0.5) * 16)] += 1
+
+    def percentile(self, p):
+        """
+        :param p: the percentile, between 0 and 100.
+        :return: an upper bound of the value at this percentile, None if the
+        histogram is empty.
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = self.buckets[None]
+        if seen >= rank:
+            return 0
+        for index in sorted(i for i in self.buckets if i is not None):
+            seen += self.buckets[index]
+            if seen >= rank:
+                exponent, sub = divmod(index, 8)
+                bound = math.ldexp(0.5 + (sub + 1) / 16, exponent)
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        :return: a dictionary with the count, sum, mean, min, max and the
+        50th, 90th and 99th percentiles of the values.
+        """
+        return {'count': self.count, 'sum': self.total,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min, 'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99)}
+
+
+class MetricsCollector(Instrumentation):
+    """
+    Collects histograms of the queue wait, round trip time, size, number of
+    lines and parse time of the responses, for each command name.
+
+    Example:
+        metrics = MetricsCollector()
+        client = yield from connect(host, port, instrumentation=metrics)
+        ...
+        print(metrics.snapshot()['commands']['status']['round_trip'])
+    """
+
+    METRICS = ('queue_wait', 'round_trip', 'bytes', 'lines', 'parse_time')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # command name -> metric -> Histogram
+        self.commands = collections.defaultdict(
+            lambda: {metric: Histogram() for metric in self.METRICS})
+        self.noidle_time = Histogram()
+        self.events = collections.Counter()
+
+    def request_sent(self, name, queue_wait):
+        self.commands[name]['queue_wait'].add(queue_wait)
+
+    def response_read(self, name, round_trip, nbytes, nlines, parse_time):
+        histograms = self.commands[name]
+        histograms['round_trip'].add(round_trip)
+        histograms['bytes'].add(nbytes)
+        histograms['lines'].add(nlines)
+        histograms['parse_time'].add(parse_time)
+
+    def noidle(self, duration):
+        self.noidle_time.add(duration)
+
+    def event(self, kind):
+        self.events[kind] += 1
+
+    def snapshot(self):
+        """
+        :return: a dictionary
+        `{'commands': {name: {metric: histogram snapshot}},
+        'noidle': histogram snapshot, 'events': {kind: count}}`, see
+        Histogram.snapshot(). Times are in seconds.
+        """
+        return {'commands': {name: {metric: h.snapshot()
+                                    for metric, h in histograms.items()}
+                             for name, histograms in self.commands.items()},
+                'noidle': self.noidle_time.snapshot(),
+                'events': dict(self.events)}
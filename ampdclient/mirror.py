@@ -0,0 +1,172 @@
+"""
+Local copy of mpd's play queue, kept up to date incrementally.
+"""
+import asyncio
+import logging
+
+from .client import parse_lines_to_dict, parse_playlist, parse_posid
+from .client import MpdCommandException, MpdConnectionError, RECONNECT
+from .records import Status
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueMirror(object):
+    """
+    A local copy of the play queue.
+
+    The first refresh downloads the whole play queue. The following ones only
+    fetch the changes since the last known version of the queue, using
+    `plchangesposid`: tracks that were only moved are re-used, and the info
+    is only downloaded for tracks that were added. The cost of a refresh
+    hence depends on the size of the change, not on the size of the queue.
+
+    Tracks are kept as Song records, available by position (`mirror[pos]`)
+    or by id (`mirror.get_by_id(track_id)`).
+
+    Example:
+        mirror = QueueMirror(client)
+        yield from mirror.start()
+        for song in mirror:
+            print(song.pos, song.uri)
+    """
+
+    def __init__(self, client):
+        """
+        :param client: a MpdClientProtocol or a MpdClientPool.
+        """
+        self.client = client
+        # Version of the play queue, None until the first refresh
+        self.version = None
+        self._songs = []
+        self._by_id = {}
+        self._lock = asyncio.Lock(loop=getattr(client, 'loop', None))
+        self._subscription = None
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __getitem__(self, pos):
+        return self._songs[pos]
+
+    def __iter__(self):
+        return iter(self._songs)
+
+    def get_by_id(self, track_id):
+        """
+        :param track_id: id of a track in the play queue.
+        :return: the Song with this id, None if there is none.
+        """
+        return self._by_id.get(track_id)
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Load the play queue and refresh the copy each time mpd notifies a
+        change of the play queue. The whole play queue is loaded again after
+        a reconnection, as mpd may have been restarted.
+        """
+        yield from self.refresh()
+        self._subscription = self.client.subscribe(['playlist', RECONNECT],
+                                                   self._on_change)
+
+    def stop(self):
+        """
+        Stop following the changes of the play queue.
+        """
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+
+    @asyncio.coroutine
+    def _on_change(self, changes):
+        try:
+            yield from self.refresh(RECONNECT in changes)
+        except (MpdCommandException, MpdConnectionError) as e:
+            logger.warning('Could not refresh play queue: %s', e)
+
+    @asyncio.coroutine
+    def refresh(self, reload=False):
+        """
+        Update the copy of the play queue.
+        :param reload: if True, load the whole play queue again instead of
+        fetching the changes.
+        :return: True if the play queue changed.
+        """
+        yield from self._lock.acquire()
+        try:
+            if reload:
+                self.version = None
+            return (yield from self._refresh())
+        finally:
+            self._lock.release()
+
+    @asyncio.coroutine
+    def _refresh(self):
+        if self.version is None:
+            yield from self._reload()
+            return True
+
+        # status and plchangesposid in the same command list are executed
+        # atomically by mpd.
+        status, changes = yield from self.client.command_list(
+            ['status', 'plchangesposid {}'.format(self.version)])
+        status = Status(parse_lines_to_dict(status))
+        if status.playlist == self.version:
+            return False
+        try:
+            yield from self._apply(parse_posid(changes),
+                                   status.playlistlength)
+        except MpdCommandException:
+            # A new track was removed before its info could be fetched,
+            # reload everything.
+            yield from self._reload()
+            return True
+        self.version = status.playlist
+        return True
+
+    @asyncio.coroutine
+    def _reload(self):
+        status, lines = yield from self.client.command_list(
+            ['status', 'playlistinfo'])
+        self._songs = parse_playlist(lines, compact=True)
+        self._by_id = {song.id: song for song in self._songs}
+        self.version = Status(parse_lines_to_dict(status)).playlist
+
+    @asyncio.coroutine
+    def _apply(self, changes, length):
+        """
+        Apply the changes given by plchangesposid.
+        :param changes: list of tuples (pos, id)
+        :param length: new length of the play queue
+        """
+        # Fetch the info for the new tracks only
+        new_ids = [track_id for _, track_id in changes
+                   if track_id not in self._by_id]
+        new_songs = {}
+        if new_ids:
+            results = yield from self.client.command_list(
+                ['playlistid {}'.format(track_id) for track_id in new_ids])
+            for lines in results:
+                for song in parse_playlist(lines, compact=True):
+                    new_songs[song.id] = song
+
+        songs = self._songs
+        by_id = self._by_id
+        # Tracks that may have been removed from the play queue
+        replaced = songs[length:]
+        del songs[length:]
+        if len(songs) < length:
+            songs.extend([None] * (length - len(songs)))
+        for pos, track_id in changes:
+            song = by_id.get(track_id) or new_songs[track_id]
+            if songs[pos] is not None:
+                replaced.append(songs[pos])
+            song.pos = pos
+            songs[pos] = song
+            by_id[track_id] = song
+        for song in replaced:
+            if song.pos >= length or songs[song.pos] is not song:
+                if by_id.get(song.id) is song:
+                    del by_id[song.id]
@@ -0,0 +1,186 @@
+"""
+Pool of connections to mpd.
+"""
+import asyncio
+
+from .client import connect, DirectoryWalker, MpdConnectionError
+from .events import EventBus
+
+
+class MpdClientPool(object):
+    """
+    A pool of connections to the same mpd server.
+
+    With a single connection, each command interrupts the idle command used
+    to receive changes and all commands are serialized on one socket. The
+    pool keeps one connection dedicated to receiving changes, which stays in
+    idle mode, and `size` connections for commands.
+
+    Command connections do not go idle, so commands are sent at once,
+    without the noidle round trip. The changes received by the idle
+    connection are passed to them (see MpdClientProtocol.notify()), which
+    invalidates their status and the cache. As mpd closes connections
+    inactive for `connection_timeout` seconds, command connections send a
+    ping when they have not sent any command for `keepalive` seconds.
+
+    The pool has the same coroutine API as MpdClientProtocol: each method
+    call is forwarded to the command connection with the fewest pending
+    commands. Subscriptions (see `subscribe()`) are served by the idle
+    connection.
+
+    Each connection re-opens itself when it is lost, like a single
+    MpdClientProtocol: read-only commands sent on a lost connection are sent
+    again once it is back. Commands are only routed to a connection being
+    re-opened when no other one is open. When the connection receiving
+    changes is re-opened, a RECONNECT change is published to subscribers as
+    changes may have been missed.
+    """
+
+    def __init__(self, host=None, port=None, size=2, reconnect_delay=0.5,
+                 loop=None, timeout=10, cache=None, instrumentation=None,
+                 keepalive=30):
+        """
+        :param host: optional, mpd host, see connect().
+        :param port: optional, mpd port, see connect().
+        :param size: number of connections used for commands.
+        :param reconnect_delay: delay, in seconds, after a first failed
+        attempt to re-open a lost connection, see MpdClientProtocol.
+        :param timeout: default timeout for commands, in seconds, None for no
+        timeout.
+        :param cache: optional, a ResponseCache shared by the command
+        connections.
+        :param instrumentation: optional, a metrics.Instrumentation used by
+        all the connections.
+        :param keepalive: maximum time, in seconds, without sending a command
+        on a command connection, see MpdClientProtocol.
+        """
+        self.host = host
+        self.port = port
+        self.size = size
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.keepalive = keepalive
+        self.loop = loop
+        # Shared by all the idle connections successively used by the pool
+        self.events = EventBus(loop)
+        self._idle_client = None
+        self._clients = [None] * size
+        self._next = 0
+        self._subscription = None
+
+    @asyncio.coroutine
+    def connect(self):
+        """
+        Open all connections of the pool. If one of them can not be opened,
+        those already open are closed.
+        """
+        try:
+            self._idle_client = yield from self._open(idle=True)
+            # The RECONNECT change published by the idle connection when it
+            # is re-opened reaches the subscribers of the pool.
+            self._idle_client.events = self.events
+            for i in range(self.size):
+                self._clients[i] = yield from self._open(idle=False)
+        except Exception:
+            yield from self.close()
+            raise
+        self._subscription = self.events.subscribe(callback=self._on_change)
+
+    @asyncio.coroutine
+    def _open(self, idle):
+        client = yield from connect(
+            self.host, self.port, loop=self.loop,
+            cache=None if idle else self.cache, timeout=self.timeout,
+            instrumentation=self.instrumentation, idle=idle)
+        client.reconnect_delay = self.reconnect_delay
+        client.keepalive = self.keepalive
+        return client
+
+    def _on_change(self, changes):
+        for client in self._clients:
+            if client is not None:
+                client.notify(changes)
+
+    def client(self):
+        """
+        Get the command connection with the fewest pending commands.
+
+        :return: a MpdClientProtocol
+        """
+        best = None
+        n = len(self._clients)
+        # Start from the next connection so that connections are used in
+        # turn when they are all equally busy.
+        for i in range(n):
+            client = self._clients[(self._next + i) % n]
+            if client is None or client.f_stopped.done():
+                continue
+            # Open connections first, then the fewest pending commands
+            key = (client.f_closed.done(), client.pending)
+            if best is None or key < best_key:
+                best, best_key = client, key
+        if best is None:
+            raise MpdConnectionError('No connection to mpd')
+        self._next = (self._next + 1) % n
+        return best
+
+    def subscribe(self, subsystems=None, callback=None):
+        """
+        Subscribe to the changes notified by mpd, see
+        MpdClientProtocol.subscribe().
+        """
+        return self.events.subscribe(subsystems, callback)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close all the connections of the pool.
+        """
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+        for client in [self._idle_client] + self._clients:
+            if client is not None and not client.f_stopped.done():
+                yield from client.close()
+
+    def walk(self, path='', concurrency=8, compact=False, onerror=None):
+        """
+        Walk through a directory tree, see MpdClientProtocol.walk(). The
+        directories are listed on all the command connections.
+        """
+        return DirectoryWalker(self, path, concurrency, compact, onerror,
+                               self.loop)
+
+    def __getattr__(self, name):
+        # Forward everything else (commands, ...) to a command connection
+        return getattr(self.client(), name)
+
+
+@asyncio.coroutine
+def connect_pool(host=None, port=None, size=2, loop=None, timeout=10,
+                 cache=None, instrumentation=None, reconnect_delay=0.5):
+    """
+    Open a pool of connections to mpd.
+
+    :param host: optional, mpd host, see connect().
+    :param port: optional, mpd port, see connect().
+    :param size: number of connections used for commands, in addition to the
+    one receiving changes.
+    :param timeout: default timeout for commands, in seconds, None for no
+    timeout.
+    :param cache: optional, a ResponseCache shared by the command
+    connections.
+    :param instrumentation: optional, a metrics.Instrumentation, e.g. a
+    MetricsCollector.
+    :param reconnect_delay: delay, in seconds, after a first failed attempt
+    to re-open a lost connection.
+    :return: a MpdClientPool
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    pool = MpdClientPool(host, port, size, reconnect_delay, loop, timeout,
+                         cache, instrumentation)
+    yield from pool.connect()
+    return pool
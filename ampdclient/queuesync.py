@@ -0,0 +1,146 @@
+"""
+Computation of the edits turning the play queue into a given list of songs.
+"""
+import bisect
+import collections
+
+
+def lcs(a, b):
+    """
+    Longest common subsequence of two sequences, with the algorithm of Hunt
+    and Szymanski.
+
+    Its cost is O((n + r) log n), where r is the number of pairs of equal
+    items: it is fast for play queues, where a song is seldom present twice,
+    and only degrades when many items are equal.
+
+    :param a: a sequence of hashable items.
+    :param b: a sequence of hashable items.
+    :return: the list of the pairs of indexes `(i, j)` of the items of the
+    subsequence, `a[i] == b[j]`, in increasing order.
+    """
+    # For each item, its indexes in b, in decreasing order
+    positions = {}
+    for j in range(len(b) - 1, -1, -1):
+        positions.setdefault(b[j], []).append(j)
+    # thresholds[k] is the smallest index in b ending a common subsequence
+    # of length k + 1 and ends[k] the last pair of this subsequence, linked
+    # to the previous ones as tuples (i, j, previous).
+    thresholds = []
+    ends = []
+    for i, item in enumerate(a):
+        # Decreasing indexes: a pair never extends a pair with the same i
+        for j in positions.get(item, ()):
+            k = bisect.bisect_left(thresholds, j)
+            link = (i, j, ends[k - 1] if k else None)
+            if k == len(thresholds):
+                thresholds.append(j)
+                ends.append(link)
+            else:
+                thresholds[k] = j
+                ends[k] = link
+    pairs = []
+    link = ends[-1] if ends else None
+    while link is not None:
+        pairs.append(link[:2])
+        link = link[2]
+    pairs.reverse()
+    return pairs
+
+
+def diff_queue(current, target, current_id=None):
+    """
+    Compute the edits turning the play queue into the target list of songs.
+
+    Songs of the longest common subsequence of the play queue and of the
+    target stay in place. Other songs of the play queue are moved when the
+    target still contains them, and deleted otherwise. The songs of the
+    target that are not in the play queue are added.
+
+    The current song is never deleted: if the target does not contain it,
+    it is kept at the beginning of the play queue, before the target songs.
+
+    :param current: the play queue, as a list of tuples `(id, uri)`.
+    :param target: the target list of uris.
+    :param current_id: optional, the id of the current song.
+    :return: a tuple `(edits, ids)`. edits is the list of the edits to
+    apply, in order: `('deleteid', id)`, `('moveid', id, pos)` and
+    `('addid', uri, pos)`, positions being those of mpd's commands when the
+    previous edits are applied. ids is the list of the ids of the target
+    songs found in the play queue, None for the songs to add.
+    """
+    pairs = lcs([uri for _, uri in current], target)
+    ids = [None] * len(target)
+    for i, j in pairs:
+        ids[j] = current[i][0]
+    in_lcs = {i for i, _ in pairs}
+
+    # Songs out of the common subsequence are moved to the target positions
+    # still free for their uri, the current song first.
+    spare = collections.defaultdict(collections.deque)
+    for i, (song_id, uri) in enumerate(current):
+        if i in in_lcs:
+            continue
+        if song_id == current_id:
+            spare[uri].appendleft(song_id)
+        else:
+            spare[uri].append(song_id)
+    moved = set()
+    for j, uri in enumerate(target):
+        if ids[j] is None and spare.get(uri):
+            ids[j] = spare[uri].popleft()
+            moved.add(ids[j])
+
+    keep_current = False
+    if current_id is not None and current_id not in moved and \
+            current_id not in ids:
+        uris = dict(current)
+        if current_id in uris and uris[current_id] in target:
+            # Another song with the same uri took all the positions of this
+            # uri: it is replaced by the current song.
+            j = target.index(uris[current_id])
+            moved.discard(ids[j])
+            ids[j] = current_id
+            moved.add(current_id)
+        elif current_id in uris:
+            keep_current = True
+
+    kept = set(ids)
+    if keep_current:
+        kept.add(current_id)
+    edits = [('deleteid', song_id) for song_id, _ in current
+             if song_id not in kept]
+    queue = [song_id for song_id, _ in current if song_id in kept]
+
+    # Each song that is moved or added is placed right after the previous
+    # target song, which leaves all the songs in the order of the target.
+    # last is the position of the previous target song in the queue.
+    last = -1
+    if keep_current:
+        last = 0
+        if queue[0] != current_id:
+            queue.remove(current_id)
+            queue.insert(0, current_id)
+            edits.append(('moveid', current_id, 0))
+    for j, song_id in enumerate(ids):
+        if song_id is not None and song_id not in moved:
+            # Songs in the common subsequence are after the previous one
+            last = queue.index(song_id, last + 1)
+            continue
+        if song_id is None:
+            # Placeholder for the id of the added song
+            song_id = ('new', j)
+            old = None
+        else:
+            old = queue.index(song_id)
+            del queue[old]
+            if old < last:
+                last -= 1
+        pos = last + 1
+        queue.insert(pos, song_id)
+        if old is None:
+            edits.append(('addid', target[j], pos))
+        elif old != pos:
+            edits.append(('moveid', song_id, pos))
+        last = pos
+    return edits, ids
@@ -0,0 +1,379 @@
+"""
+Compact records for the items returned by mpd, and typed wrappers for the
+status and stats commands.
+
+Parsing functions return items as `(name, attrs)` tuples, where attrs is a
+dictionary with all the attributes sent by mpd, as strings. When keeping a
+large number of items, like a whole library, the records defined here use
+much less memory: they use `__slots__`, the most common tags are stored in
+typed fields and the other ones in a dictionary with interned keys.
+"""
+import calendar
+import sys
+import time
+
+
+def parse_timestamp(value):
+    """
+    Parse a timestamp in the format used by mpd for `Last-Modified`.
+
+    :param value: a string like '2015-06-11T16:25:16Z'
+    :return: the number of seconds since the epoch, as an int, or None if
+    the value could not be parsed.
+    """
+    try:
+        return calendar.timegm((int(value[0:4]), int(value[5:7]),
+                                int(value[8:10]), int(value[11:13]),
+                                int(value[14:16]), int(value[17:19])))
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _intern(value):
+    return None if value is None else sys.intern(value)
+
+
+class Song(object):
+    """
+    A song, in the library or in the play queue.
+
+    `id` and `pos` are only set for songs in the play queue. `time` (in
+    seconds) and `last_modified` (seconds since the epoch) are ints,
+    `duration` is a float. Tags without a dedicated field are in the `tags`
+    dictionary, which is None when there is no such tag.
+    """
+
+    __slots__ = ('uri', 'id', 'pos', 'time', 'duration', 'last_modified',
+                 'artist', 'albumartist', 'album', 'title', 'track',
+                 'genre', 'date', 'disc', 'name', 'tags')
+
+    # Tags stored in a dedicated field, with the name of the field
+    TAG_FIELDS = {'Id': 'id', 'Pos': 'pos', 'Time': 'time',
+                  'duration': 'duration', 'Last-Modified': 'last_modified',
+                  'Artist': 'artist', 'AlbumArtist': 'albumartist',
+                  'Album': 'album', 'Title': 'title', 'Track': 'track',
+                  'Genre': 'genre', 'Date': 'date', 'Disc': 'disc',
+                  'Name': 'name'}
+
+    def __init__(self, uri, attrs=None):
+        """
+        :param uri: uri of the song.
+        :param attrs: a dictionary of attributes, as returned by the parsing
+        functions. It is modified.
+        """
+        self.uri = uri
+        attrs = {} if attrs is None else attrs
+        pop = attrs.pop
+        self.id = _to_int(pop('Id', None))
+        self.pos = _to_int(pop('Pos', None))
+        self.time = _to_int(pop('Time', None))
+        self.duration = _to_float(pop('duration', None))
+        self.last_modified = parse_timestamp(pop('Last-Modified', None))
+        # These values are shared by many songs
+        self.artist = _intern(pop('Artist', None))
+        self.albumartist = _intern(pop('AlbumArtist', None))
+        self.album = _intern(pop('Album', None))
+        self.genre = _intern(pop('Genre', None))
+        self.date = _intern(pop('Date', None))
+        self.title = pop('Title', None)
+        self.track = pop('Track', None)
+        self.disc = pop('Disc', None)
+        self.name = pop('Name', None)
+        if attrs:
+            self.tags = {sys.intern(k): v for k, v in attrs.items()}
+        else:
+            self.tags = None
+
+    def get(self, tag, default=None):
+        """
+        Get the value of a tag, by its mpd name.
+
+        :param tag: the name of the tag, as used by mpd (e.g. 'Artist').
+        :param default: value returned if the song has no such tag.
+        """
+        field = self.TAG_FIELDS.get(tag)
+        if field is not None:
+            value = getattr(self, field)
+        elif self.tags is not None:
+            value = self.tags.get(tag)
+        else:
+            value = None
+        return default if value is None else value
+
+    def __repr__(self):
+        return 'Song({!r})'.format(self.uri)
+
+
+class Directory(object):
+    """
+    A directory of the music database.
+    """
+
+    __slots__ = ('path', 'last_modified')
+
+    def __init__(self, path, attrs=None):
+        self.path = path
+        attrs = {} if attrs is None else attrs
+        self.last_modified = parse_timestamp(attrs.get('Last-Modified'))
+
+    def __repr__(self):
+        return 'Directory({!r})'.format(self.path)
+
+
+class Playlist(object):
+    """
+    A stored playlist.
+    """
+
+    __slots__ = ('path', 'last_modified')
+
+    def __init__(self, path, attrs=None):
+        self.path = path
+        attrs = {} if attrs is None else attrs
+        self.last_modified = parse_timestamp(attrs.get('Last-Modified'))
+
+    def __repr__(self):
+        return 'Playlist({!r})'.format(self.path)
+
+
+# Record class for each kind of item
+RECORD_TYPES = {'file': Song,
+                'directory': Directory,
+                'playlist': Playlist}
+
+
+def make_record(kind, name, attrs):
+    """
+    Build the compact record for an item.
+
+    Can be used as factory with `MpdClientProtocol.iter_command`.
+
+    :param kind: 'file', 'directory' or 'playlist'
+    :param name: uri or path of the item
+    :param attrs: dictionary of attributes of the item
+    :return: a Song, Directory or Playlist instance
+    """
+    return RECORD_TYPES[kind](name, attrs)
+
+
+class _Info(object):
+    """
+    Base class for the objects wrapping the response of a command like
+    status or stats.
+
+    Values are kept as strings and converted when accessed. For
+    compatibility with the dictionaries previously returned, raw values can
+    also be accessed with `info['name']` and `info.get('name')`.
+    """
+
+    __slots__ = ('_raw',)
+
+    def __init__(self, raw):
+        """
+        :param raw: dictionary of values, as returned by parse_lines_to_dict
+        """
+        self._raw = raw
+
+    def __getitem__(self, name):
+        return self._raw[name]
+
+    def __contains__(self, name):
+        return name in self._raw
+
+    def get(self, name, default=None):
+        return self._raw.get(name, default)
+
+    def as_dict(self):
+        """
+        :return: a copy of the raw values, as a dictionary
+        """
+        return dict(self._raw)
+
+    def _int(self, name):
+        return _to_int(self._raw.get(name))
+
+    def _float(self, name):
+        return _to_float(self._raw.get(name))
+
+    def _bool(self, name):
+        return self._raw.get(name) == '1'
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self._raw)
+
+
+class Status(_Info):
+    """
+    Result of the status command.
+    """
+
+    __slots__ = ('fetched',)
+
+    def __init__(self, raw, fetched=None):
+        """
+        :param raw: dictionary of values, as returned by parse_lines_to_dict
+        :param fetched: time (as given by time.monotonic()) at which the
+        status was received from mpd, used to compute the current elapsed
+        time.
+        """
+        super().__init__(raw)
+        self.fetched = time.monotonic() if fetched is None else fetched
+
+    @property
+    def state(self):
+        """ 'play', 'stop' or 'pause' """
+        return self._raw.get('state')
+
+    @property
+    def volume(self):
+        """ volume, between 0 and 100, None if there is no mixer """
+        volume = self._int('volume')
+        return None if volume is None or volume < 0 else volume
+
+    @property
+    def repeat(self):
+        return self._bool('repeat')
+
+    @property
+    def random(self):
+        return self._bool('random')
+
+    @property
+    def single(self):
+        return self._bool('single')
+
+    @property
+    def consume(self):
+        return self._bool('consume')
+
+    @property
+    def playlist(self):
+        """ version of the play queue """
+        return self._int('playlist')
+
+    @property
+    def playlistlength(self):
+        return self._int('playlistlength')
+
+    @property
+    def song(self):
+        """ position of the current song in the play queue """
+        return self._int('song')
+
+    @property
+    def songid(self):
+        return self._int('songid')
+
+    @property
+    def nextsong(self):
+        return self._int('nextsong')
+
+    @property
+    def nextsongid(self):
+        return self._int('nextsongid')
+
+    @property
+    def elapsed(self):
+        """ elapsed time of the current song, when fetched, in seconds """
+        return self._float('elapsed')
+
+    @property
+    def duration(self):
+        """ duration of the current song, in seconds """
+        duration = self._float('duration')
+        if duration is None and 'time' in self._raw:
+            # Older mpd versions only give the time as 'elapsed:total'
+            duration = _to_float(self._raw['time'].partition(':')[2])
+        return duration
+
+    @property
+    def bitrate(self):
+        return self._int('bitrate')
+
+    @property
+    def xfade(self):
+        return self._int('xfade')
+
+    @property
+    def audio(self):
+        return self._raw.get('audio')
+
+    @property
+    def updating_db(self):
+        """ id of the database update job, None if there is no update """
+        return self._int('updating_db')
+
+    @property
+    def error(self):
+        return self._raw.get('error')
+
+    def elapsed_now(self):
+        """
+        Elapsed time of the current song, now.
+
+        When the status is kept for some time, the elapsed time sent by mpd
+        is out of date while playing: this method adds the time spent since
+        the status was fetched.
+
+        :return: the elapsed time, in seconds, or None if no song is
+        playing or paused.
+        """
+        elapsed = self.elapsed
+        if elapsed is None or self.state != 'play':
+            return elapsed
+        elapsed += time.monotonic() - self.fetched
+        duration = self.duration
+        if duration:
+            elapsed = min(elapsed, duration)
+        return elapsed
+
+
+class Stats(_Info):
+    """
+    Result of the stats command.
+    """
+
+    __slots__ = ()
+
+    @property
+    def artists(self):
+        return self._int('artists')
+
+    @property
+    def albums(self):
+        return self._int('albums')
+
+    @property
+    def songs(self):
+        return self._int('songs')
+
+    @property
+    def uptime(self):
+        return self._int('uptime')
+
+    @property
+    def playtime(self):
+        return self._int('playtime')
+
+    @property
+    def db_playtime(self):
+        return self._int('db_playtime')
+
+    @property
+    def db_update(self):
+        """ time of the last database update, seconds since the epoch """
+        return self._int('db_update')
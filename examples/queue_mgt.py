@@ -3,7 +3,7 @@ import sys
 import ampdclient
 
 
-# This script demonstrates the lsinfo, add, addid and load command.
+# This script demonstrates the lsinfo, add, addid_many and load command.
 # It can be called on with the host and the path as argument:
 #    `python queue_mgt.py 127.0.0.1 testpl`
 #
@@ -47,14 +47,13 @@ def start(host, path):
             # Make sure
             print('Could not load playlist {} \n\t {}'.format(p[0], e))
 
-    # Add files in the play queue
-    for f in files:
-        try:
-            f_id = yield from mpd_client.addid(f[0])
+    # Add files in the play queue, with a few command lists
+    f_ids = yield from mpd_client.addid_many([f[0] for f in files])
+    for f, f_id in zip(files, f_ids):
+        if isinstance(f_id, ampdclient.MpdCommandException):
+            print('Could not enqueue file {} \n\t {}'.format(f[0], f_id))
+        else:
             print('loaded {} - id: {}'.format(f[0], f_id))
-        except ampdclient.MpdCommandException as e:
-
-            print('Could not enqueue file {} \n\t {}'.format(f[0], e))
 
     # Add (recursive) directories in the play queue
     for d in dirs:
@@ -0,0 +1,145 @@
+"""
+Throughput and latency benchmarks of the client against the fake mpd server
+of fake_mpd.py.
+
+For each scenario, reports the number of operations per second, the median
+and 99th percentile latency of an operation and the peak resident memory of
+the process so far. The server runs in the same process and event loop as
+the client, so absolute numbers include the cost of the server.
+
+Scenarios:
+- ping: commands sent one after the other, each one costs a noidle / idle
+  cycle.
+- burst: concurrent callers, their commands are pipelined.
+- command_list: lists of 10 commands.
+- lsinfo: large lsinfo responses, parsed at once.
+- playlistinfo: large playlistinfo responses, streamed as Song records.
+- addid_many: 5000 songs added to the play queue at once.
+
+Usage: `python tests/bench_client.py [number_of_songs]`
+"""
+import asyncio
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+import ampdclient
+
+from fake_mpd import FakeMpd, song_lines
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round(p / 100 * (len(values) - 1)))]
+
+
+def peak_rss():
+    """
+    :return: the peak resident memory of the process, in MB, None if it is
+    not known.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return rss / 2 ** 20
+    return rss / 2 ** 10
+
+
+def report(name, latencies, duration):
+    rss = peak_rss()
+    print('{:<14} {:>8} ops {:>10,.0f} ops/s   p50 {:>8.3f} ms   '
+          'p99 {:>8.3f} ms   peak RSS {}'.format(
+              name, len(latencies), len(latencies) / duration,
+              percentile(latencies, 50) * 1000,
+              percentile(latencies, 99) * 1000,
+              'n/a' if rss is None else '{:.0f} MB'.format(rss)))
+
+
+@asyncio.coroutine
+def timed(latencies, coro):
+    start = time.perf_counter()
+    yield from coro
+    latencies.append(time.perf_counter() - start)
+
+
+@asyncio.coroutine
+def run_sequential(name, func, count):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(count):
+        yield from timed(latencies, func())
+    report(name, latencies, time.perf_counter() - start)
+
+
+@asyncio.coroutine
+def run_concurrent(name, func, callers, count, loop):
+
+    @asyncio.coroutine
+    def caller():
+        for _ in range(count):
+            yield from timed(latencies, func())
+
+    latencies = []
+    start = time.perf_counter()
+    yield from asyncio.gather(*[caller() for _ in range(callers)], loop=loop)
+    report(name, latencies, time.perf_counter() - start)
+
+
+@asyncio.coroutine
+def read_all(iterator):
+    while True:
+        record = yield from iterator.next()
+        if record is None:
+            break
+
+
+@asyncio.coroutine
+def bench(loop, songs):
+    server = FakeMpd(loop=loop)
+    # Keeping the log would distort the memory usage
+    server.log = None
+    server.set_response('lsinfo', song_lines(songs))
+    server.set_response('playlistinfo', song_lines(songs))
+    yield from server.start()
+    client = yield from ampdclient.connect('127.0.0.1', server.port,
+                                          loop=loop)
+
+    yield from run_sequential('ping', lambda: client.command('ping'), 2000)
+    yield from run_concurrent('burst', lambda: client.command('ping'),
+                              100, 200, loop)
+    yield from run_sequential(
+        'command_list', lambda: client.command_list(['ping'] * 10), 1000)
+    yield from run_sequential('lsinfo', lambda: client.lsinfo(''), 10)
+    yield from run_sequential(
+        'playlistinfo',
+        lambda: read_all(client.iter_playlistinfo(compact=True)), 10)
+    uris = ['Artist/Album/{:04d} - Some Title.flac'.format(i)
+            for i in range(5000)]
+
+    @asyncio.coroutine
+    def add_all():
+        # Cleared first, the play queue does not grow with each iteration
+        yield from client.clear()
+        return (yield from client.addid_many(uris))
+    yield from run_sequential('addid_many', add_all, 10)
+
+    yield from client.close()
+    yield from server.stop()
+
+
+def main(argv):
+    songs = int(argv[0]) if argv else 20000
+    loop = asyncio.get_event_loop()
+    print('Large responses: {} songs'.format(songs))
+    loop.run_until_complete(bench(loop, songs))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks for the parsing functions.
+
+Reports the number of lines parsed per second by each parser.
+
+Usage: `python tests/bench_parsing.py [number_of_songs]`
+"""
+import sys
+import timeit
+
+import ampdclient.client as c
+
+
+def song_lines(count):
+    lines = []
+    for i in range(count):
+        lines.extend([
+            'file: Artist {0}/Album {0}/{0:02d} - Some Title.flac'.format(i),
+            'Last-Modified: 2015-06-11T16:25:16Z',
+            'Time: 288',
+            'Artist: Artist {}'.format(i),
+            'AlbumArtist: Artist {}'.format(i),
+            'Title: Some Title {}'.format(i),
+            'Album: Album {}'.format(i),
+            'Track: 1/10',
+            'Date: 2005-02-28',
+            'Genre: Alternative Rock',
+            'Pos: {}'.format(i),
+            'Id: {}'.format(i)])
+    return lines
+
+
+def status_lines():
+    return ['volume: 50', 'repeat: 0', 'random: 1', 'single: 0',
+            'consume: 0', 'playlist: 52', 'playlistlength: 10',
+            'mixrampdb: 0.000000', 'state: play', 'song: 3', 'songid: 34',
+            'time: 20:288', 'elapsed: 20.105', 'bitrate: 320',
+            'audio: 44100:24:2', 'nextsong: 4', 'nextsongid: 35']
+
+
+def record_parser(lines):
+    parser = c._RecordParser(c.LSINFO_KEYS, c._make_triple)
+    return parser.feed(lines) + parser.close()
+
+
+def bench(name, func, lines, repeat=3):
+    duration = min(timeit.repeat(lambda: func(lines), number=1,
+                                 repeat=repeat))
+    print('{:<28} {:>12,.0f} lines/s'.format(name, len(lines) / duration))
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 50000
+    songs = song_lines(count)
+    status = status_lines() * 1000
+
+    bench('parse_lines_to_dict', c.parse_lines_to_dict, status)
+    bench('parse_playlist', c.parse_playlist, songs)
+    bench('parse_playlist (intern)',
+          lambda lines: c.parse_playlist(lines, intern=True), songs)
+    bench('parse_lsinfo', c.parse_lsinfo, songs)
+    bench('_RecordParser', record_parser, songs)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
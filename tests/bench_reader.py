@@ -0,0 +1,90 @@
+"""
+Benchmark of the response reader on a large synthetic response.
+
+Compares MpdClientProtocol._read_response with the previous line by line
+reader, based on StreamReader.readline().
+
+Usage: `python tests/bench_reader.py [size_in_MB]`
+"""
+import asyncio
+import sys
+import time
+
+from ampdclient.client import MpdClientProtocol
+
+
+def build_response(size):
+    """
+    Build a listallinfo-like response of about `size` bytes.
+    """
+    song = ('file: Artist {0}/Album {0}/{0:02d} - Some Title.flac\n'
+            'Last-Modified: 2015-06-11T16:25:16Z\n'
+            'Time: 288\n'
+            'Artist: Artist {0}\n'
+            'Album: Album {0}\n'
+            'Title: Some Title {0}\n'
+            'Track: 1/10\n'
+            'Genre: Alternative Rock\n')
+    chunks = []
+    total = 0
+    i = 0
+    while total < size:
+        chunk = song.format(i).encode(encoding='UTF-8')
+        chunks.append(chunk)
+        total += len(chunk)
+        i += 1
+    chunks.append(b'OK\n')
+    return b''.join(chunks)
+
+
+@asyncio.coroutine
+def readline_reader(reader):
+    # Line by line reader, as used before the buffered reader.
+    message = []
+    while True:
+        line = yield from reader.readline()
+        if line == b'':
+            if reader.at_eof():
+                break
+        elif line.startswith(b'OK'):
+            break
+        elif line.startswith(b'ACK'):
+            message.append(line[:-1].decode(encoding='UTF-8'))
+            break
+        else:
+            message.append(line[:-1].decode(encoding='UTF-8'))
+    return message
+
+
+@asyncio.coroutine
+def buffered_reader(reader):
+    protocol = MpdClientProtocol()
+    protocol.reader = reader
+    lines = yield from protocol._read_response()
+    return lines
+
+
+def bench(loop, name, reader_func, data):
+    reader = asyncio.StreamReader(loop=loop)
+    reader.feed_data(data)
+    start = time.perf_counter()
+    lines = loop.run_until_complete(reader_func(reader))
+    duration = time.perf_counter() - start
+    print('{:<10} {:>10} lines {:>8.3f} s {:>10.1f} MB/s'.format(
+        name, len(lines), duration, len(data) / duration / 2 ** 20))
+    return lines
+
+
+def main(argv):
+    size = int(argv[0]) if argv else 100
+    loop = asyncio.get_event_loop()
+    data = build_response(size * 2 ** 20)
+    print('Response size: {:.1f} MB'.format(len(data) / 2 ** 20))
+
+    expected = bench(loop, 'readline', readline_reader, data)
+    lines = bench(loop, 'buffered', buffered_reader, data)
+    assert lines == expected
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
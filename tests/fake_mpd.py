@@ -0,0 +1,387 @@
+"""
+A fake mpd server, for the tests and the benchmarks.
+
+It speaks enough of mpd's protocol for the client: the welcome message,
+idle and noidle, command lists and a few commands. The response of each
+command can be configured, large responses are encoded once in advance.
+
+Example:
+    server = FakeMpd(loop=loop)
+    yield from server.start()
+    server.set_response('lsinfo', song_lines(10000))
+    client = yield from ampdclient.connect('127.0.0.1', server.port)
+"""
+import asyncio
+import shlex
+
+
+class FakeMpdError(Exception):
+    """
+    Raised by a handler to send an ACK line.
+    """
+
+    def __init__(self, code, msg):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+def song_lines(count, start=0):
+    """
+    Build the lines of a response listing songs, like lsinfo or
+    playlistinfo.
+    """
+    lines = []
+    for i in range(start, start + count):
+        lines.extend([
+            'file: Artist {0}/Album {0}/{0:02d} - Some Title.flac'.format(i),
+            'Last-Modified: 2015-06-11T16:25:16Z',
+            'Time: 288',
+            'duration: 288.123',
+            'Artist: Artist {}'.format(i % 100),
+            'Album: Album {}'.format(i % 1000),
+            'Title: Some Title {}'.format(i),
+            'Track: 1/10',
+            'Genre: Alternative Rock',
+            'Pos: {}'.format(i),
+            'Id: {}'.format(i + 1)])
+    return lines
+
+
+def _encode(lines):
+    return ''.join(line + '\n' for line in lines).encode(encoding='UTF-8')
+
+
+class _Connection(object):
+
+    def __init__(self, reader, writer, loop):
+        self.reader = reader
+        self.writer = writer
+        # Changes not sent to the client yet
+        self.changes = set()
+        self.event = asyncio.Event(loop=loop)
+        # Pending readline, kept when idle is interrupted by a change
+        self.f_line = None
+
+
+class FakeMpd(object):
+    """
+    A fake mpd server, listening on localhost.
+
+    `handlers` maps command names to functions called with the list of the
+    arguments of the command. They return the lines of the response, as a
+    list of strings or as bytes, without the final `OK`, or raise a
+    FakeMpdError. All the commands received are appended to `log`, except
+    when `log` is None.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.port = None
+        self.server = None
+        self.log = []
+        self.playlist_version = 1
+        # Play queue, as a list of (id, uri)
+        self.queue = []
+        # Version of the last change of each position of the play queue,
+        # for plchangesposid, as kept by mpd
+        self._pos_versions = []
+        # Uris that add and addid reject
+        self.missing = set()
+        # Id of the song being played, deleting it stops playback
+        self.current = None
+        self._next_id = 1
+        self._connections = []
+        # Cleared while commands are not processed, see pause()
+        self._running = asyncio.Event(loop=self.loop)
+        self._running.set()
+        self.handlers = {
+            'ping': lambda args: [],
+            'status': self._status,
+            'stats': lambda args: ['artists: 100', 'albums: 1000',
+                                   'songs: 10000', 'uptime: 42'],
+            'currentsong': lambda args: [],
+            'clearerror': lambda args: [],
+            'addid': self._addid,
+            'add': self._add,
+            'deleteid': self._deleteid,
+            'delete': self._delete,
+            'move': self._move,
+            'moveid': self._moveid,
+            'clear': self._clear,
+            'playlistinfo': self._playlistinfo,
+            'playlistid': self._playlistid,
+            'plchangesposid': self._plchangesposid,
+        }
+
+    @asyncio.coroutine
+    def start(self, port=0):
+        """
+        Start listening, on a random port by default.
+        """
+        self.server = yield from asyncio.start_server(
+            self._client, '127.0.0.1', port or self.port or 0,
+            loop=self.loop)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    @asyncio.coroutine
+    def stop(self):
+        """
+        Stop listening and close all connections.
+        """
+        self.server.close()
+        for conn in list(self._connections):
+            conn.writer.close()
+        yield from self.server.wait_closed()
+
+    def set_response(self, name, lines):
+        """
+        Set a fixed response for a command, encoded once.
+        """
+        data = _encode(lines)
+        self.handlers[name] = lambda args: data
+
+    def pause(self):
+        """
+        Stop processing commands, as a stalled server, until resume() is
+        called. idle and noidle are still handled.
+        """
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def notify(self, *subsystems):
+        """
+        Notify changes to all the connections, as idle responses.
+        """
+        for conn in self._connections:
+            conn.changes.update(subsystems)
+            conn.event.set()
+
+    def _status(self, args):
+        lines = ['volume: 50', 'repeat: 0', 'random: 0', 'single: 0',
+                 'consume: 0', 'playlist: {}'.format(self.playlist_version),
+                 'playlistlength: {}'.format(len(self.queue))]
+        if self.current is None:
+            return lines + ['state: stop']
+        return lines + ['state: play',
+                        'song: {}'.format(self._index(self.current)),
+                        'songid: {}'.format(self.current)]
+
+    # Play queue
+
+    def _changed(self, start=0):
+        """
+        :param start: first position of the play queue that changed, the
+        following ones are changed too.
+        """
+        self.playlist_version += 1
+        versions = self._pos_versions
+        del versions[len(self.queue):]
+        start = min(start, len(versions))
+        versions[start:] = [self.playlist_version] * (len(self.queue) - start)
+        self.notify('playlist')
+
+    def _clear(self, args):
+        del self.queue[:]
+        self.current = None
+        self._changed()
+        return []
+
+    def _addid(self, args):
+        if args[0] in self.missing:
+            raise FakeMpdError(50, 'No such song')
+        track_id = self._next_id
+        self._next_id += 1
+        pos = int(args[1]) if len(args) > 1 else len(self.queue)
+        if not 0 <= pos <= len(self.queue):
+            raise FakeMpdError(2, 'Bad song index')
+        self.queue.insert(pos, (track_id, args[0]))
+        self._changed(pos)
+        return ['Id: {}'.format(track_id)]
+
+    def _add(self, args):
+        self._addid(args)
+        return []
+
+    def _index(self, track_id):
+        for i, (queued_id, _) in enumerate(self.queue):
+            if queued_id == int(track_id):
+                return i
+        raise FakeMpdError(50, 'No such song')
+
+    def _range(self, arg):
+        start, sep, end = arg.partition(':')
+        start = int(start)
+        end = (int(end) if end else len(self.queue)) if sep else start + 1
+        if not 0 <= start < end <= len(self.queue):
+            raise FakeMpdError(2, 'Bad song index')
+        return start, end
+
+    def _deleteid(self, args):
+        pos = self._index(args[0])
+        del self.queue[pos]
+        if self.current == int(args[0]):
+            self.current = None
+        self._changed(pos)
+        return []
+
+    def _delete(self, args):
+        start, end = self._range(args[0])
+        if any(track_id == self.current
+               for track_id, _ in self.queue[start:end]):
+            self.current = None
+        del self.queue[start:end]
+        self._changed(start)
+        return []
+
+    def _move_range(self, start, end, to):
+        songs = self.queue[start:end]
+        del self.queue[start:end]
+        if not 0 <= to <= len(self.queue):
+            self.queue[start:start] = songs
+            raise FakeMpdError(2, 'Bad song index')
+        self.queue[to:to] = songs
+        self._changed(min(start, to))
+
+    def _move(self, args):
+        start, end = self._range(args[0])
+        self._move_range(start, end, int(args[1]))
+        return []
+
+    def _moveid(self, args):
+        i = self._index(args[0])
+        self._move_range(i, i + 1, int(args[1]))
+        return []
+
+    def _playlistinfo(self, args):
+        lines = []
+        for pos, (track_id, uri) in enumerate(self.queue):
+            lines.extend(['file: ' + uri, 'Pos: {}'.format(pos),
+                          'Id: {}'.format(track_id)])
+        return lines
+
+    def _playlistid(self, args):
+        if not args:
+            return self._playlistinfo(args)
+        pos = self._index(args[0])
+        track_id, uri = self.queue[pos]
+        return ['file: ' + uri, 'Pos: {}'.format(pos),
+                'Id: {}'.format(track_id)]
+
+    def _plchangesposid(self, args):
+        # Positions changed after the given version
+        version = int(args[0])
+        lines = []
+        for pos, (track_id, _) in enumerate(self.queue):
+            if self._pos_versions[pos] > version:
+                lines.extend(['cpos: {}'.format(pos),
+                              'Id: {}'.format(track_id)])
+        return lines
+
+    def _run(self, line, index=0):
+        if self.log is not None:
+            self.log.append(line)
+        args = shlex.split(line)
+        handler = self.handlers.get(args[0])
+        try:
+            if handler is None:
+                raise FakeMpdError(5, 'unknown command "{}"'.format(args[0]))
+            resp = handler(args[1:])
+        except FakeMpdError as e:
+            return None, 'ACK [{}@{}] {{{}}} {}\n'.format(
+                e.code, index, args[0], e.msg).encode(encoding='UTF-8')
+        if isinstance(resp, bytes):
+            return resp, None
+        return _encode(resp), None
+
+    def _run_list(self, with_ok, cmds):
+        out = []
+        for i, cmd in enumerate(cmds):
+            resp, ack = self._run(cmd, i)
+            if ack is not None:
+                out.append(ack)
+                return b''.join(out)
+            out.append(resp)
+            if with_ok:
+                out.append(b'list_OK\n')
+        out.append(b'OK\n')
+        return b''.join(out)
+
+    @asyncio.coroutine
+    def _readline(self, conn):
+        if conn.f_line is None:
+            conn.f_line = asyncio.async(conn.reader.readline(),
+                                        loop=self.loop)
+        try:
+            line = yield from conn.f_line
+        finally:
+            conn.f_line = None
+        return line.decode(encoding='UTF-8').rstrip('\n')
+
+    @asyncio.coroutine
+    def _idle(self, conn):
+        while not conn.changes:
+            if conn.f_line is None:
+                conn.f_line = asyncio.async(conn.reader.readline(),
+                                            loop=self.loop)
+            conn.event.clear()
+            f_event = asyncio.async(conn.event.wait(), loop=self.loop)
+            yield from asyncio.wait([conn.f_line, f_event], loop=self.loop,
+                                    return_when=asyncio.FIRST_COMPLETED)
+            f_event.cancel()
+            if conn.f_line.done():
+                # noidle
+                line = yield from self._readline(conn)
+                if self.log is not None:
+                    self.log.append(line)
+                break
+        changes = sorted(conn.changes)
+        conn.changes.clear()
+        conn.writer.write(_encode(['changed: ' + c for c in changes] +
+                                  ['OK']))
+
+    @asyncio.coroutine
+    def _client(self, reader, writer):
+        conn = _Connection(reader, writer, self.loop)
+        self._connections.append(conn)
+        writer.write(b'OK MPD 0.21.0\n')
+        command_list = None
+        try:
+            while True:
+                line = yield from self._readline(conn)
+                if not line:
+                    break
+                if line == 'idle' or line.startswith('idle '):
+                    if self.log is not None:
+                        self.log.append(line)
+                    yield from self._idle(conn)
+                elif line == 'noidle':
+                    continue
+                elif line in ('command_list_begin', 'command_list_ok_begin'):
+                    if self.log is not None:
+                        self.log.append(line)
+                    command_list = (line == 'command_list_ok_begin', [])
+                    continue
+                elif line == 'command_list_end':
+                    yield from self._running.wait()
+                    writer.write(self._run_list(*command_list))
+                    command_list = None
+                elif command_list is not None:
+                    command_list[1].append(line)
+                    continue
+                elif line == 'close':
+                    break
+                else:
+                    yield from self._running.wait()
+                    resp, ack = self._run(line)
+                    writer.write(ack or resp + b'OK\n')
+                yield from writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if conn.f_line is not None:
+                conn.f_line.cancel()
+            self._connections.remove(conn)
+            writer.close()
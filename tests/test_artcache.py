@@ -0,0 +1,149 @@
+import asyncio
+import shutil
+import tempfile
+import time
+import unittest
+
+from ampdclient.artcache import ArtCache
+from ampdclient.client import RECONNECT
+from ampdclient.records import Directory
+
+
+class FakeClient(object):
+
+    def __init__(self, loop, pictures):
+        self.loop = loop
+        self.pictures = pictures
+        self.fetched = []
+        self.listed = []
+        # Last-Modified time of the directories
+        self.modified = {}
+        self.callback = None
+
+    @asyncio.coroutine
+    def albumart(self, uri):
+        self.fetched.append(uri)
+        yield from asyncio.sleep(0.01, loop=self.loop)
+        return self.pictures.get(uri.rpartition('/')[0])
+
+    @asyncio.coroutine
+    def lsinfo(self, path, compact=False):
+        self.listed.append(path)
+        dirs = [Directory(name, {'Last-Modified': time.strftime(
+                    '%Y-%m-%dT%H:%M:%SZ', time.gmtime(modified))})
+                for name, modified in sorted(self.modified.items())]
+        return dirs, [], []
+
+    def subscribe(self, subsystems, callback):
+        self.callback = callback
+
+
+class TestArtCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = FakeClient(self.loop, {'a': b'A' * 100,
+                                             'b': b'B' * 200})
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def get(self, cache, *uris):
+        return self.loop.run_until_complete(asyncio.gather(
+            *[cache.get(uri) for uri in uris], loop=self.loop))
+
+    def test_shared_fetch(self):
+        cache = ArtCache(self.client)
+        pictures = self.get(cache, 'a/1.mp3', 'a/2.mp3', 'b/1.mp3',
+                            'c/1.mp3')
+        self.assertEqual([b'A' * 100, b'A' * 100, b'B' * 200, None],
+                         pictures)
+        # One fetch per directory
+        self.assertEqual(['a', 'b', 'c'],
+                         sorted(cache.key(uri) for uri in self.client.fetched))
+        # Served from memory, including the missing picture
+        self.get(cache, 'a/3.mp3', 'c/2.mp3')
+        self.assertEqual(3, len(self.client.fetched))
+        self.assertEqual(2, cache.counters['hits'])
+
+    def test_lru(self):
+        cache = ArtCache(self.client, max_bytes=250)
+        self.get(cache, 'a/1.mp3')
+        self.get(cache, 'b/1.mp3')
+        self.assertEqual(1, len(cache))
+        self.assertEqual(200, cache.size)
+
+    def test_disk(self):
+        self.client.modified = {'a': time.time() - 60, 'b': time.time() - 60}
+        cache = ArtCache(self.client, self.directory)
+        self.get(cache, 'a/1.mp3', 'b/1.mp3')
+        self.assertEqual(300, cache.disk_size)
+
+        cache = ArtCache(self.client, self.directory)
+        self.assertEqual(300, cache.disk_size)
+        picture, = self.get(cache, 'b/2.mp3')
+        self.assertEqual(b'B' * 200, picture[:])
+        self.assertEqual(1, cache.counters['disk_hits'])
+        self.assertEqual(2, len(self.client.fetched))
+
+        cache = ArtCache(self.client, self.directory, max_disk_bytes=250)
+        self.get(cache, 'a/1.mp3')
+        self.assertEqual(100, cache.disk_size)
+
+    def test_clear(self):
+        cache = ArtCache(self.client, self.directory)
+        self.get(cache, 'a/1.mp3')
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.disk_size)
+        self.get(cache, 'a/1.mp3')
+        self.assertEqual(2, len(self.client.fetched))
+
+    def test_change(self):
+        cache = ArtCache(self.client, self.directory)
+        cache.start()
+        self.client.modified = {'a': time.time() - 60, 'b': time.time() - 60}
+        self.get(cache, 'a/1.mp3', 'b/1.mp3')
+        # 'b' is modified after its picture was fetched
+        self.client.modified['b'] = time.time() + 60
+        self.client.pictures['b'] = b'C' * 50
+        self.client.callback(['database'])
+        self.assertEqual(2, len(cache))
+        pictures = self.get(cache, 'a/2.mp3', 'b/2.mp3')
+        self.assertEqual([b'A' * 100, b'C' * 50], pictures)
+        self.assertEqual(3, len(self.client.fetched))
+        self.assertEqual(['', ''], self.client.listed)
+        self.assertEqual(150, cache.disk_size)
+        # Checked once
+        self.get(cache, 'a/3.mp3', 'b/3.mp3')
+        self.assertEqual(2, len(self.client.listed))
+        self.assertEqual(1, cache.counters['revalidations'])
+        self.assertEqual(1, cache.counters['invalidations'])
+
+    def test_reconnect(self):
+        cache = ArtCache(self.client, self.directory)
+        cache.start()
+        self.client.modified = {'a': time.time() - 60}
+        self.get(cache, 'a/1.mp3')
+        self.client.callback([RECONNECT])
+        self.assertEqual(100, cache.disk_size)
+        self.get(cache, 'a/2.mp3')
+        self.assertEqual(1, len(self.client.fetched))
+        self.assertEqual(1, len(self.client.listed))
+
+    def test_disk_check(self):
+        # Files of a previous cache are checked before being used
+        cache = ArtCache(self.client, self.directory)
+        self.client.modified = {'a': time.time() - 60}
+        self.get(cache, 'a/1.mp3', 'b/1.mp3')
+        cache = ArtCache(self.client, self.directory)
+        self.get(cache, 'a/2.mp3', 'b/2.mp3')
+        self.assertEqual(1, cache.counters['disk_hits'])
+        # 'b' is not listed by lsinfo: fetched again
+        self.assertEqual(1, cache.counters['invalidations'])
+        self.assertEqual(['a/1.mp3', 'b/1.mp3', 'b/2.mp3'],
+                         sorted(self.client.fetched))
+        self.assertEqual(300, cache.disk_size)
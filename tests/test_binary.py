@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from ampdclient.client import MpdClientProtocol
+
+
+class TestBinaryResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = MpdClientProtocol(loop=self.loop)
+        self.client.reader = asyncio.StreamReader(loop=self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def read(self, chunks, into=None):
+        for chunk in chunks:
+            self.client.reader.feed_data(chunk)
+        return self.loop.run_until_complete(self.client._read_binary(into))
+
+    def test_binary(self):
+        payload = bytes(range(256)) * 4
+        lines, data = self.read([b'size: 5000\ntype: image/png\nbinary: 1',
+                                 b'024\n' + payload[:10],
+                                 payload[10:] + b'\nOK\nOK\n'])
+        self.assertEqual(['size: 5000', 'type: image/png'], lines)
+        self.assertEqual(payload, bytes(data))
+        # The following response is kept
+        self.assertEqual(b'OK\n', bytes(self.client._buffer))
+
+    def test_into(self):
+        picture = bytearray(8)
+        lines, data = self.read([b'size: 8\nbinary: 3\nabc\nOK\n'],
+                                memoryview(picture)[2:])
+        self.assertIs(picture, data.obj)
+        self.assertEqual(b'\0\0abc\0\0\0', bytes(picture))
+
+    def test_no_payload(self):
+        self.assertEqual(([], None), self.read([b'OK\n']))
+        lines, data = self.read([b'ACK [50@0] {albumart} No file exists\n'])
+        self.assertEqual(['ACK [50@0] {albumart} No file exists'], lines)
+        self.assertIsNone(data)
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+
+from ampdclient.cache import ResponseCache
+
+from test_client import ClientTestCase
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_hit_miss(self):
+
+        cache = ResponseCache()
+        self.assertIsNone(cache.get('lsinfo "a"\n'))
+        cache.put('lsinfo "a"\n', 'lsinfo', ['file: a/b.mp3'])
+        self.assertEqual(['file: a/b.mp3'], cache.get('lsinfo "a"\n'))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_not_cacheable(self):
+
+        cache = ResponseCache()
+        self.assertFalse(cache.cacheable('status'))
+        cache.put('status\n', 'status', ['state: play'])
+        self.assertEqual(0, len(cache))
+
+    def test_ttl(self):
+
+        cache = ResponseCache(ttls={'lsinfo': -1})
+        cache.put('lsinfo "a"\n', 'lsinfo', ['file: a/b.mp3'])
+        self.assertIsNone(cache.get('lsinfo "a"\n'))
+        self.assertEqual(0, cache.size)
+
+    def test_lru_eviction(self):
+
+        cache = ResponseCache(max_entries=2)
+        cache.put('lsinfo "a"\n', 'lsinfo', [])
+        cache.put('lsinfo "b"\n', 'lsinfo', [])
+        cache.get('lsinfo "a"\n')
+        cache.put('lsinfo "c"\n', 'lsinfo', [])
+        self.assertIsNotNone(cache.get('lsinfo "a"\n'))
+        self.assertIsNone(cache.get('lsinfo "b"\n'))
+        self.assertEqual(1, cache.evictions)
+
+    def test_size_bound(self):
+
+        cache = ResponseCache(max_bytes=100)
+        cache.put('lsinfo "a"\n', 'lsinfo', ['x' * 40])
+        cache.put('lsinfo "b"\n', 'lsinfo', ['x' * 40])
+        self.assertEqual(1, len(cache))
+        self.assertLessEqual(cache.size, 100)
+
+    def test_invalidate(self):
+
+        cache = ResponseCache()
+        cache.put('lsinfo "a"\n', 'lsinfo', [])
+        cache.put('playlistinfo\n', 'playlistinfo', [])
+        cache.invalidate({'playlist'})
+        self.assertIsNone(cache.get('playlistinfo\n'))
+        self.assertIsNotNone(cache.get('lsinfo "a"\n'))
+        cache.invalidate_command('update')
+        self.assertIsNotNone(cache.get('lsinfo "a"\n'))
+        cache.invalidate({'database'})
+        self.assertIsNone(cache.get('lsinfo "a"\n'))
+
+    def test_stale_put(self):
+
+        cache = ResponseCache()
+        generation = cache.generation
+        cache.invalidate({'playlist'})
+        cache.put('playlistinfo\n', 'playlistinfo', [], generation)
+        self.assertEqual(0, len(cache))
+
+
+class TestClientCache(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = ResponseCache()
+        self.client.cache = self.cache
+        self.server.handlers['lsinfo'] = lambda args: ['directory: a']
+
+    def test_hit(self):
+        self.run_coro(self.client.lsinfo(''))
+        self.run_coro(self.client.lsinfo(''))
+        self.assertEqual(['lsinfo ""'], self.sent())
+        self.assertEqual(1, self.cache.hits)
+
+    def test_idle_event(self):
+        self.run_coro(self.client.lsinfo(''))
+        self.server.notify('database')
+        self.run_coro(asyncio.sleep(0.05, loop=self.loop))
+        self.run_coro(self.client.lsinfo(''))
+        self.assertEqual(['lsinfo ""', 'lsinfo ""'], self.sent())
+
+    def test_write_command(self):
+        self.run_coro(self.client.playlistinfo())
+        self.run_coro(self.client.lsinfo(''))
+        self.run_coro(self.client.addid('a.mp3'))
+        self.run_coro(self.client.playlistinfo())
+        # Not invalidated by addid
+        self.run_coro(self.client.lsinfo(''))
+        self.assertEqual(['playlistinfo ', 'lsinfo ""', 'addid "a.mp3"',
+                          'playlistinfo '], self.sent())
+
+    def test_stale_response(self):
+        self.server.pause()
+        tasks = [asyncio.async(coro, loop=self.loop) for coro in [
+            self.client.playlistinfo(), self.client.addid('a.mp3')]]
+        self.run_coro(asyncio.sleep(0.02, loop=self.loop))
+        self.server.resume()
+        self.run_coro(asyncio.gather(*tasks, loop=self.loop))
+        # The response of playlistinfo, received before addid was executed,
+        # is not cached
+        self.assertEqual(0, len(self.cache))
+        songs = self.run_coro(self.client.playlistinfo())
+        self.assertEqual(['a.mp3'], [uri for uri, _ in songs])
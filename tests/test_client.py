@@ -0,0 +1,607 @@
+import asyncio
+import unittest
+
+import ampdclient
+from ampdclient.client import MpdCommandException, MpdConnectionError
+from ampdclient.metrics import MetricsCollector
+
+from fake_mpd import FakeMpd, FakeMpdError, song_lines
+
+
+class ClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = FakeMpd(loop=self.loop)
+        self.run_coro(self.server.start())
+        self.client = self.run_coro(self.open_client())
+
+    def tearDown(self):
+        self.run_coro(self.client.close())
+        self.run_coro(self.server.stop())
+        self.loop.close()
+
+    def open_client(self):
+        return ampdclient.connect('127.0.0.1', self.server.port,
+                                  loop=self.loop, timeout=5)
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(
+            asyncio.wait_for(coro, 5, loop=self.loop))
+
+    def sent(self):
+        # Commands received by the server, except idle / noidle
+        return [cmd for cmd in self.server.log
+                if cmd not in ('idle', 'noidle')]
+
+
+class TestCommands(ClientTestCase):
+
+    def test_command(self):
+        lines = self.run_coro(self.client.command('stats'))
+        self.assertIn('songs: 10000', lines)
+
+    def test_error(self):
+        with self.assertRaises(MpdCommandException) as cm:
+            self.run_coro(self.client.command('foo'))
+        self.assertEqual('5', cm.exception.error)
+        self.assertEqual('foo', cm.exception.command)
+        # The connection can still be used
+        self.run_coro(self.client.command('ping'))
+
+    def test_pipelining(self):
+        # Queued in order: gather does not keep the order of its arguments
+        # when it schedules coroutines
+        futures = [asyncio.async(self.client.command(
+            'addid "{}.mp3"'.format(i)), loop=self.loop) for i in range(100)]
+        ids = self.run_coro(asyncio.gather(*futures, loop=self.loop))
+        self.assertEqual([['Id: {}'.format(i)] for i in range(1, 101)], ids)
+        # All the commands are sent after a single noidle
+        self.assertEqual(1, self.server.log.count('noidle'))
+
+    def test_command_list(self):
+        results = self.run_coro(self.client.command_list(
+            ['addid "a.mp3"', 'addid "b.mp3"']))
+        self.assertEqual([['Id: 1'], ['Id: 2']], results)
+
+        def fail(args):
+            raise FakeMpdError(50, 'No such song')
+        self.server.handlers['deleteid'] = fail
+        with self.assertRaises(MpdCommandException) as cm:
+            self.run_coro(self.client.command_list(
+                ['addid "c.mp3"', 'deleteid 12', 'addid "d.mp3"']))
+        self.assertEqual(1, cm.exception.line)
+        self.assertEqual([['Id: 3']], cm.exception.results)
+
+    def test_stream(self):
+        self.server.set_response('playlistinfo', song_lines(5000))
+
+        @asyncio.coroutine
+        def read():
+            songs = []
+            it = self.client.iter_playlistinfo(compact=True)
+            while True:
+                song = yield from it.next()
+                if song is None:
+                    return songs
+                songs.append(song)
+        songs = self.run_coro(read())
+        self.assertEqual(5000, len(songs))
+        self.assertEqual(4999, songs[-1].pos)
+        # The connection can still be used
+        self.assertEqual([], self.run_coro(self.client.command('ping')))
+
+    def test_stream_quoting(self):
+        self.server.handlers['listallinfo'] = \
+            lambda args: ['directory: ' + args[0]]
+
+        @asyncio.coroutine
+        def read():
+            it = self.client.iter_listallinfo('a "b"\\c')
+            record = yield from it.next()
+            end = yield from it.next()
+            return record, end
+        self.assertEqual((('directory', 'a "b"\\c', {}), None),
+                         self.run_coro(read()))
+
+
+class TestBinary(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.picture = bytes(range(256)) * 100
+
+        def albumart(args):
+            if args[0] != 'a/1.flac':
+                raise FakeMpdError(50, 'No file exists')
+            offset = int(args[1])
+            chunk = self.picture[offset:offset + 8192]
+            return 'size: {}\nbinary: {}\n'.format(
+                len(self.picture), len(chunk)).encode() + chunk + b'\n'
+        self.server.handlers['albumart'] = albumart
+
+    def test_albumart(self):
+        picture = self.run_coro(self.client.albumart('a/1.flac'))
+        self.assertIsInstance(picture, bytearray)
+        self.assertEqual(self.picture, picture)
+        # Chunks of 8 KiB
+        self.assertEqual(['albumart "a/1.flac" {}'.format(offset)
+                          for offset in range(0, 25600, 8192)], self.sent())
+        self.assertIsNone(self.run_coro(self.client.albumart('b/1.flac')))
+
+    def test_truncated(self):
+        # The file is truncated between two chunks
+        self.server.handlers['albumart'] = lambda args: \
+            b'size: 10\nbinary: 4\nabcd\n' if args[1] == '0' \
+            else b'size: 4\nbinary: 0\n\n'
+        picture = self.run_coro(self.client.albumart('a/1.flac'))
+        self.assertEqual(b'abcd', picture)
+
+    def test_grown(self):
+        # The file grows between two chunks, the second one is larger than
+        # the space left
+        self.server.handlers['albumart'] = lambda args: \
+            b'size: 10\nbinary: 4\nabcd\n' if args[1] == '0' \
+            else b'size: 12\nbinary: 8\nefghijkl\n'
+        picture = self.run_coro(self.client.albumart('a/1.flac'))
+        self.assertEqual(b'abcdefghijkl', picture)
+
+    def test_command(self):
+        # The text reader can not read these responses
+        with self.assertRaises(ValueError):
+            self.run_coro(self.client.command('albumart "a/1.flac" 0'))
+        with self.assertRaises(ValueError):
+            self.run_coro(self.client.command_list(
+                ['ping', 'readpicture "a/1.flac" 0']))
+        self.assertEqual([], self.sent())
+
+
+class TestSearch(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.args = []
+
+        def handler(lines):
+            def handle(args):
+                self.args.append(args)
+                return lines
+            return handle
+        self.server.handlers['find'] = handler(song_lines(100))
+        self.server.handlers['list'] = handler(
+            ['Date: 1989', 'Album: Bleach', 'Date: 1991',
+             'Album: Nevermind', 'Album: Live'])
+        self.server.handlers['count'] = handler(
+            ['Album: Bleach', 'songs: 13', 'playtime: 2567',
+             'Album: Nevermind', 'songs: 12', 'playtime: 2945'])
+
+    def test_find(self):
+        f = ampdclient.Filter.tag('album', 'A "quoted" \\ album')
+        songs = self.run_coro(self.client.find(
+            f, sort='-track', window=(0, 50), compact=True, artist='Me'))
+        self.assertEqual(100, len(songs))
+        self.assertEqual(99, songs[-1].pos)
+        self.assertEqual(
+            [['((album == "A \\"quoted\\" \\\\ album") AND '
+              '(artist == "Me"))', 'sort', '-track', 'window', '0:50']],
+            self.args)
+
+    def test_iter_find(self):
+        @asyncio.coroutine
+        def first(count):
+            it = self.client.iter_find('(any contains "x")')
+            songs = []
+            for _ in range(count):
+                songs.append((yield from it.next()))
+            it.close()
+            return songs
+        songs = self.run_coro(first(3))
+        self.assertEqual(['Artist 0/Album 0/00 - Some Title.flac',
+                          'Artist 1/Album 1/01 - Some Title.flac',
+                          'Artist 2/Album 2/02 - Some Title.flac'],
+                         [uri for uri, _ in songs])
+        self.assertEqual([['(any contains "x")']], self.args)
+
+    def test_list(self):
+        self.assertEqual(
+            [('1989', 'Bleach'), ('1991', 'Nevermind'), ('1991', 'Live')],
+            self.run_coro(self.client.list('album', group='date',
+                                           artist='Nirvana')))
+        self.assertEqual(['album', '(artist == "Nirvana")', 'group', 'date'],
+                         self.args[0])
+
+        @asyncio.coroutine
+        def read():
+            it = self.client.iter_list('album')
+            values = []
+            while True:
+                value = yield from it.next()
+                if value is None:
+                    return values
+                values.append(value)
+        self.server.handlers['list'] = lambda args: [
+            'Album: Bleach', 'Album: Nevermind']
+        self.assertEqual(['Bleach', 'Nevermind'], self.run_coro(read()))
+
+    def test_count(self):
+        self.assertEqual(
+            [('Bleach', 13, 2567), ('Nevermind', 12, 2945)],
+            self.run_coro(self.client.count(group='album')))
+        self.server.handlers['count'] = lambda args: [
+            'songs: 25', 'playtime: 5512']
+        self.assertEqual((25, 5512),
+                         self.run_coro(self.client.count(artist='Nirvana')))
+
+
+class TestWalk(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server.handlers['lsinfo'] = self.lsinfo
+
+    def lsinfo(self, args):
+        # Directories have 3 sub-directories and 2 songs, up to 3 levels
+        path = args[0]
+        if path.endswith('missing'):
+            raise FakeMpdError(50, 'No such directory')
+        prefix = path + '/' if path else ''
+        lines = []
+        if path.count('/') < 2:
+            for i in range(3):
+                lines.append('directory: {}d{}'.format(prefix, i))
+        for i in range(2):
+            lines.extend(['file: {}{}.flac'.format(prefix, i), 'Time: 1'])
+        return lines
+
+    def walk(self, walker, prune=None):
+        @asyncio.coroutine
+        def read():
+            res = []
+            while True:
+                item = yield from walker.next()
+                if item is None:
+                    return res
+                res.append(item)
+                if prune is not None:
+                    item[1][:] = [d for d in item[1] if d.path != prune]
+        return self.run_coro(read())
+
+    def test_walk(self):
+        res = self.walk(self.client.walk(concurrency=4))
+        self.assertEqual(1 + 3 + 9 + 27, len(res))
+        self.assertEqual(['', 'd0', 'd1', 'd2', 'd0/d0'],
+                         [path for path, _, _, _ in res[:5]])
+        path, dirs, files, playlists = res[1]
+        self.assertEqual(['d0/d0', 'd0/d1', 'd0/d2'], [d[0] for d in dirs])
+        self.assertEqual(['d0/0.flac', 'd0/1.flac'], [f[0] for f in files])
+        self.assertEqual([], playlists)
+        # Commands are pipelined, without a noidle for each directory
+        self.assertLess(self.server.log.count('noidle'), 20)
+
+    def test_prune(self):
+        res = self.walk(self.client.walk('d1/d0', compact=True),
+                        prune='d1/d0/d2')
+        self.assertEqual(['d1/d0', 'd1/d0/d0', 'd1/d0/d1'],
+                         [r[0] for r in res])
+        self.assertEqual('d1/d0/d0/0.flac', res[1][2][0].uri)
+
+    def test_error(self):
+        with self.assertRaises(MpdCommandException):
+            self.walk(self.client.walk('missing'))
+        errors = []
+        res = self.walk(self.client.walk(
+            'missing', onerror=lambda path, e: errors.append(path)))
+        self.assertEqual([], res)
+        self.assertEqual(['missing'], errors)
+
+
+class TestBulk(ClientTestCase):
+
+    def uris(self):
+        return [uri for _, uri in self.server.queue]
+
+    def test_addid_many(self):
+        uris = ['{}.mp3'.format(i) for i in range(2500)]
+        self.server.missing = {'10.mp3', '1500.mp3'}
+        ids = self.run_coro(self.client.addid_many(uris))
+        self.assertEqual(2500, len(ids))
+        self.assertIsInstance(ids[10], MpdCommandException)
+        self.assertEqual('50', ids[1500].error)
+        self.assertEqual(1, ids[0])
+        self.assertEqual(11, ids[11])
+        self.assertEqual([uri for uri in uris
+                          if uri not in self.server.missing], self.uris())
+        # Chunks of 1000 commands, the remaining commands of a chunk are
+        # sent again after an error.
+        self.assertEqual(4, self.sent().count('command_list_ok_begin'))
+
+    def test_quoting(self):
+        self.run_coro(self.client.add_many(['a "b".mp3', 'c\\d.mp3']))
+        self.run_coro(self.client.add('e "f".mp3'))
+        self.assertEqual(4, self.run_coro(self.client.addid('g\\h.mp3')))
+        self.assertEqual(['a "b".mp3', 'c\\d.mp3', 'e "f".mp3', 'g\\h.mp3'],
+                         self.uris())
+
+    def test_delete_and_move(self):
+        self.run_coro(self.client.add_many('abcdefgh'))
+        res = self.run_coro(self.client.deleteid_many([2, 42, 4]))
+        self.assertEqual(True, res[0])
+        self.assertIsInstance(res[1], MpdCommandException)
+        self.assertEqual(list('acefgh'), self.uris())
+        self.run_coro(self.client.delete_range_many([(4, None), 0]))
+        self.assertEqual(list('cef'), self.uris())
+        self.run_coro(self.client.move_many([(0, 2), ((1, 3), 0)]))
+        self.assertEqual(list('fce'), self.uris())
+
+    def test_empty(self):
+        self.assertEqual([], self.run_coro(self.client.addid_many([])))
+        self.assertEqual([], self.sent())
+
+    def test_sync_queue(self):
+        self.run_coro(self.client.add_many(list('abcdef')))
+        # Playing 'c'
+        self.server.current = 3
+        ids = self.run_coro(self.client.sync_queue(list('xcbafz')))
+        self.assertEqual(list('xcbafz'), self.uris())
+        self.assertEqual([track_id for track_id, _ in self.server.queue],
+                         ids)
+        self.assertEqual(3, self.server.current)
+        # Only 'd' and 'e' are deleted
+        self.assertEqual([1, 2, 3, 6], sorted(ids)[:4])
+
+        # Not in the target: kept first
+        self.run_coro(self.client.sync_queue(['y', 'x']))
+        self.assertEqual(list('cyx'), self.uris())
+        self.assertEqual(3, self.server.current)
+
+        self.server.current = None
+        self.run_coro(self.client.sync_queue([]))
+        self.assertEqual([], self.uris())
+
+    def test_sync_queue_error(self):
+        self.run_coro(self.client.add_many(list('abc')))
+        self.server.missing = {'y'}
+        with self.assertRaises(MpdCommandException):
+            self.run_coro(self.client.sync_queue(list('axyc')))
+        self.assertEqual(list('axc'), self.uris())
+
+
+class TestMetrics(ClientTestCase):
+
+    def test_metrics(self):
+        metrics = MetricsCollector()
+        self.client.instrumentation = metrics
+        self.server.set_response('playlistinfo', song_lines(100))
+        self.run_coro(asyncio.gather(
+            self.client.command('ping'), self.client.playlistinfo(),
+            self.client.command_list(['ping', 'ping']), loop=self.loop))
+        snapshot = metrics.snapshot()
+        self.assertEqual({'ping', 'playlistinfo', 'command_list'},
+                         set(snapshot['commands']))
+        playlistinfo = snapshot['commands']['playlistinfo']
+        self.assertEqual(1, playlistinfo['round_trip']['count'])
+        self.assertEqual(1100, playlistinfo['lines']['sum'])
+        self.assertEqual(len(b''.join(
+            line.encode() + b'\n' for line in song_lines(100))) + 3,
+            playlistinfo['bytes']['sum'])
+        self.assertEqual(1, snapshot['noidle']['count'])
+
+
+class TestChanges(ClientTestCase):
+
+    def test_subscribe(self):
+        subscription = self.client.subscribe(['player', 'mixer'])
+
+        @asyncio.coroutine
+        def wait():
+            # Let the client go idle
+            yield from self.client.command('ping')
+            self.server.notify('player', 'database')
+            return (yield from subscription.get())
+        self.assertEqual({'player'}, self.run_coro(wait()))
+
+    def test_status_cache(self):
+        self.run_coro(self.client.status())
+        self.run_coro(self.client.status())
+        self.assertEqual(1, self.sent().count('status'))
+        self.server.notify('mixer')
+        self.run_coro(asyncio.sleep(0.05, loop=self.loop))
+        self.run_coro(self.client.status())
+        self.assertEqual(2, self.sent().count('status'))
+
+
+class TestSharing(ClientTestCase):
+
+    def start(self, *cmds):
+        tasks = [asyncio.async(self.client.command(cmd), loop=self.loop)
+                 for cmd in cmds]
+        # Let the tasks queue their commands
+        self.run_coro(asyncio.sleep(0.02, loop=self.loop))
+        return tasks
+
+    def test_shared(self):
+        self.server.pause()
+        tasks = self.start(*['stats'] * 5)
+        self.server.resume()
+        results = self.run_coro(asyncio.gather(*tasks, loop=self.loop))
+        self.assertTrue(all(res is results[0] for res in results))
+        self.assertEqual(1, self.sent().count('stats'))
+        self.assertEqual({}, self.client._in_flight)
+
+    def test_cancel(self):
+        self.server.pause()
+        tasks = self.start(*['stats'] * 3)
+        tasks[0].cancel()
+        self.run_coro(asyncio.sleep(0, loop=self.loop))
+        self.server.resume()
+        results = self.run_coro(asyncio.gather(*tasks[1:], loop=self.loop))
+        self.assertTrue(tasks[0].cancelled())
+        self.assertIn('songs: 10000', results[0])
+        self.assertIs(results[0], results[1])
+        self.assertEqual(1, self.sent().count('stats'))
+        self.assertEqual(0, self.client.counters['discarded'])
+
+    def test_write(self):
+        self.server.pause()
+        # The second stats may see the changes of addid: not shared
+        tasks = self.start('stats', 'addid "a.mp3"', 'stats')
+        self.server.resume()
+        self.run_coro(asyncio.gather(*tasks, loop=self.loop))
+        self.assertEqual(['stats', 'addid "a.mp3"', 'stats'], self.sent())
+        self.assertEqual({}, self.client._in_flight)
+
+
+class TestDeadlines(ClientTestCase):
+
+    def test_timeout(self):
+        # Stalled server: the command is sent but its response is late
+        self.server.pause()
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_coro(self.client.command('addid "a.mp3"', timeout=0.05))
+        self.assertEqual(1, self.client.counters['timeouts'])
+        self.server.resume()
+        # The late response of addid is discarded, not returned to the next
+        # caller
+        status = self.run_coro(self.client.command('status'))
+        self.assertIn('playlistlength: 1', status)
+        self.assertEqual(['addid "a.mp3"', 'status'], self.sent())
+        self.assertEqual(1, self.client.counters['discarded'])
+
+    def test_expired(self):
+        self.server.pause()
+        f_add = asyncio.async(self.client.command('addid "a.mp3"'),
+                              loop=self.loop)
+        self.run_coro(asyncio.sleep(0.02, loop=self.loop))
+        # Queued behind addid, its deadline passes before it is sent
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_coro(self.client.command('stats', timeout=0.05))
+        self.server.resume()
+        self.assertEqual(['Id: 1'], self.run_coro(f_add))
+        self.assertEqual([], self.run_coro(self.client.command('ping')))
+        self.assertEqual(['addid "a.mp3"', 'ping'], self.sent())
+        self.assertEqual(1, self.client.counters['timeouts'])
+        self.assertEqual(1, self.client.counters['expired'])
+        self.assertEqual(0, self.client.counters['discarded'])
+
+    def test_default_timeout(self):
+        self.client.timeout = 0.05
+        self.server.pause()
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_coro(self.client.command('stats'))
+        self.server.resume()
+
+
+class TestReconnect(ClientTestCase):
+
+    def test_reconnect(self):
+        self.client.reconnect_delay = 0.01
+        subscription = self.client.subscribe()
+        self.run_coro(self.client.command('ping'))
+        self.run_coro(self.server.stop())
+        self.run_coro(self.server.start())
+
+        @asyncio.coroutine
+        def wait():
+            changes = yield from subscription.get()
+            stats = yield from self.client.command('stats')
+            return changes, stats
+        changes, stats = self.run_coro(asyncio.wait_for(wait(), 5,
+                                                   loop=self.loop))
+        self.assertEqual({ampdclient.RECONNECT}, changes)
+        self.assertEqual(2, self.client.connections)
+
+    def test_protocol_error(self):
+        self.client.reconnect_delay = 0.01
+        # Not UTF-8: the response can not be decoded
+        self.server.handlers['lsinfo'] = lambda args: b'file: \xff\n'
+        with self.assertRaises(UnicodeDecodeError):
+            self.run_coro(self.client.lsinfo(''))
+        # The connection is re-opened, the failing command is not sent again
+        self.assertEqual([], self.run_coro(asyncio.wait_for(
+            self.client.command('ping'), 5, loop=self.loop)))
+        self.assertEqual(2, self.client.connections)
+        self.assertEqual(1, self.sent().count('lsinfo ""'))
+
+        self.client.reconnect = False
+        with self.assertRaises(UnicodeDecodeError):
+            self.run_coro(self.client.lsinfo(''))
+        self.run_coro(asyncio.wait_for(self.client.f_stopped, 5,
+                                       loop=self.loop))
+        with self.assertRaises(MpdConnectionError):
+            self.run_coro(self.client.command('ping'))
+
+    def test_closed_before_welcome(self):
+        # Like mpd with too many clients: connections are accepted, then
+        # closed at once
+        accepted = []
+
+        def refuse(reader, writer):
+            accepted.append(writer)
+            writer.close()
+        server = self.run_coro(asyncio.start_server(
+            refuse, '127.0.0.1', 0, loop=self.loop))
+        port = server.sockets[0].getsockname()[1]
+        client = self.run_coro(ampdclient.connect('127.0.0.1', port,
+                                                  loop=self.loop))
+        # The first wait may have started with the default delay
+        client.reconnect_delay = client._delay = 0.02
+        client.reconnect_max_delay = 0.1
+        self.run_coro(asyncio.sleep(1, loop=self.loop))
+        # Attempts are throttled by the backoff
+        self.assertLess(len(accepted), 15)
+        self.assertEqual(0.1, client._delay)
+        self.run_coro(client.close())
+        server.close()
+        self.run_coro(server.wait_closed())
+
+    def test_no_reconnect(self):
+        self.client.reconnect = False
+        self.run_coro(self.server.stop())
+        self.run_coro(asyncio.wait_for(self.client.f_stopped, 5,
+                                       loop=self.loop))
+        with self.assertRaises(MpdConnectionError):
+            self.run_coro(self.client.command('ping'))
+
+
+class TestPassword(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.password = 'secret'
+        self.server.handlers['password'] = self.check_password
+
+    def check_password(self, args):
+        if args[0] != self.password:
+            raise FakeMpdError(3, 'incorrect password')
+        return []
+
+    def connect(self, password):
+        return self.run_coro(ampdclient.connect(
+            password + '@127.0.0.1', self.server.port, loop=self.loop))
+
+    def test_password(self):
+        client = self.connect('secret')
+        self.assertEqual([], self.run_coro(client.command('ping')))
+        self.assertIn('password "secret"', self.server.log)
+        self.run_coro(client.close())
+
+    def test_refused(self):
+        with self.assertRaises(MpdCommandException) as cm:
+            self.connect('wrong')
+        self.assertEqual('incorrect password', cm.exception.msg)
+
+    def test_refused_on_reconnect(self):
+        client = self.connect('secret')
+        client.reconnect_delay = 0.01
+        self.password = 'changed'
+        self.run_coro(self.server.stop())
+        f_stats = asyncio.async(client.command('stats'), loop=self.loop)
+        self.run_coro(self.server.start())
+        with self.assertRaises(MpdCommandException):
+            self.run_coro(asyncio.wait_for(f_stats, 5, loop=self.loop))
+        # Not re-opened again
+        self.assertTrue(client.f_stopped.done())
+        self.assertEqual(2, client.connections)
+        with self.assertRaises(MpdConnectionError):
+            self.run_coro(client.command('ping'))
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+
+from ampdclient.events import EventBus
+
+
+class TestEventBus(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_coalesce(self):
+
+        @asyncio.coroutine
+        def run():
+            bus = EventBus(loop=self.loop)
+            sub = bus.subscribe(['player', 'mixer'])
+            bus.publish({'player'})
+            bus.publish({'player', 'database'})
+            bus.publish({'mixer'})
+            changes = yield from sub.get()
+            return changes
+
+        changes = self.loop.run_until_complete(run())
+        self.assertEqual({'player', 'mixer'}, changes)
+
+    def test_callback(self):
+        received = []
+
+        @asyncio.coroutine
+        def run():
+            bus = EventBus(loop=self.loop)
+            sub = bus.subscribe(None, received.append)
+            bus.publish({'playlist'})
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            bus.publish({'database'})
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            sub.close()
+            bus.publish({'mixer'})
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([{'playlist'}, {'database'}], received)
+
+    def test_close(self):
+
+        @asyncio.coroutine
+        def run():
+            bus = EventBus(loop=self.loop)
+            sub = bus.subscribe(['player'])
+            self.loop.call_soon(sub.close)
+            changes = yield from sub.get()
+            return changes
+
+        self.assertIsNone(self.loop.run_until_complete(run()))
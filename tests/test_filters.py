@@ -0,0 +1,36 @@
+import unittest
+
+from ampdclient.filters import Filter, build_filter
+
+
+class TestFilter(unittest.TestCase):
+
+    def test_tag(self):
+        self.assertEqual('(artist == "Nirvana")',
+                         str(Filter.tag('artist', 'Nirvana')))
+        self.assertEqual('(title contains "love")',
+                         str(Filter.tag('title', 'love', 'contains')))
+        with self.assertRaises(ValueError):
+            Filter.tag('artist', 'Nirvana', '<')
+
+    def test_escape(self):
+        self.assertEqual(r'(album == "The \"Best\" of C:\\")',
+                         str(Filter.tag('album', 'The "Best" of C:\\')))
+
+    def test_combine(self):
+        f = Filter.tag('artist', 'Nirvana') & ~Filter.tag('album', 'Bleach')
+        self.assertEqual(
+            '((artist == "Nirvana") AND (!(album == "Bleach")))', str(f))
+        self.assertEqual('((album == "Nevermind") AND (date == "1991"))',
+                         str(Filter.tags(date=1991, album='Nevermind')))
+        self.assertEqual('(base "Nirvana/Nevermind")',
+                         str(Filter.base('Nirvana/Nevermind')))
+
+    def test_build_filter(self):
+        self.assertIsNone(build_filter())
+        self.assertEqual(Filter('(any contains "x")'),
+                         build_filter('(any contains "x")'))
+        self.assertEqual(
+            '((modified-since "1500000000") AND (genre == "Rock"))',
+            str(build_filter(Filter.modified_since(1500000000),
+                             {'genre': 'Rock'})))
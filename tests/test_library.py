@@ -0,0 +1,132 @@
+import asyncio
+
+from ampdclient.library import LibraryIndex
+
+from fake_mpd import FakeMpdError
+from test_client import ClientTestCase
+
+
+OLDER = '2014-03-01T08:00:00Z'
+OLD = '2015-06-11T16:25:16Z'
+NEW = '2016-01-02T10:00:00Z'
+
+
+class TestLibraryIndex(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # uri -> (artist, Last-Modified)
+        self.songs = {
+            'A/One/1.flac': ('A', OLD),
+            'A/One/2.flac': ('A', OLDER),
+            'A/Two/1.flac': ('A', OLDER),
+            'B/Three/1.flac': ('B', OLDER),
+        }
+        self.server.handlers.update({
+            'listallinfo': self.listallinfo,
+            'listall': self.listall,
+            'find': self.find,
+            'lsinfo': self.lsinfo,
+        })
+        self.library = LibraryIndex(self.client)
+        self.run_coro(self.library.load())
+
+    def tearDown(self):
+        self.library.stop()
+        super().tearDown()
+
+    def song(self, uri):
+        artist, modified = self.songs[uri]
+        return ['file: ' + uri, 'Last-Modified: ' + modified,
+                'Artist: ' + artist, 'Album: ' + uri.split('/')[1]]
+
+    def directories(self):
+        dirs = set()
+        for uri in self.songs:
+            parts = uri.split('/')[:-1]
+            for i in range(1, len(parts) + 1):
+                dirs.add('/'.join(parts[:i]))
+        return sorted(dirs)
+
+    def listallinfo(self, args):
+        lines = ['directory: ' + d for d in self.directories()]
+        for uri in sorted(self.songs):
+            lines.extend(self.song(uri))
+        return lines
+
+    def listall(self, args):
+        return ['directory: ' + d for d in self.directories()] + \
+            ['file: ' + uri for uri in sorted(self.songs)]
+
+    def find(self, args):
+        # find '(modified-since "...")', songs modified during the given
+        # second are included, like mpd does
+        since = args[0].split('"')[1]
+        lines = []
+        for uri in sorted(self.songs):
+            if self.songs[uri][1] >= since:
+                lines.extend(self.song(uri))
+        return lines
+
+    def lsinfo(self, args):
+        if args[0] not in self.songs:
+            raise FakeMpdError(50, 'Not found')
+        return self.song(args[0])
+
+    def test_load(self):
+        self.assertEqual(4, len(self.library))
+        self.assertIn('A/One/2.flac', self.library)
+        self.assertEqual(['A', 'B'], self.library.values('artist'))
+        self.assertEqual(['A/One/1.flac', 'A/One/2.flac', 'A/Two/1.flac'],
+                         [s.uri for s in self.library.find('artist', 'A')])
+        self.assertEqual(['A/One/1.flac', 'A/One/2.flac'],
+                         [s.uri for s in self.library.directory('A/One')])
+        self.assertEqual(['A', 'A/One', 'A/Two', 'B', 'B/Three'],
+                         sorted(self.library.directories))
+
+    def test_refresh(self):
+        # Modified
+        self.songs['A/Two/1.flac'] = ('C', NEW)
+        # Removed
+        del self.songs['B/Three/1.flac']
+        # Moved, without changing its modification time
+        del self.songs['A/One/2.flac']
+        self.songs['D/One/2.flac'] = ('D', OLDER)
+        del self.server.log[:]
+
+        # The most recent song of the index is found again by find
+        self.assertEqual((3, 2), self.run_coro(self.library.refresh()))
+        self.assertEqual(['A/One/1.flac', 'A/Two/1.flac', 'D/One/2.flac'],
+                         sorted(self.library.songs))
+        self.assertEqual(['A', 'C', 'D'], self.library.values('artist'))
+        self.assertEqual([], self.library.directory('B/Three'))
+        self.assertEqual(['A', 'A/One', 'A/Two', 'D', 'D/One'],
+                         sorted(self.library.directories))
+        self.assertIn(r'find "(modified-since \"{}\")"'.format(OLD),
+                      self.server.log)
+        # Only the moved song is fetched with lsinfo
+        self.assertEqual(['lsinfo "D/One/2.flac"'],
+                         [cmd for cmd in self.server.log
+                          if cmd.startswith('lsinfo')])
+
+    def test_refresh_removed_since_listall(self):
+        self.songs['D/1.flac'] = ('D', OLDER)
+        # Removed between listall and lsinfo
+        self.server.handlers['lsinfo'] = lambda args: \
+            self.lsinfo(['missing'])
+        self.assertEqual((1, 0), self.run_coro(self.library.refresh()))
+        self.assertNotIn('D/1.flac', self.library)
+
+    def test_change(self):
+        self.run_coro(self.library.start())
+        self.songs['E/1.flac'] = ('E', OLDER)
+        self.server.notify('database')
+
+        @asyncio.coroutine
+        def wait():
+            for _ in range(100):
+                if 'E/1.flac' in self.library:
+                    return
+                yield from asyncio.sleep(0.01, loop=self.loop)
+        self.run_coro(wait())
+        self.assertIn('E/1.flac', self.library)
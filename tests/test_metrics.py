@@ -0,0 +1,51 @@
+import unittest
+
+from ampdclient.metrics import Histogram, MetricsCollector
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram()
+        for i in range(1, 1001):
+            h.add(i / 1000)
+        self.assertEqual(1000, h.count)
+        self.assertAlmostEqual(500.5, h.total)
+        self.assertEqual(0.001, h.min)
+        self.assertEqual(1, h.max)
+        # Upper bounds, within 12.5%
+        for p in (50, 90, 99):
+            value = h.percentile(p)
+            self.assertGreaterEqual(value, p / 100)
+            self.assertLessEqual(value, p / 100 * 1.125)
+        self.assertEqual(1, h.percentile(100))
+
+    def test_empty_and_zero(self):
+        h = Histogram()
+        self.assertIsNone(h.percentile(50))
+        self.assertIsNone(h.snapshot()['mean'])
+        h.add(0)
+        h.add(0)
+        h.add(8)
+        self.assertEqual(0, h.percentile(50))
+        self.assertEqual(8, h.percentile(99))
+
+
+class TestMetricsCollector(unittest.TestCase):
+
+    def test_snapshot(self):
+        metrics = MetricsCollector()
+        metrics.request_sent('status', 0.001)
+        metrics.response_read('status', 0.002, 120, 8, 0.0001)
+        metrics.response_read('status', 0.004, 120, 8, 0.0001)
+        metrics.noidle(0.0005)
+        metrics.event('timeouts')
+        snapshot = metrics.snapshot()
+        status = snapshot['commands']['status']
+        self.assertEqual(1, status['queue_wait']['count'])
+        self.assertEqual(2, status['round_trip']['count'])
+        self.assertEqual(240, status['bytes']['sum'])
+        self.assertEqual(1, snapshot['noidle']['count'])
+        self.assertEqual({'timeouts': 1}, snapshot['events'])
+        metrics.reset()
+        self.assertEqual({}, metrics.snapshot()['commands'])
@@ -0,0 +1,84 @@
+import asyncio
+
+from ampdclient.mirror import QueueMirror
+
+from test_client import ClientTestCase
+
+
+class TestQueueMirror(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.run_coro(self.client.add_many(
+            ['{}.mp3'.format(i) for i in range(6)]))
+        self.mirror = QueueMirror(self.client)
+        self.run_coro(self.mirror.refresh())
+
+    def tearDown(self):
+        self.mirror.stop()
+        super().tearDown()
+
+    def check(self):
+        self.assertEqual(self.server.queue,
+                         [(song.id, song.uri) for song in self.mirror])
+        self.assertEqual(list(range(len(self.mirror))),
+                         [song.pos for song in self.mirror])
+        for track_id, _ in self.server.queue:
+            self.assertEqual(track_id, self.mirror.get_by_id(track_id).id)
+        self.assertEqual(self.server.playlist_version, self.mirror.version)
+
+    def sent_named(self, name):
+        return [cmd for cmd in self.sent() if cmd.startswith(name)]
+
+    def test_load(self):
+        self.check()
+        self.assertFalse(self.run_coro(self.mirror.refresh()))
+
+    def test_deltas(self):
+        moved = self.mirror.get_by_id(6)
+        self.run_coro(self.client.deleteid(2))
+        self.run_coro(self.client.moveid(6, 0))
+        self.run_coro(self.client.command('addid "new.mp3" 3'))
+        self.run_coro(self.client.delete_pos(5))
+        self.assertTrue(self.run_coro(self.mirror.refresh()))
+        self.check()
+        self.assertIsNone(self.mirror.get_by_id(2))
+        # Moved tracks are re-used, only the new track is fetched
+        self.assertIs(moved, self.mirror.get_by_id(6))
+        self.assertEqual(['playlistid 7'], self.sent_named('playlistid'))
+        self.assertEqual(1, len(self.sent_named('playlistinfo')))
+
+        # Tracks removed at the end only change the length
+        self.run_coro(self.client.delete_range(2))
+        self.assertTrue(self.run_coro(self.mirror.refresh()))
+        self.check()
+        self.assertEqual(2, len(self.mirror))
+
+    def test_new_track_removed(self):
+        handler = self.server.handlers['plchangesposid']
+
+        def plchangesposid(args):
+            lines = handler(args)
+            # Another client removes the new track before its info is
+            # fetched
+            del self.server.queue[-1]
+            self.server._changed()
+            return lines
+        self.server.handlers['plchangesposid'] = plchangesposid
+        self.run_coro(self.client.add('new.mp3'))
+        self.assertTrue(self.run_coro(self.mirror.refresh()))
+        self.assertEqual(['playlistid 7'], self.sent_named('playlistid'))
+        # Loaded again
+        self.assertEqual(2, len(self.sent_named('playlistinfo')))
+        self.check()
+
+    def test_follow(self):
+        self.run_coro(self.mirror.start())
+        self.run_coro(self.client.add('new.mp3'))
+
+        @asyncio.coroutine
+        def wait():
+            while len(self.mirror) != 7:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+        self.run_coro(wait())
+        self.check()
@@ -1,3 +1,4 @@
+import os
 import unittest
 import ampdclient.client as c
 
@@ -227,4 +228,135 @@ class TestPlaylistParsing(unittest.TestCase):
         tracks = c.parse_playlist(lines)
 
         self.assertEqual(5, len(tracks))
-        self.assertEqual('France Inter', tracks[0][1]['Name'])
\ No newline at end of file
+        self.assertEqual('France Inter', tracks[0][1]['Name'])
+
+
+class TestCommandListParsing(unittest.TestCase):
+
+    def test_split_command_list(self):
+
+        lines = ['Id: 12', 'list_OK', 'Id: 13', 'list_OK', 'list_OK']
+        results, ack = c._split_command_list(lines)
+
+        self.assertIsNone(ack)
+        self.assertEqual([['Id: 12'], ['Id: 13'], []], results)
+
+    def test_split_command_list_error(self):
+
+        lines = ['Id: 12', 'list_OK',
+                 'ACK [50@1] {addid} No such directory']
+        results, ack = c._split_command_list(lines)
+
+        self.assertEqual([['Id: 12']], results)
+        self.assertEqual('ACK [50@1] {addid} No such directory', ack)
+
+    def test_parse_ack(self):
+
+        e = c._parse_ack('ACK [50@1] {addid} No such directory')
+
+        self.assertEqual('50', e.error)
+        self.assertEqual(1, e.line)
+        self.assertEqual('addid', e.command)
+        self.assertEqual('No such directory', e.msg)
+
+
+class TestResponseEnd(unittest.TestCase):
+
+    def test_ok(self):
+
+        buf = b'volume: 50\nstate: play\nOK\nchanged: player\n'
+        self.assertEqual((23, 25), c._find_response_end(buf))
+        self.assertEqual(['volume: 50', 'state: play'],
+                         c._decode_lines(bytearray(buf), 23))
+
+    def test_empty_response(self):
+
+        self.assertEqual((0, 2), c._find_response_end(b'OK\n'))
+        self.assertEqual([], c._decode_lines(bytearray(b'OK\n'), 0))
+
+    def test_ack(self):
+
+        buf = b'Id: 12\nlist_OK\nACK [50@1] {addid} No such file\n'
+        self.assertEqual((15, 46), c._find_response_end(buf))
+
+    def test_incomplete(self):
+
+        self.assertIsNone(c._find_response_end(b'volume: 50\nO'))
+        self.assertIsNone(c._find_response_end(b'volume: 50\nOK'))
+        self.assertIsNone(c._find_response_end(b'ACK [5@0] {foo} unkn', 17))
+        self.assertIsNone(c._find_response_end(b'file: a\nlist_OK\n'))
+
+
+class TestRecordParser(unittest.TestCase):
+
+    lines = ['directory: nas-samba/Albums',
+             'Last-Modified: 2015-06-17T10:46:05Z',
+             'file: nas-samba/track.mp3',
+             'Time: 288',
+             'Title: Some title: with a colon',
+             'playlist: nas-samba/pl.m3u',
+             'Last-Modified: 2015-09-02T16:32:30Z']
+
+    def test_incremental(self):
+
+        parser = c._RecordParser(c.LSINFO_KEYS, c._make_triple)
+        records = []
+        for line in self.lines:
+            records.extend(parser.feed([line]))
+        self.assertEqual(2, len(records))
+        records.extend(parser.close())
+
+        dirs, files, playlists = c.parse_lsinfo(self.lines)
+        self.assertEqual([('directory',) + d for d in dirs] +
+                         [('file',) + f for f in files] +
+                         [('playlist',) + p for p in playlists],
+                         records)
+
+    def test_empty(self):
+
+        parser = c._RecordParser(c.LSINFO_KEYS, c._make_triple)
+        self.assertEqual([], parser.feed([]))
+        self.assertEqual([], parser.close())
+
+
+class TestPosIdParsing(unittest.TestCase):
+
+    def test_parse_posid(self):
+
+        lines = ['cpos: 3', 'Id: 1025', 'cpos: 4', 'Id: 1019']
+        self.assertEqual([(3, 1025), (4, 1019)], c.parse_posid(lines))
+        self.assertEqual([], c.parse_posid([]))
+
+
+class TestHostParsing(unittest.TestCase):
+
+    def setUp(self):
+        self.env = {k: os.environ.pop(k) for k in ('MPD_HOST', 'MPD_PORT')
+                    if k in os.environ}
+
+    def tearDown(self):
+        os.environ.pop('MPD_HOST', None)
+        os.environ.pop('MPD_PORT', None)
+        os.environ.update(self.env)
+
+    def test_defaults(self):
+        self.assertEqual(('localhost', 6600, None), c.parse_host())
+
+    def test_environment(self):
+        os.environ['MPD_HOST'] = 'secret@music'
+        os.environ['MPD_PORT'] = '6601'
+        self.assertEqual(('music', 6601, 'secret'), c.parse_host())
+        self.assertEqual(('other', 6602, None),
+                         c.parse_host('other', 6602))
+
+    def test_unix_socket(self):
+        self.assertEqual(('/run/mpd/socket', None, None),
+                         c.parse_host('/run/mpd/socket', 6600))
+        self.assertEqual(('/run/mpd/socket', None, 'pw'),
+                         c.parse_host('pw@/run/mpd/socket'))
+        self.assertEqual(('@mpd', None, None), c.parse_host('@mpd'))
+        self.assertEqual(('@mpd', None, 'pw'), c.parse_host('pw@@mpd'))
+
+    def test_quote(self):
+        self.assertEqual('"a b"', c._quote('a b'))
+        self.assertEqual(r'"say \"hi\" \\o/"', c._quote(r'say "hi" \o/'))
@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+
+import ampdclient
+from ampdclient.cache import ResponseCache
+from ampdclient.client import MpdConnectionError
+from ampdclient.pool import MpdClientPool
+
+from fake_mpd import FakeMpd
+from test_client import ClientTestCase
+
+
+class TestPool(ClientTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pool = self.client
+
+    def open_client(self):
+        return ampdclient.connect_pool(
+            '127.0.0.1', self.server.port, size=2, loop=self.loop)
+
+    def test_connect_pool(self):
+        # The idle connection and two command connections
+        self.assertEqual(3, len(self.server._connections))
+        self.assertEqual(['Id: 1'], self.run_coro(
+            self.pool.command('addid "a.mp3"')))
+        self.assertEqual([(1, 'a.mp3')], self.server.queue)
+
+    def count_sent(self, cmd):
+        return self.server.log.count(cmd)
+
+    def test_no_noidle(self):
+        self.run_coro(asyncio.gather(
+            self.pool.command('ping'), self.pool.command('stats'),
+            self.pool.command('status'), loop=self.loop))
+        self.run_coro(self.pool.command('ping'))
+        # Only the idle connection goes idle
+        self.assertEqual(1, self.count_sent('idle'))
+        self.assertEqual(0, self.count_sent('noidle'))
+
+    def test_status_invalidation(self):
+        # Each command connection keeps its status
+        client = self.pool._clients[0]
+        self.run_coro(client.status())
+        self.run_coro(client.status())
+        self.assertEqual(1, self.count_sent('status'))
+        # Received by the idle connection, passed to the command connections
+        self.server.notify('mixer')
+        self.run_coro(asyncio.sleep(0.05, loop=self.loop))
+        self.run_coro(client.status())
+        self.assertEqual(2, self.count_sent('status'))
+
+    def test_options(self):
+        cache = ResponseCache()
+        pool = self.run_coro(ampdclient.connect_pool(
+            '127.0.0.1', self.server.port, size=2, loop=self.loop,
+            timeout=3, cache=cache, reconnect_delay=0.1))
+        try:
+            self.check_options(pool, cache)
+        finally:
+            self.run_coro(pool.close())
+
+    def check_options(self, pool, cache):
+        for client in pool._clients:
+            self.assertIs(cache, client.cache)
+            self.assertEqual(3, client.timeout)
+            self.assertEqual(0.1, client.reconnect_delay)
+        self.server.handlers['lsinfo'] = lambda args: ['directory: a']
+        self.run_coro(pool.lsinfo(''))
+        self.run_coro(pool.lsinfo(''))
+        self.assertEqual(1, self.count_sent('lsinfo ""'))
+        self.server.notify('database')
+        self.run_coro(asyncio.sleep(0.05, loop=self.loop))
+        self.run_coro(pool.lsinfo(''))
+        self.assertEqual(2, self.count_sent('lsinfo ""'))
+
+    def test_keepalive(self):
+        pool = MpdClientPool('127.0.0.1', self.server.port, size=1,
+                             loop=self.loop, keepalive=0.05)
+        self.run_coro(pool.connect())
+        self.run_coro(asyncio.sleep(0.2, loop=self.loop))
+        self.run_coro(pool.close())
+        self.assertGreater(self.count_sent('ping'), 1)
+
+    def test_least_busy(self):
+        first, second = self.pool._clients
+        # Used in turn when equally busy
+        self.assertEqual({first, second},
+                         {self.pool.client(), self.pool.client()})
+        tasks = [asyncio.async(first.command('stats'), loop=self.loop),
+                 asyncio.async(first.command('status'), loop=self.loop)]
+        # Let the tasks queue their commands
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        self.assertEqual(2, first.pending)
+        self.assertIs(second, self.pool.client())
+        self.assertIs(second, self.pool.client())
+        self.run_coro(asyncio.gather(*tasks, loop=self.loop))
+
+    def test_subscribe(self):
+        subscription = self.pool.subscribe(['playlist'])
+        self.run_coro(self.pool.command('addid "a.mp3"'))
+        self.assertEqual({'playlist'}, self.run_coro(subscription.get()))
+
+    def test_reconnect(self):
+        subscription = self.pool.subscribe()
+        for client in [self.pool._idle_client] + self.pool._clients:
+            client.reconnect_delay = 0.01
+        self.run_coro(self.server.stop())
+        # Queued on a connection being re-opened, sent once it is back
+        f_stats = asyncio.async(self.pool.command('stats'), loop=self.loop)
+        self.run_coro(self.server.start())
+        self.assertIn('songs: 10000', self.run_coro(f_stats))
+        self.assertEqual({ampdclient.RECONNECT},
+                         self.run_coro(subscription.get()))
+        self.run_coro(self.pool.command('ping'))
+        self.assertEqual(2, self.pool._idle_client.connections)
+
+    def test_closed(self):
+        self.run_coro(self.pool.close())
+        with self.assertRaises(MpdConnectionError):
+            self.pool.client()
+
+
+class FailingPool(MpdClientPool):
+    """
+    A pool whose third connection can not be opened.
+    """
+
+    opened = 0
+
+    @asyncio.coroutine
+    def _open(self, idle):
+        self.opened += 1
+        if self.opened == 3:
+            raise ConnectionRefusedError()
+        return (yield from super()._open(idle))
+
+
+class TestConnectFailure(unittest.TestCase):
+
+    def test_connect_failure(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        server = FakeMpd(loop=loop)
+        loop.run_until_complete(server.start())
+        pool = FailingPool('127.0.0.1', server.port, size=2, loop=loop)
+        with self.assertRaises(ConnectionRefusedError):
+            loop.run_until_complete(pool.connect())
+        # The connections already opened are closed
+        self.assertTrue(pool._idle_client.f_stopped.done())
+        self.assertTrue(pool._clients[0].f_stopped.done())
+        loop.run_until_complete(asyncio.sleep(0.05, loop=loop))
+        self.assertEqual([], server._connections)
+        loop.run_until_complete(server.stop())
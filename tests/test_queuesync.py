@@ -0,0 +1,130 @@
+import random
+import unittest
+
+from ampdclient.queuesync import lcs, diff_queue
+
+
+def lcs_length(a, b):
+    # Reference implementation, dynamic programming
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            table[i + 1][j + 1] = table[i][j] + 1 if x == y else \
+                max(table[i][j + 1], table[i + 1][j])
+    return table[-1][-1]
+
+
+def apply_edits(queue, edits):
+    """
+    Apply edits to a play queue, as mpd would.
+    :param queue: a list of tuples (id, uri).
+    :return: the new play queue.
+    """
+    queue = list(queue)
+    next_id = max([song_id for song_id, _ in queue] + [0]) + 1
+    for edit in edits:
+        if edit[0] == 'deleteid':
+            queue = [song for song in queue if song[0] != edit[1]]
+        elif edit[0] == 'moveid':
+            song = next(song for song in queue if song[0] == edit[1])
+            queue.remove(song)
+            assert 0 <= edit[2] <= len(queue)
+            queue.insert(edit[2], song)
+        else:
+            assert 0 <= edit[2] <= len(queue)
+            queue.insert(edit[2], (next_id, edit[1]))
+            next_id += 1
+    return queue
+
+
+def make_queue(uris):
+    return [(i + 1, uri) for i, uri in enumerate(uris)]
+
+
+class TestLcs(unittest.TestCase):
+
+    def test_lcs(self):
+        self.assertEqual([(1, 0), (2, 2), (3, 3)],
+                         lcs('abcd', 'bxcd'))
+        self.assertEqual([], lcs('abc', ''))
+        self.assertEqual([], lcs('abc', 'xyz'))
+
+    def test_random(self):
+        rand = random.Random(42)
+        for _ in range(200):
+            a = [rand.choice('abcdef') for _ in range(rand.randint(0, 12))]
+            b = [rand.choice('abcdef') for _ in range(rand.randint(0, 12))]
+            pairs = lcs(a, b)
+            self.assertEqual(lcs_length(a, b), len(pairs))
+            for i, j in pairs:
+                self.assertEqual(a[i], b[j])
+            self.assertEqual(sorted(pairs), pairs)
+            self.assertEqual(len(pairs), len({i for i, _ in pairs}))
+            self.assertEqual(len(pairs), len({j for _, j in pairs}))
+
+
+class TestDiffQueue(unittest.TestCase):
+
+    def check(self, current, target, current_id=None):
+        queue = make_queue(current)
+        edits, ids = diff_queue(queue, target, current_id)
+        result = apply_edits(queue, edits)
+        uris = [uri for _, uri in result]
+        if current_id is not None and current_id not in ids:
+            self.assertEqual(current_id, result[0][0])
+            uris = uris[1:]
+        self.assertEqual(list(target), uris)
+        for song_id, (result_id, _) in zip(ids, result[-len(target):]):
+            if song_id is not None:
+                self.assertEqual(song_id, result_id)
+        return edits
+
+    def test_unchanged(self):
+        self.assertEqual([], self.check('abcdef', 'abcdef'))
+
+    def test_append(self):
+        self.assertEqual([('addid', 'g', 6), ('addid', 'h', 7)],
+                         self.check('abcdef', 'abcdefgh'))
+
+    def test_delete(self):
+        self.assertEqual([('deleteid', 2), ('deleteid', 5)],
+                         self.check('abcdef', 'acdf'))
+
+    def test_move(self):
+        self.assertEqual([('moveid', 6, 1)], self.check('abcdef', 'afbcde'))
+
+    def test_replace(self):
+        edits = self.check('abc', 'xyz')
+        self.assertEqual(6, len(edits))
+
+    def test_current_song(self):
+        # The current song, 'b', is moved rather than deleted
+        edits = self.check('abcb', 'acb', current_id=2)
+        self.assertIn(('deleteid', 4), edits)
+        # Not in the target: kept first
+        self.check('abc', 'xy', current_id=3)
+        self.check('abc', '', current_id=1)
+        self.check('abc', 'bc', current_id=1)
+
+    def test_random(self):
+        rand = random.Random(42)
+        for _ in range(300):
+            current = [rand.choice('abcdefghij')
+                       for _ in range(rand.randint(0, 15))]
+            target = [rand.choice('abcdefghij')
+                      for _ in range(rand.randint(0, 15))]
+            current_id = rand.randint(1, len(current)) \
+                if current and rand.random() < 0.5 else None
+            edits = self.check(current, target, current_id)
+            self.assertNotIn(('deleteid', current_id), edits)
+            # Songs kept in place and moved songs are never re-added
+            adds = sum(1 for edit in edits if edit[0] == 'addid')
+            self.assertLessEqual(adds, len(target) - lcs_length(current,
+                                                                 target))
+
+    def test_large(self):
+        uris = ['song {}'.format(i) for i in range(5000)]
+        target = list(uris)
+        random.Random(42).shuffle(target)
+        edits = self.check(uris, target)
+        self.assertTrue(all(edit[0] == 'moveid' for edit in edits))
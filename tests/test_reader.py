@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+
+from ampdclient.client import MpdClientProtocol, _RecordStream, \
+    PLAYLIST_KEYS, _make_pair
+
+
+class ReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = MpdClientProtocol(loop=self.loop)
+        self.client.reader = asyncio.StreamReader(loop=self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def feed(self, chunks):
+        # Each chunk is received by a separate read
+        @asyncio.coroutine
+        def feeder():
+            for chunk in chunks:
+                yield from asyncio.sleep(0, loop=self.loop)
+                self.client.reader.feed_data(chunk)
+        return asyncio.async(feeder(), loop=self.loop)
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(
+            asyncio.wait_for(coro, 1, loop=self.loop))
+
+
+class TestReadBlock(ReaderTestCase):
+
+    def test_split_ack(self):
+        self.feed([b'Id: 1\nlist_OK\nACK [50@1] {add',
+                   b'id} No such song\nOK\n'])
+        lines, last = self.run_coro(self.client._read_block())
+        self.assertEqual(['Id: 1', 'list_OK'], lines)
+        self.assertEqual('ACK [50@1] {addid} No such song', last)
+        # The following response is kept
+        self.assertEqual(b'OK\n', bytes(self.client._buffer))
+
+    def test_split_ok(self):
+        self.feed([b'volume: 50\nstate: play\nO', b'K', b'\n'])
+        lines, last = self.run_coro(self.client._read_block())
+        self.assertEqual(['volume: 50', 'state: play'], lines)
+        self.assertEqual('OK', last)
+
+
+class TestReadStream(ReaderTestCase):
+
+    def test_split_ack(self):
+        stream = _RecordStream(PLAYLIST_KEYS, _make_pair, self.loop)
+        self.feed([b'file: a.mp3\nPos: 0\nfile: b.mp3\nACK [2@0] {playl',
+                   b'istinfo} Bad song index\n'])
+        self.run_coro(self.client._read_stream(stream))
+        records = []
+        while True:
+            batch = stream.queue.get_nowait()
+            if isinstance(batch, Exception):
+                break
+            records.extend(batch)
+        self.assertEqual([('a.mp3', {'Pos': '0'}), ('b.mp3', {})], records)
+        self.assertEqual('2', batch.error)
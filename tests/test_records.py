@@ -0,0 +1,96 @@
+import unittest
+import ampdclient.client as c
+import ampdclient.records as r
+
+
+class TestSongRecord(unittest.TestCase):
+
+    def test_song_fields(self):
+
+        lines = ['file: testpl/Dalida/Bambino.mp3',
+                 'Last-Modified: 2015-10-27T06:48:02Z',
+                 'Artist: Dalida',
+                 'Title: Bambino',
+                 'Composer: Nisa',
+                 'Time: 211',
+                 'duration: 211.122',
+                 'Pos: 4',
+                 'Id: 1026']
+        tracks = c.parse_playlist(lines, compact=True)
+
+        self.assertEqual(1, len(tracks))
+        song = tracks[0]
+        self.assertIsInstance(song, r.Song)
+        self.assertEqual('testpl/Dalida/Bambino.mp3', song.uri)
+        self.assertEqual(1026, song.id)
+        self.assertEqual(4, song.pos)
+        self.assertEqual(211, song.time)
+        self.assertEqual(211.122, song.duration)
+        self.assertEqual(1445928482, song.last_modified)
+        self.assertEqual('Dalida', song.artist)
+        self.assertEqual({'Composer': 'Nisa'}, song.tags)
+        self.assertEqual('Nisa', song.get('Composer'))
+        self.assertEqual('Bambino', song.get('Title'))
+        self.assertIsNone(song.get('Album'))
+
+    def test_lsinfo_records(self):
+
+        lines = ['directory: nas-samba/Albums',
+                 'Last-Modified: 2015-06-17T10:46:05Z',
+                 'file: nas-samba/track.mp3',
+                 'playlist: nas-samba/pl.m3u']
+        dirs, files, playlists = c.parse_lsinfo(lines, compact=True)
+
+        self.assertIsInstance(dirs[0], r.Directory)
+        self.assertEqual('nas-samba/Albums', dirs[0].path)
+        self.assertEqual(1434537965, dirs[0].last_modified)
+        self.assertIsInstance(files[0], r.Song)
+        self.assertIsNone(files[0].tags)
+        self.assertIsInstance(playlists[0], r.Playlist)
+        self.assertIsNone(playlists[0].last_modified)
+
+    def test_parse_timestamp(self):
+
+        self.assertEqual(0, r.parse_timestamp('1970-01-01T00:00:00Z'))
+        self.assertIsNone(r.parse_timestamp('garbage'))
+        self.assertIsNone(r.parse_timestamp(None))
+
+
+class TestStatus(unittest.TestCase):
+
+    lines = ['volume: -1', 'repeat: 0', 'random: 1', 'single: 0',
+             'consume: 0', 'playlist: 52', 'playlistlength: 10',
+             'state: play', 'song: 3', 'songid: 34', 'time: 20:288',
+             'elapsed: 20.105', 'bitrate: 320', 'audio: 44100:24:2']
+
+    def test_status_fields(self):
+
+        status = r.Status(c.parse_lines_to_dict(self.lines))
+
+        self.assertEqual('play', status.state)
+        self.assertIsNone(status.volume)
+        self.assertFalse(status.repeat)
+        self.assertTrue(status.random)
+        self.assertEqual(52, status.playlist)
+        self.assertEqual(34, status.songid)
+        self.assertIsNone(status.nextsongid)
+        self.assertEqual(20.105, status.elapsed)
+        self.assertEqual(288.0, status.duration)
+        # raw values are still available
+        self.assertEqual('52', status['playlist'])
+        self.assertEqual('44100:24:2', status.get('audio'))
+
+    def test_elapsed_now(self):
+
+        status = r.Status(c.parse_lines_to_dict(self.lines), fetched=0)
+
+        self.assertEqual(288.0, status.elapsed_now())
+
+    def test_stats_fields(self):
+
+        stats = r.Stats(c.parse_lines_to_dict(['artists: 12', 'songs: 1043',
+                                               'db_update: 1445928482']))
+
+        self.assertEqual(12, stats.artists)
+        self.assertEqual(1043, stats.songs)
+        self.assertIsNone(stats.albums)